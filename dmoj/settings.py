@@ -79,7 +79,22 @@ DMOJ_EMAIL_THROTTLING = (10, 60)
 
 # Maximum number of submissions a single user can queue without the `spam_submission` permission
 DMOJ_SUBMISSION_LIMIT = 2
+# The counts of queued submissions and contest submissions checked against the limits are kept in the cache,
+# and recounted from the database after this many seconds.
+DMOJ_SUBMISSION_COUNTER_TIMEOUT = 60
 DMOJ_SUBMISSIONS_REJUDGE_LIMIT = 10
+# Whether rejudges save full revisions of submissions and their test cases, in addition to the previous results.
+DMOJ_REJUDGE_FULL_REVISIONS = False
+# Rescoring a problem updates submissions, and recalculates contest participations and user points, in chunks of
+# this many rows. At most DMOJ_RESCORE_CONCURRENCY chunks are recalculated by Celery at once, as that many chains of
+# subtasks. Set it to 0 to recalculate in the rescoring task itself.
+DMOJ_RESCORE_CHUNK_SIZE = 500
+DMOJ_RESCORE_CONCURRENCY = 2
+# Disqualifications in a rated contest rerate it this many seconds later, so that those made in quick succession
+# are included in a single rerate.
+DMOJ_RERATE_DELAY = 30
+# Scoreboards show that their contest is being recalculated for at most this many seconds, in case the task dies.
+DMOJ_SCOREBOARD_RECALCULATING_TIMEOUT = 3600
 
 # Whether to allow users to view source code: 'all' | 'all-solved' | 'only-own'
 DMOJ_SUBMISSION_SOURCE_VISIBILITY = 'all-solved'
@@ -93,6 +108,15 @@ DMOJ_USER_DATA_DOWNLOAD = False
 DMOJ_USER_DATA_CACHE = ''
 DMOJ_USER_DATA_DOWNLOAD_RATELIMIT = datetime.timedelta(days=1)
 
+# Cold storage for the sources and test case outputs of old submissions.
+# Set DMOJ_COLD_STORAGE_ROOT to a local directory, or DMOJ_COLD_STORAGE_BACKEND to the dotted path of a
+# Django storage class (e.g. one backed by object storage) constructed with DMOJ_COLD_STORAGE_OPTIONS.
+DMOJ_COLD_STORAGE_ROOT = None
+DMOJ_COLD_STORAGE_BACKEND = None
+DMOJ_COLD_STORAGE_OPTIONS = {}
+# Submissions older than this are moved to cold storage by the archive_submissions command.
+DMOJ_COLD_STORAGE_AGE = datetime.timedelta(days=180)
+
 DMOJ_COMMENT_VOTE_HIDE_THRESHOLD = -5
 DMOJ_COMMENT_REPLY_TIMEFRAME = datetime.timedelta(days=365)
 
@@ -111,6 +135,44 @@ DMOJ_STATS_SUBMISSION_RESULT_COLORS = {
     'ERR': '#ffa71c',
 }
 DMOJ_API_PAGE_SIZE = 1000
+# How long to cache the IDs of the problems and contests visible to each user.
+# The cache is invalidated when visibility changes, so this is only a safety net.
+DMOJ_VISIBILITY_CACHE_TIMEOUT = 86400
+# Largest number of cached visible or hidden IDs to list in a query. Larger sets filter by the visibility subquery
+# instead, since the list would be sent and parsed on every query.
+DMOJ_VISIBILITY_MAX_INLINE_IDS = 1000
+# How long to cache that a user's current contest participation is still valid, which is checked on every request.
+# It is never cached past the end of the participation, and is invalidated when access to contests might change.
+DMOJ_CONTEST_MEMBERSHIP_CACHE_TIMEOUT = 600
+# How long to cache the rendered rows of contest rankings. Rows are replaced whenever the results change, so this
+# only bounds how long profile changes, such as a new display name, take to show up.
+DMOJ_CONTEST_RANKING_CACHE_TIMEOUT = 3600
+# How long to cache the order of the participations in contest rankings.
+DMOJ_CONTEST_RANKING_INDEX_TIMEOUT = 300
+# How long to cache the version of the results of contests, which is invalidated whenever they change. The stored
+# artifacts of ended contests, such as their statistics, are rebuilt when the version changes.
+DMOJ_CONTEST_VERSION_CACHE_TIMEOUT = 3600
+# How long to cache the problem labels generated by the Lua problem label scripts of contests and courses.
+DMOJ_PROBLEM_LABELS_CACHE_TIMEOUT = 86400
+# How long to cache rendered markdown. It is keyed by a hash of its source and options, so it never goes stale.
+DMOJ_MARKDOWN_CACHE_TIMEOUT = 86400
+# Number of rendered markdown documents kept in each process, in front of the cache.
+DMOJ_MARKDOWN_LRU_SIZE = 128
+# Markdown shorter than this is only cached in process, since rendering it is about as fast as fetching it.
+DMOJ_MARKDOWN_CACHE_MIN_LENGTH = 512
+# How long the sorted rank index of a contest is kept in Redis after its last update. It is rebuilt when next used.
+DMOJ_CONTEST_RANK_INDEX_TIMEOUT = 7 * 24 * 3600
+# Number of rows shown per page of contest rankings when they are paginated, or around a participation.
+DMOJ_CONTEST_RANKING_PAGE_SIZE = 100
+# Number of rows fetched per query by the streaming export endpoints of the API.
+DMOJ_API_EXPORT_CHUNK_SIZE = 5000
+# Save new submissions to an outbox in the same transaction that creates them, to be sent to the judges by the
+# dispatch_submissions command, instead of contacting the bridge during the request.
+DMOJ_SUBMISSION_OUTBOX = False
+# Number of times the dispatcher tries to send a submission before marking it as an internal error.
+DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS = 10
+# Seconds that a dispatcher has to send the batch of submissions it claimed, after which they are sent again.
+DMOJ_SUBMISSION_OUTBOX_LEASE = 60
 
 DMOJ_PASSWORD_RESET_LIMIT_WINDOW = 3600
 DMOJ_PASSWORD_RESET_LIMIT_COUNT = 10
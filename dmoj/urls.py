@@ -214,6 +214,7 @@ urlpatterns = [
         path('/clone', contests.ContestClone.as_view(), name='contest_clone'),
         path('/ranking/', contests.ContestRanking.as_view(), name='contest_ranking'),
         path('/ranking/ajax', contests.contest_ranking_ajax, name='contest_ranking_ajax'),
+        path('/ranking/snapshot', contests.contest_ranking_snapshot, name='contest_ranking_snapshot'),
         path('/join', contests.ContestJoin.as_view(), name='contest_join'),
         path('/leave', contests.ContestLeave.as_view(), name='contest_leave'),
         path('/stats', contests.ContestStats.as_view(), name='contest_stats'),
@@ -302,11 +303,14 @@ urlpatterns = [
         path('problems', api.api_v2.APIProblemList.as_view()),
         path('problem/<str:problem>', api.api_v2.APIProblemDetail.as_view()),
         path('users', api.api_v2.APIUserList.as_view()),
+        path('users/export', api.api_v2.APIUserExport.as_view()),
         path('user/<str:user>', api.api_v2.APIUserDetail.as_view()),
         path('submissions', api.api_v2.APISubmissionList.as_view()),
+        path('submissions/export', api.api_v2.APISubmissionExport.as_view()),
         path('submission/<int:submission>', api.api_v2.APISubmissionDetail.as_view()),
         path('organizations', api.api_v2.APIOrganizationList.as_view()),
         path('participations', api.api_v2.APIContestParticipationList.as_view()),
+        path('participations/export', api.api_v2.APIContestParticipationExport.as_view()),
         path('languages', api.api_v2.APILanguageList.as_view()),
         path('judges', api.api_v2.APIJudgeList.as_view()),
     ])),
@@ -1,3 +1,5 @@
+from functools import partial
+
 from adminsortable2.admin import SortableInlineAdminMixin
 from django.contrib import admin
 from django.core.exceptions import PermissionDenied
@@ -14,8 +16,11 @@ from reversion.admin import VersionAdmin
 
 from django_ace import AceWidget
 from judge.models import Class, Contest, ContestProblem, ContestSubmission, Profile, Rating, Submission
-from judge.ratings import rate_contest
+from judge.ratings import replay_ratings
+from judge.utils import scoreboard
+from judge.utils.celery import redirect_to_task_status
 from judge.utils.views import NoBatchDeleteMixin
+from judge.utils.visibility import invalidate_visibility
 from judge.widgets import AdminHeavySelect2MultipleWidget, AdminHeavySelect2Widget, AdminMartorWidget, \
     AdminSelect2MultipleWidget, AdminSelect2Widget
 
@@ -226,6 +231,8 @@ class ContestAdmin(NoBatchDeleteMixin, VersionAdmin):
         if not request.user.has_perm('judge.change_contest_visibility'):
             queryset = queryset.filter(Q(is_private=True) | Q(is_organization_private=True))
         count = queryset.update(is_visible=True)
+        # Bulk updates don't send post_save, which invalidates the cached visible contests.
+        invalidate_visibility()
         self.message_user(request, ngettext('%d contest successfully marked as visible.',
                                             '%d contests successfully marked as visible.',
                                             count) % count)
@@ -234,7 +241,8 @@ class ContestAdmin(NoBatchDeleteMixin, VersionAdmin):
     def make_hidden(self, request, queryset):
         if not request.user.has_perm('judge.change_contest_visibility'):
             queryset = queryset.filter(Q(is_private=True) | Q(is_organization_private=True))
-        count = queryset.update(is_visible=True)
+        count = queryset.update(is_visible=False)
+        invalidate_visibility()
         self.message_user(request, ngettext('%d contest successfully marked as hidden.',
                                             '%d contests successfully marked as hidden.',
                                             count) % count)
@@ -289,8 +297,7 @@ class ContestAdmin(NoBatchDeleteMixin, VersionAdmin):
             with connection.cursor() as cursor:
                 cursor.execute('TRUNCATE TABLE `%s`' % Rating._meta.db_table)
             Profile.objects.update(rating=None)
-            for contest in Contest.objects.filter(is_rated=True, end_time__lte=timezone.now()).order_by('end_time'):
-                rate_contest(contest)
+            replay_ratings(Contest.objects.filter(is_rated=True, end_time__lte=timezone.now()).order_by('end_time'))
         return HttpResponseRedirect(reverse('admin:judge_contest_changelist'))
 
     def rate_view(self, request, id):
@@ -299,9 +306,12 @@ class ContestAdmin(NoBatchDeleteMixin, VersionAdmin):
         contest = get_object_or_404(Contest, id=id)
         if not contest.is_rated or not contest.ended:
             raise Http404()
-        with transaction.atomic():
-            contest.rate()
-        return HttpResponseRedirect(request.META.get('HTTP_REFERER', reverse('admin:judge_contest_changelist')))
+        from judge.tasks import rate_contest
+        status = rate_contest.delay(contest.key)
+        return redirect_to_task_status(
+            status, message=_('Rating %s and later contests...') % (contest.name,),
+            redirect=request.META.get('HTTP_REFERER', reverse('admin:judge_contest_changelist')),
+        )
 
     def get_form(self, request, obj=None, **kwargs):
         form = super(ContestAdmin, self).get_form(request, obj, **kwargs)
@@ -348,13 +358,18 @@ class ContestParticipationAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         if form.changed_data and 'is_disqualified' in form.changed_data:
-            obj.set_disqualified(obj.is_disqualified)
+            from judge.tasks import disqualify_participation
+            scoreboard.mark_recalculating(obj.contest_id)
+            transaction.on_commit(partial(disqualify_participation.delay, obj.id, obj.is_disqualified))
+            self.message_user(request, _('The results of the participation will be recalculated shortly.'))
 
     def recalculate_results(self, request, queryset):
-        count = 0
-        for participation in queryset:
-            participation.recompute_results()
-            count += 1
+        # recompute_results updates the participations it is given, which MySQL doesn't allow when they are
+        # selected by a subquery on the same table.
+        ids = list(queryset.values_list('id', flat=True))
+        count = len(ids)
+        for contest in Contest.objects.filter(users__id__in=ids).distinct():
+            contest.recompute_results(contest.users.filter(id__in=ids))
         self.message_user(request, ngettext('%d participation recalculated.',
                                             '%d participations recalculated.',
                                             count) % count)
@@ -255,7 +255,7 @@ class CourseAdmin(NoBatchDeleteMixin, VersionAdmin):
     def make_hidden(self, request, queryset):
         if not request.user.has_perm('judge.change_contest_visibility'):
             queryset = queryset.filter(Q(is_private=True) | Q(is_organization_private=True))
-        count = queryset.update(is_visible=True)
+        count = queryset.update(is_visible=False)
         self.message_user(request, ngettext('%d course successfully marked as hidden.',
                                             '%d courses successfully marked as hidden.',
                                             count) % count)
@@ -370,10 +370,12 @@ class CourseParticipationAdmin(admin.ModelAdmin):
             obj.set_disqualified(obj.is_disqualified)
 
     def recalculate_results(self, request, queryset):
-        count = 0
-        for participation in queryset:
-            participation.recompute_results()
-            count += 1
+        # recompute_results updates the participations it is given, which MySQL doesn't allow when they are
+        # selected by a subquery on the same table.
+        ids = list(queryset.values_list('id', flat=True))
+        count = len(ids)
+        for course in Course.objects.filter(users__id__in=ids).distinct():
+            course.recompute_results(course.users.filter(id__in=ids))
         self.message_user(request, ngettext('%d participation recalculated.',
                                             '%d participations recalculated.',
                                             count) % count)
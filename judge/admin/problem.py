@@ -13,6 +13,7 @@ from reversion.admin import VersionAdmin
 from judge.models import LanguageLimit, Problem, ProblemClarification, ProblemPointsVote, ProblemTranslation, Profile, \
     Solution
 from judge.utils.views import NoBatchDeleteMixin
+from judge.utils.visibility import invalidate_visibility
 from judge.widgets import AdminHeavySelect2MultipleWidget, AdminMartorWidget, AdminSelect2MultipleWidget, \
     AdminSelect2Widget, CheckboxSelectMultipleWithSelectAll
 
@@ -198,6 +199,8 @@ class ProblemAdmin(NoBatchDeleteMixin, VersionAdmin):
 
     def make_public(self, request, queryset):
         count = queryset.update(is_public=True)
+        # Bulk updates don't send post_save, which invalidates the cached visible problems.
+        invalidate_visibility()
         for problem_id in queryset.values_list('id', flat=True):
             self._rescore(request, problem_id)
         self.message_user(request, ngettext('%d problem successfully marked as public.',
@@ -208,6 +211,7 @@ class ProblemAdmin(NoBatchDeleteMixin, VersionAdmin):
 
     def make_private(self, request, queryset):
         count = queryset.update(is_public=False)
+        invalidate_visibility()
         for problem_id in queryset.values_list('id', flat=True):
             self._rescore(request, problem_id)
         self.message_user(request, ngettext('%d problem successfully marked as private.',
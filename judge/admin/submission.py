@@ -14,8 +14,9 @@ from django.utils.translation import gettext, gettext_lazy as _, ngettext, pgett
 from reversion.admin import VersionAdmin
 
 from django_ace import AceWidget
-from judge.models import ContestParticipation, ContestProblem, ContestSubmission, Profile, Submission, \
-    SubmissionSource, SubmissionTestCase
+from judge.caching import invalidate_submission_status
+from judge.models import Contest, ContestParticipation, ContestProblem, ContestSubmission, Profile, Submission, \
+    SubmissionRejudge, SubmissionSource, SubmissionTestCase
 from judge.utils.raw_sql import use_straight_join
 
 
@@ -63,6 +64,14 @@ class SubmissionTestCaseInline(admin.TabularInline):
     max_num = 0
 
 
+class SubmissionRejudgeInline(admin.TabularInline):
+    fields = ('date', 'user', 'result', 'points', 'time', 'memory', 'case_points', 'case_total', 'judged_on')
+    readonly_fields = fields
+    model = SubmissionRejudge
+    can_delete = False
+    max_num = 0
+
+
 class ContestSubmissionInline(admin.StackedInline):
     fields = ('problem', 'participation', 'points')
     model = ContestSubmission
@@ -114,9 +123,9 @@ class SubmissionSourceInline(admin.StackedInline):
 
 
 class SubmissionAdmin(VersionAdmin):
-    readonly_fields = ('user', 'problem', 'date', 'judged_date')
+    readonly_fields = ('user', 'problem', 'date', 'judged_date', 'source_hash')
     fields = ('user', 'problem', 'date', 'judged_date', 'locked_after', 'time', 'memory', 'points', 'language',
-              'status', 'result', 'case_points', 'case_total', 'judged_on', 'error')
+              'status', 'result', 'case_points', 'case_total', 'judged_on', 'error', 'source_hash')
     actions = ('judge', 'recalculate_score')
     list_display = ('id', 'problem_code', 'problem_name', 'user_column', 'execution_time', 'pretty_memory',
                     'points', 'language_column', 'status', 'result', 'judge_column')
@@ -124,7 +133,7 @@ class SubmissionAdmin(VersionAdmin):
     search_fields = ('problem__code', 'problem__name', 'user__user__username')
     actions_on_top = True
     actions_on_bottom = True
-    inlines = [SubmissionSourceInline, SubmissionTestCaseInline, ContestSubmissionInline]
+    inlines = [SubmissionSourceInline, SubmissionTestCaseInline, SubmissionRejudgeInline, ContestSubmissionInline]
 
     def get_readonly_fields(self, request, obj=None):
         fields = self.readonly_fields
@@ -170,9 +179,10 @@ class SubmissionAdmin(VersionAdmin):
         if not request.user.has_perm('judge.edit_all_problem'):
             id = request.profile.id
             queryset = queryset.filter(Q(problem__authors__id=id) | Q(problem__curators__id=id))
-        judged = len(queryset)
+        judged = 0
         for model in queryset:
-            model.judge(rejudge=True, batch_rejudge=True, rejudge_user=request.user)
+            if model.judge(rejudge=True, batch_rejudge=True, rejudge_user=request.user):
+                judged += 1
         self.message_user(request, ngettext('%d submission was successfully scheduled for rejudging.',
                                             '%d submissions were successfully scheduled for rejudging.',
                                             judged) % judged)
@@ -192,15 +202,16 @@ class SubmissionAdmin(VersionAdmin):
                 submission.points = 0
             submission.save()
             submission.update_contest()
+        invalidate_submission_status([submission.id for submission in submissions])
 
         for profile in Profile.objects.filter(id__in=queryset.values_list('user_id', flat=True).distinct()):
             profile.calculate_points()
             cache.delete('user_complete:%d' % profile.id)
             cache.delete('user_attempted:%d' % profile.id)
 
-        for participation in ContestParticipation.objects.filter(
-                id__in=queryset.values_list('contest__participation_id')).prefetch_related('contest'):
-            participation.recompute_results()
+        participation_ids = queryset.values('contest__participation_id')
+        for contest in Contest.objects.filter(users__in=participation_ids).distinct():
+            contest.recompute_results(contest.users.filter(id__in=participation_ids))
 
         self.message_user(request, ngettext('%d submission was successfully rescored.',
                                             '%d submissions were successfully rescored.',
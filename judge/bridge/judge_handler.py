@@ -12,8 +12,10 @@ from django.utils import timezone
 
 from judge import event_poster as event
 from judge.bridge.base_handler import ZlibPacketHandler, proxy_list
-from judge.caching import finished_submission
+from judge.caching import finished_submission, invalidate_submission_status
 from judge.models import Judge, Language, LanguageLimit, Problem, RuntimeVersion, Submission, SubmissionTestCase
+from judge.utils import scoreboard, submission_limits
+from judge.utils.problem_data import get_grading_fingerprint, get_runtime_versions
 
 logger = logging.getLogger('judge.bridge')
 json_log = logging.getLogger('judge.json.bridge')
@@ -89,7 +91,8 @@ class JudgeHandler(ZlibPacketHandler):
 
         json_log.info(self._make_json_log(action='disconnect', info='judge disconnected'))
         if self._working:
-            Submission.objects.filter(id=self._working).update(status='IE', result='IE', error='')
+            if Submission.objects.filter(id=self._working).update(status='IE', result='IE', error=''):
+                self._post_update_submission(self._working, 'internal-error', done=True)
             json_log.error(self._make_json_log(sub=self._working, action='close', info='IE due to shutdown on grading'))
 
     def _authenticate(self, id, key):
@@ -393,6 +396,12 @@ class JudgeHandler(ZlibPacketHandler):
         submission.memory = memory
         submission.points = sub_points
         submission.result = status_codes[status]
+        try:
+            versions = get_runtime_versions(submission.language_id, [self.judge.id])[self.judge.id]
+            submission.grading_fingerprint = get_grading_fingerprint(submission.grading_fingerprint, versions)
+        except Exception:
+            logger.exception('Failed to compute grading fingerprint: %s', submission.id)
+            submission.grading_fingerprint = None
         submission.save()
 
         json_log.info(self._make_json_log(
@@ -408,6 +417,9 @@ class JudgeHandler(ZlibPacketHandler):
 
         problem._updating_stats_only = True
         problem.update_stats()
+        old_rank = None
+        if event.real and hasattr(submission, 'contest') and submission.contest.participation.live:
+            old_rank = scoreboard.get_live_rank(submission.contest.participation)
         submission.update_contest()
 
         finished_submission(submission)
@@ -421,8 +433,8 @@ class JudgeHandler(ZlibPacketHandler):
             'result': submission.result,
         })
         if hasattr(submission, 'contest'):
-            participation = submission.contest.participation
-            event.post('contest_%d' % participation.contest_id, {'type': 'update'})
+            scoreboard.post_participation_update(submission.contest.participation, submission.contest.problem,
+                                                 old_rank)
         self._post_update_submission(submission.id, 'grading-end', done=True)
 
     def on_compile_error(self, packet):
@@ -476,6 +488,7 @@ class JudgeHandler(ZlibPacketHandler):
         self._free_self(packet)
 
         if Submission.objects.filter(id=packet['submission-id']).update(status='AB', result='AB', points=0):
+            invalidate_submission_status([packet['submission-id']])
             event.post('sub_%s' % Submission.get_id_secret(packet['submission-id']), {'type': 'aborted-submission'})
             self._post_update_submission(packet['submission-id'], 'terminated', done=True)
             json_log.info(self._make_json_log(packet, action='aborted', finish=True, result='AB'))
@@ -620,9 +633,16 @@ class JudgeHandler(ZlibPacketHandler):
             self._submission_cache = data = Submission.objects.filter(id=id).values(
                 'problem__is_public', 'contest_object_id',
                 'user_id', 'problem_id', 'status', 'language__key',
+                'rejudged_date', 'contest__participation_id',
             ).get()
             self._submission_cache_id = id
 
+        if done:
+            submission_limits.submission_finished(
+                data['user_id'], data['problem_id'], data['contest__participation_id'],
+                rejudged=data['rejudged_date'] is not None, internal_error=state == 'internal-error',
+            )
+
         if data['problem__is_public']:
             event.post('submissions', {
                 'type': 'done-submission' if done else 'update-submission',
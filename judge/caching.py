@@ -8,3 +8,37 @@ def finished_submission(sub):
         keys += ['contest_complete:%d' % participation.id]
         keys += ['contest_attempted:%d' % participation.id]
     cache.delete_many(keys)
+
+
+def submission_status_key(submission_id):
+    return 'submission_status:%d' % submission_id
+
+
+def invalidate_submission_status(submission_ids):
+    cache.delete_many([submission_status_key(id) for id in submission_ids])
+
+
+def contest_ranking_index_key(contest_id):
+    return 'contest_ranking_index:%d' % contest_id
+
+
+def contest_membership_key(profile_id):
+    return 'contest_membership:%d' % profile_id
+
+
+def invalidate_contest_membership(profile_ids):
+    cache.delete_many([contest_membership_key(id) for id in profile_ids])
+
+
+def contest_version_key(contest_id):
+    return 'contest_version:%d' % contest_id
+
+
+def contest_submissions_version_key(contest_id):
+    return 'contest_submissions_version:%d' % contest_id
+
+
+def invalidate_contest_ranking(contest_ids):
+    cache.delete_many([contest_ranking_index_key(id) for id in contest_ids] +
+                      [contest_version_key(id) for id in contest_ids] +
+                      [contest_submissions_version_key(id) for id in contest_ids])
@@ -47,6 +47,30 @@ class BaseContestFormat(metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    def apply_submission(self, participation, submission):
+        """
+        Updates a ContestParticipation object's score, cumtime, and format_data fields after one of its submissions
+        is graded. Formats can override this to only recompute the results on the submission's problem, but the
+        result must be the same as calling update_participation.
+
+        :param participation: A ContestParticipation object.
+        :param submission: The graded Submission object, which is part of the participation.
+        :return: None
+        """
+        self.update_participation(participation)
+
+    def update_participations(self, queryset):
+        """
+        Updates the score, cumtime, tiebreaker and format_data fields of several ContestParticipation objects at
+        once. Formats can override this to compute the results with a few set-based queries and save them with
+        bulk_update, but the result must be the same as calling update_participation on each of them.
+
+        :param queryset: A queryset of ContestParticipation objects of this contest.
+        :return: None
+        """
+        for participation in queryset:
+            self.update_participation(participation)
+
     @abstractmethod
     def display_user_problem(self, participation, contest_problem):
         """
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import timedelta
 
 from django.core.exceptions import ValidationError
@@ -25,26 +26,74 @@ class DefaultContestFormat(BaseContestFormat):
     def __init__(self, contest, config):
         super(DefaultContestFormat, self).__init__(contest, config)
 
-    def update_participation(self, participation):
+    @staticmethod
+    def get_submissions(participations):
+        """
+        Returns a queryset of the contest submissions of the participations.
+        """
+        model = participations[0].submissions.model
+        return model.objects.filter(participation_id__in=[participation.id for participation in participations])
+
+    def get_format_data(self, participations, problem_id=None):
+        """
+        Computes the format_data entries of the participations, only for the given ContestProblem ID if specified.
+
+        :return: A dictionary mapping the ID of each participation to its format_data entries.
+        """
+        submissions = self.get_submissions(participations)
+        if problem_id is not None:
+            submissions = submissions.filter(problem_id=problem_id)
+
+        starts = {participation.id: participation.start for participation in participations}
+        format_data = defaultdict(dict)
+        for result in submissions.values('participation_id', 'problem_id') \
+                                 .annotate(time=Max('submission__date'), points=Max('points')):
+            dt = (result['time'] - starts[result['participation_id']]).total_seconds()
+            format_data[result['participation_id']][str(result['problem_id'])] = {
+                'time': dt, 'points': result['points'],
+            }
+        return format_data
+
+    def set_totals(self, participation, format_data):
+        """
+        Sets the score, cumtime, tiebreaker and format_data of a participation from its format_data entries.
+        """
         cumtime = 0
         points = 0
-        format_data = {}
-
-        for result in participation.submissions.values('problem_id').annotate(
-                time=Max('submission__date'), points=Max('points'),
-        ):
-            dt = (result['time'] - participation.start).total_seconds()
-            if result['points']:
-                cumtime += dt
-            format_data[str(result['problem_id'])] = {'time': dt, 'points': result['points']}
-            points += result['points']
+        for data in format_data.values():
+            if data['points']:
+                cumtime += data['time']
+            points += data['points']
 
         participation.cumtime = max(cumtime, 0)
         participation.score = round(points, self.contest.points_precision)
         participation.tiebreaker = 0
         participation.format_data = format_data
+
+    def update_totals(self, participation, format_data):
+        self.set_totals(participation, format_data)
         participation.save()
 
+    def update_participation(self, participation):
+        self.update_totals(participation, self.get_format_data([participation]).get(participation.id, {}))
+
+    def update_participations(self, queryset):
+        participations = list(queryset)
+        if not participations:
+            return
+
+        format_data = self.get_format_data(participations)
+        for participation in participations:
+            self.set_totals(participation, format_data.get(participation.id, {}))
+        type(participations[0]).objects.bulk_update(participations, ['score', 'cumtime', 'tiebreaker', 'format_data'])
+
+    def apply_submission(self, participation, submission):
+        problem_id = submission.contest.problem_id
+        format_data = dict(participation.format_data or {})
+        format_data.pop(str(problem_id), None)
+        format_data.update(self.get_format_data([participation], problem_id).get(participation.id, {}))
+        self.update_totals(participation, format_data)
+
     def display_user_problem(self, participation, contest_problem):
         format_data = (participation.format_data or {}).get(str(contest_problem.id))
         if format_data:
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import timedelta
 
 from django.core.exceptions import ValidationError
@@ -44,58 +45,78 @@ class ICPCContestFormat(DefaultContestFormat):
         self.config.update(config or {})
         self.contest = contest
 
-    def update_participation(self, participation):
-        cumtime = 0
-        last = 0
-        penalty = 0
-        score = 0
-        format_data = {}
+    def get_format_data(self, participations, problem_id=None):
+        participation_filter = ', '.join(['%s'] * len(participations))
+        problem_filter = 'WHERE cp.id = %s' if problem_id is not None else ''
+        params = tuple(participation.id for participation in participations) + \
+            ((problem_id,) if problem_id is not None else ())
+        starts = {participation.id: participation.start for participation in participations}
+        format_data = defaultdict(dict)
 
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT MAX(cs.points) as `points`, (
+                SELECT cs.participation_id AS `participation`, MAX(cs.points) as `points`, (
                     SELECT MIN(csub.date)
                         FROM judge_contestsubmission ccs LEFT OUTER JOIN
                              judge_submission csub ON (csub.id = ccs.submission_id)
-                        WHERE ccs.problem_id = cp.id AND ccs.participation_id = %s AND ccs.points = MAX(cs.points)
+                        WHERE ccs.problem_id = cp.id AND ccs.participation_id = cs.participation_id AND
+                              ccs.points = MAX(cs.points)
                 ) AS `time`, cp.id AS `prob`
                 FROM judge_contestproblem cp INNER JOIN
-                     judge_contestsubmission cs ON (cs.problem_id = cp.id AND cs.participation_id = %s) LEFT OUTER JOIN
+                     judge_contestsubmission cs ON (cs.problem_id = cp.id AND
+                                                    cs.participation_id IN ({participation_filter})) LEFT OUTER JOIN
                      judge_submission sub ON (sub.id = cs.submission_id)
-                GROUP BY cp.id
-            """, (participation.id, participation.id))
-
-            for points, time, prob in cursor.fetchall():
-                time = from_database_time(time)
-                dt = (time - participation.start).total_seconds()
-
-                # Compute penalty
-                if self.config['penalty']:
-                    # An IE can have a submission result of `None`
-                    subs = participation.submissions.exclude(submission__result__isnull=True) \
-                                                    .exclude(submission__result__in=['IE', 'CE']) \
-                                                    .filter(problem_id=prob)
-                    if points:
-                        prev = subs.filter(submission__date__lte=time).count() - 1
-                        penalty += prev * self.config['penalty'] * 60
-                    else:
-                        # We should always display the penalty, even if the user has a score of 0
-                        prev = subs.count()
+                {problem_filter}
+                GROUP BY cs.participation_id, cp.id
+            """.format(participation_filter=participation_filter, problem_filter=problem_filter), params)
+            results = cursor.fetchall()
+
+        # The dates of the submissions that can incur a penalty, fetched at once rather than counted per problem.
+        submission_dates = defaultdict(list)
+        if self.config['penalty']:
+            # An IE can have a submission result of `None`
+            submissions = self.get_submissions(participations).exclude(submission__result__isnull=True) \
+                                                              .exclude(submission__result__in=['IE', 'CE'])
+            if problem_id is not None:
+                submissions = submissions.filter(problem_id=problem_id)
+            for participation_id, prob, date in submissions.values_list('participation_id', 'problem_id',
+                                                                        'submission__date'):
+                submission_dates[participation_id, prob].append(date)
+
+        for participation_id, points, time, prob in results:
+            time = from_database_time(time)
+            dt = (time - starts[participation_id]).total_seconds()
+
+            # Compute penalty
+            if self.config['penalty']:
+                dates = submission_dates[participation_id, prob]
+                if points:
+                    prev = sum(date <= time for date in dates) - 1
                 else:
-                    prev = 0
+                    # We should always display the penalty, even if the user has a score of 0
+                    prev = len(dates)
+            else:
+                prev = 0
 
-                if points:
-                    cumtime += dt
-                    last = max(last, dt)
+            format_data[participation_id][str(prob)] = {'time': dt, 'points': points, 'penalty': prev}
+        return format_data
 
-                format_data[str(prob)] = {'time': dt, 'points': points, 'penalty': prev}
-                score += points
+    def set_totals(self, participation, format_data):
+        cumtime = 0
+        last = 0
+        penalty = 0
+        score = 0
+        for data in format_data.values():
+            if data['points']:
+                cumtime += data['time']
+                last = max(last, data['time'])
+                penalty += data['penalty'] * self.config['penalty'] * 60
+            score += data['points']
 
         participation.cumtime = cumtime + penalty
         participation.score = round(score, self.contest.points_precision)
         participation.tiebreaker = last  # field is sorted from least to greatest
         participation.format_data = format_data
-        participation.save()
 
     def display_user_problem(self, participation, contest_problem):
         format_data = (participation.format_data or {}).get(str(contest_problem.id))
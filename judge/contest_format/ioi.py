@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.db import connection
 from django.utils.translation import gettext as _, gettext_lazy
 
@@ -14,18 +16,23 @@ class IOIContestFormat(LegacyIOIContestFormat):
         cumtime: Specify True if time penalties are to be computed. Defaults to False.
     """
 
-    def update_participation(self, participation):
-        cumtime = 0
-        score = 0
-        format_data = {}
+    def get_format_data(self, participations, problem_id=None):
+        participation_filter = ', '.join(['%s'] * len(participations))
+        problem_filter = 'WHERE cp.id = %s' if problem_id is not None else ''
+        params = tuple(participation.id for participation in participations) + \
+            ((problem_id,) if problem_id is not None else ())
+        starts = {participation.id: participation.start for participation in participations}
+        format_data = defaultdict(dict)
 
         with connection.cursor() as cursor:
             cursor.execute("""
-                SELECT q.prob,
+                SELECT q.participation,
+                       q.prob,
                        MIN(q.date) as `date`,
                        q.batch_points
                 FROM (
-                         SELECT cp.id          as `prob`,
+                         SELECT cs.participation_id as `participation`,
+                                cp.id          as `prob`,
                                 sub.id         as `subid`,
                                 sub.date       as `date`,
                                 tc.points      as `points`,
@@ -34,63 +41,56 @@ class IOIContestFormat(LegacyIOIContestFormat):
                          FROM judge_contestproblem cp
                                   INNER JOIN
                               judge_contestsubmission cs
-                              ON (cs.problem_id = cp.id AND cs.participation_id = %s)
+                              ON (cs.problem_id = cp.id AND cs.participation_id IN ({participation_filter}))
                                   LEFT OUTER JOIN
                               judge_submission sub
                               ON (sub.id = cs.submission_id AND sub.status = 'D')
                                   INNER JOIN judge_submissiontestcase tc
                               ON sub.id = tc.submission_id
-                         GROUP BY cp.id, tc.batch, sub.id
+                         {problem_filter}
+                         GROUP BY cs.participation_id, cp.id, tc.batch, sub.id
                      ) q
                          INNER JOIN (
-                    SELECT prob, batch, MAX(r.batch_points) as max_batch_points
+                    SELECT participation, prob, batch, MAX(r.batch_points) as max_batch_points
                     FROM (
-                             SELECT cp.id          as `prob`,
+                             SELECT cs.participation_id as `participation`,
+                                    cp.id          as `prob`,
                                     tc.batch       as `batch`,
                                     MIN(tc.points) as `batch_points`
                              FROM judge_contestproblem cp
                                       INNER JOIN
                                   judge_contestsubmission cs
-                                  ON (cs.problem_id = cp.id AND cs.participation_id = %s)
+                                  ON (cs.problem_id = cp.id AND cs.participation_id IN ({participation_filter}))
                                       LEFT OUTER JOIN
                                   judge_submission sub
                                   ON (sub.id = cs.submission_id AND sub.status = 'D')
                                       INNER JOIN judge_submissiontestcase tc
                                   ON sub.id = tc.submission_id
-                             GROUP BY cp.id, tc.batch, sub.id
+                             {problem_filter}
+                             GROUP BY cs.participation_id, cp.id, tc.batch, sub.id
                          ) r
-                    GROUP BY prob, batch
+                    GROUP BY participation, prob, batch
                 ) p
-                ON p.prob = q.prob AND (p.batch = q.batch OR p.batch is NULL AND q.batch is NULL)
+                ON p.participation = q.participation AND p.prob = q.prob AND
+                   (p.batch = q.batch OR p.batch is NULL AND q.batch is NULL)
                 WHERE p.max_batch_points = q.batch_points
-                GROUP BY q.prob, q.batch
-            """, (participation.id, participation.id))
+                GROUP BY q.participation, q.prob, q.batch
+            """.format(participation_filter=participation_filter, problem_filter=problem_filter), params * 2)
 
-            for problem_id, time, subtask_points in cursor.fetchall():
+            for participation_id, problem_id, time, subtask_points in cursor.fetchall():
                 problem_id = str(problem_id)
                 time = from_database_time(time)
                 if self.config['cumtime']:
-                    dt = (time - participation.start).total_seconds()
+                    dt = (time - starts[participation_id]).total_seconds()
                 else:
                     dt = 0
 
-                if format_data.get(problem_id) is None:
-                    format_data[problem_id] = {'points': 0, 'time': 0}
-                format_data[problem_id]['points'] += subtask_points
-                format_data[problem_id]['time'] = max(dt, format_data[problem_id]['time'])
-
-            for problem_data in format_data.values():
-                penalty = problem_data['time']
-                points = problem_data['points']
-                if self.config['cumtime'] and points:
-                    cumtime += penalty
-                score += points
-
-        participation.cumtime = max(cumtime, 0)
-        participation.score = round(score, self.contest.points_precision)
-        participation.tiebreaker = 0
-        participation.format_data = format_data
-        participation.save()
+                data = format_data[participation_id]
+                if data.get(problem_id) is None:
+                    data[problem_id] = {'points': 0, 'time': 0}
+                data[problem_id]['points'] += subtask_points
+                data[problem_id]['time'] = max(dt, data[problem_id]['time'])
+        return format_data
 
     def get_short_form_display(self):
         yield _('The maximum score for each problem batch will be used.')
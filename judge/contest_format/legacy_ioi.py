@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import timedelta
 
 from django.core.exceptions import ValidationError
@@ -40,34 +41,42 @@ class LegacyIOIContestFormat(DefaultContestFormat):
         self.config.update(config or {})
         self.contest = contest
 
-    def update_participation(self, participation):
-        cumtime = 0
-        score = 0
-        format_data = {}
-
-        queryset = (participation.submissions.values('problem_id')
-                                             .filter(points=Subquery(
-                                                 participation.submissions.filter(problem_id=OuterRef('problem_id'))
-                                                                          .order_by('-points').values('points')[:1]))
-                                             .annotate(time=Min('submission__date'))
-                                             .values_list('problem_id', 'time', 'points'))
-
-        for problem_id, time, points in queryset:
+    def get_format_data(self, participations, problem_id=None):
+        submissions = self.get_submissions(participations)
+        if problem_id is not None:
+            submissions = submissions.filter(problem_id=problem_id)
+
+        starts = {participation.id: participation.start for participation in participations}
+        format_data = defaultdict(dict)
+        queryset = (submissions.values('participation_id', 'problem_id')
+                               .filter(points=Subquery(
+                                   submissions.filter(participation_id=OuterRef('participation_id'),
+                                                      problem_id=OuterRef('problem_id'))
+                                              .order_by('-points').values('points')[:1]))
+                               .annotate(time=Min('submission__date'))
+                               .values_list('participation_id', 'problem_id', 'time', 'points'))
+
+        for participation_id, problem_id, time, points in queryset:
             if self.config['cumtime']:
-                dt = (time - participation.start).total_seconds()
-                if points:
-                    cumtime += dt
+                dt = (time - starts[participation_id]).total_seconds()
             else:
                 dt = 0
 
-            format_data[str(problem_id)] = {'points': points, 'time': dt}
-            score += points
+            format_data[participation_id][str(problem_id)] = {'points': points, 'time': dt}
+        return format_data
+
+    def set_totals(self, participation, format_data):
+        cumtime = 0
+        score = 0
+        for data in format_data.values():
+            if self.config['cumtime'] and data['points']:
+                cumtime += data['time']
+            score += data['points']
 
         participation.cumtime = max(cumtime, 0)
         participation.score = round(score, self.contest.points_precision)
         participation.tiebreaker = 0
         participation.format_data = format_data
-        participation.save()
 
     def display_user_problem(self, participation, contest_problem):
         format_data = (participation.format_data or {}).get(str(contest_problem.id))
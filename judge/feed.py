@@ -1,7 +1,6 @@
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.syndication.views import Feed
-from django.core.cache import cache
 from django.utils import timezone
 from django.utils.feedgenerator import Atom1Feed
 
@@ -21,12 +20,7 @@ class ProblemFeed(Feed):
         return problem.name
 
     def item_description(self, problem):
-        key = 'problem_feed:%d' % problem.id
-        desc = cache.get(key)
-        if desc is None:
-            desc = str(markdown(problem.description, 'problem'))[:500] + '...'
-            cache.set(key, desc, 86400)
-        return desc
+        return str(markdown(problem.description, 'problem'))[:500] + '...'
 
     def item_pubdate(self, problem):
         return problem.date
@@ -51,12 +45,7 @@ class CommentFeed(Feed):
         return '%s -> %s' % (comment.author.user.username, comment.page_title)
 
     def item_description(self, comment):
-        key = 'comment_feed:%d' % comment.id
-        desc = cache.get(key)
-        if desc is None:
-            desc = str(markdown(comment.body, 'comment'))
-            cache.set(key, desc, 86400)
-        return desc
+        return str(markdown(comment.body, 'comment'))
 
     def item_pubdate(self, comment):
         return comment.time
@@ -81,12 +70,7 @@ class BlogFeed(Feed):
         return post.title
 
     def item_description(self, post):
-        key = 'blog_feed:%d' % post.id
-        summary = cache.get(key)
-        if summary is None:
-            summary = str(markdown(post.summary or post.content, 'blog'))
-            cache.set(key, summary, 86400)
-        return summary
+        return str(markdown(post.summary or post.content, 'blog'))
 
     def item_pubdate(self, post):
         return post.publish_on
@@ -1,5 +1,6 @@
-import logging
+import hashlib
 import re
+from functools import lru_cache
 from html import unescape
 from urllib.parse import urlparse
 
@@ -7,21 +8,23 @@ import mistune
 from bleach.css_sanitizer import CSSSanitizer
 from bleach.sanitizer import Cleaner
 from django.conf import settings
-from lxml import html
-from lxml.etree import ParserError, XMLSyntaxError
-from markupsafe import Markup
+from django.core.cache import cache
 
 from judge.highlight_code import highlight_code
 from judge.jinja2.markdown.lazy_load import lazy_load as lazy_load_processor
 from judge.jinja2.markdown.math import MathInlineGrammar, MathInlineLexer, MathRenderer
+from judge.jinja2.markdown.sanitize import sanitize
+from judge.lxml_tree import FragmentMarkup, fragment_markup, fragments_to_tree
 from judge.utils.camo import client as camo_client
 from judge.utils.texoid import TEXOID_ENABLED, TexoidRenderer
+from judge.utils.unicode import utf8bytes
 from .bleach_whitelist import all_styles, mathml_attrs, mathml_tags
 from .. import registry
 
-logger = logging.getLogger('judge.html')
-
 NOFOLLOW_WHITELIST = settings.NOFOLLOW_EXCLUDED
+# Part of the key of rendered markdown in the cache. Bump it whenever a change to the renderer changes its output.
+RENDERER_VERSION = 1
+MARKDOWN_KEY = 'markdown:%s'
 
 
 class CodeSafeInlineGrammar(mistune.InlineGrammar):
@@ -131,22 +134,6 @@ def get_cleaner(name, params):
     return cleaner
 
 
-def fragments_to_tree(fragment):
-    tree = html.Element('div')
-    try:
-        parsed = html.fragments_fromstring(fragment, parser=html.HTMLParser(recover=True))
-    except (XMLSyntaxError, ParserError) as e:
-        if fragment and (not isinstance(e, ParserError) or e.args[0] != 'Document is empty'):
-            logger.exception('Failed to parse HTML string')
-        return tree
-
-    if parsed and isinstance(parsed[0], str):
-        tree.text = parsed[0]
-        parsed = parsed[1:]
-    tree.extend(parsed)
-    return tree
-
-
 def strip_paragraphs_tags(tree):
     for p in tree.xpath('.//p'):
         for child in p.iterchildren(reversed=True):
@@ -154,44 +141,80 @@ def strip_paragraphs_tags(tree):
         parent = p.getparent()
         prev = p.getprevious()
         if prev is not None:
-            prev.tail = (prev.tail or '') + p.text
+            prev.tail = (prev.tail or '') + (p.text or '')
         else:
-            parent.text = (parent.text or '') + p.text
+            parent.text = (parent.text or '') + (p.text or '')
         parent.remove(p)
 
 
-def fragment_tree_to_str(tree):
-    return html.tostring(tree, encoding='unicode')[len('<div>'):-len('</div>')]
-
-
-@registry.filter
-def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+def render_html(value, style, math_engine=None):
+    """Renders markdown to HTML, before it is sanitized or post-processed."""
     styles = settings.MARKDOWN_STYLES.get(style, settings.MARKDOWN_DEFAULT_STYLE)
     escape = styles.get('safe_mode', True)
     nofollow = styles.get('nofollow', True)
     texoid = TEXOID_ENABLED and styles.get('texoid', False)
     math = getattr(settings, 'MATHOID_URL') and styles.get('math', False)
-    bleach_params = styles.get('bleach', {})
-
-    post_processors = []
-    if styles.get('use_camo', False) and camo_client is not None:
-        post_processors.append(camo_client.update_tree)
-    if lazy_load:
-        post_processors.append(lazy_load_processor)
 
     renderer = AwesomeRenderer(escape=escape, nofollow=nofollow, texoid=texoid,
                                math=math and math_engine is not None, math_engine=math_engine)
     markdown = mistune.Markdown(renderer=renderer, inline=AwesomeInlineLexer,
                                 parse_block_html=1, parse_inline_html=1)
-    result = markdown(value)
-
-    if post_processors or strip_paragraphs:
-        tree = fragments_to_tree(result)
-        for processor in post_processors:
-            processor(tree)
-        if strip_paragraphs:
-            strip_paragraphs_tags(tree)
-        result = fragment_tree_to_str(tree)
+    return markdown(value)
+
+
+def render_markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    """Renders markdown to sanitized HTML, without going through the cache."""
+    styles = settings.MARKDOWN_STYLES.get(style, settings.MARKDOWN_DEFAULT_STYLE)
+    bleach_params = styles.get('bleach', {})
+
+    # The HTML is parsed once, and every pass works on the same tree. The tree is returned along with the markup, so
+    # that filters such as `reference` don't parse it again.
+    source = render_html(value, style, math_engine)
+    tree = fragments_to_tree(source)
+    if styles.get('use_camo', False) and camo_client is not None:
+        camo_client.update_tree(tree)
+    if lazy_load:
+        lazy_load_processor(tree)
+    if strip_paragraphs:
+        strip_paragraphs_tags(tree)
+    # Sanitizing last also covers what the other passes add, such as the attributes copied into <noscript>.
     if bleach_params:
-        result = get_cleaner(style, bleach_params).clean(result)
-    return Markup(result)
+        sanitize(tree, get_cleaner(style, bleach_params), source)
+    return fragment_markup(tree)
+
+
+def markdown_digest(value, style, math_engine, lazy_load, strip_paragraphs):
+    digest = hashlib.sha1(utf8bytes(repr((RENDERER_VERSION, style, math_engine, lazy_load, strip_paragraphs))))
+    digest.update(b'\0')
+    digest.update(utf8bytes(value))
+    return digest.hexdigest()
+
+
+def markdown_key(value, style, math_engine, lazy_load, strip_paragraphs):
+    return MARKDOWN_KEY % markdown_digest(value, style, math_engine, lazy_load, strip_paragraphs)
+
+
+@lru_cache(maxsize=settings.DMOJ_MARKDOWN_LRU_SIZE)
+def cached_markdown(value, style, math_engine, lazy_load, strip_paragraphs):
+    # Short sources, such as most comments, render faster than they would be fetched, so they are only kept in process.
+    if len(value) < settings.DMOJ_MARKDOWN_CACHE_MIN_LENGTH:
+        return str(render_markdown(value, style, math_engine, lazy_load, strip_paragraphs))
+
+    from judge.models import RenderedMarkdown
+
+    digest = markdown_digest(value, style, math_engine, lazy_load, strip_paragraphs)
+    result = cache.get(MARKDOWN_KEY % digest)
+    if result is None:
+        # The markdown of problems, posts and comments is rendered when it is saved.
+        result = RenderedMarkdown.objects.filter(key=digest).values_list('html', flat=True).first()
+        if result is None:
+            result = str(render_markdown(value, style, math_engine, lazy_load, strip_paragraphs))
+        cache.set(MARKDOWN_KEY % digest, result, settings.DMOJ_MARKDOWN_CACHE_TIMEOUT)
+    return result
+
+
+@registry.filter
+def markdown(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    # Rendered markdown is cached by its source and options, so that the cache never has to be invalidated. An edited
+    # source simply has a different key, and the same source rendered on several pages is rendered once.
+    return FragmentMarkup(cached_markdown(value, style, math_engine, bool(lazy_load), bool(strip_paragraphs)))
@@ -0,0 +1,101 @@
+import re
+from collections import Counter
+
+from bleach.sanitizer import BleachSanitizerFilter
+from lxml import etree, html
+
+# Elements without end tags, which are escaped as a lone start tag when they are not allowed.
+VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'meta',
+                           'param', 'source', 'track', 'wbr'))
+# Elements whose content html5lib, and so bleach and browsers, read as text. lxml parses the content of some of them as
+# elements, which would be read differently once serialized: e.g. an attribute containing </noscript> ends a noscript
+# element in browsers.
+RAW_TEXT_ELEMENTS = ('iframe', 'noembed', 'noframes', 'noscript', 'script', 'style', 'textarea', 'title', 'xmp')
+# Elements whose text lxml serializes as is. Inside <math> or <svg>, browsers parse their content as elements, so they
+# are only allowed when their text can't contain a tag.
+UNESCAPED_TEXT_ELEMENTS = ('script', 'style')
+END_TAG = re.compile(r'</([a-zA-Z][^\s/>]*)\s*>')
+
+
+def get_sanitizer(cleaner):
+    # Only the token methods of the filter are used, so it has nothing to read from.
+    return BleachSanitizerFilter(
+        source=iter(()),
+        allowed_tags=cleaner.tags,
+        attributes=cleaner.attributes,
+        allowed_protocols=cleaner.protocols,
+        strip_disallowed_tags=cleaner.strip,
+        strip_html_comments=cleaner.strip_comments,
+        css_sanitizer=cleaner.css_sanitizer,
+    )
+
+
+def _append_text(parent, previous, text):
+    if not text:
+        return
+    if previous is None:
+        parent.text = (parent.text or '') + text
+    else:
+        previous.tail = (previous.tail or '') + text
+
+
+def _remove(element):
+    _append_text(element.getparent(), element.getprevious(), element.tail)
+    element.getparent().remove(element)
+
+
+def _replace_with_children(element, before='', after=''):
+    parent = element.getparent()
+    previous = element.getprevious()
+    _append_text(parent, previous, before + (element.text or ''))
+    index = parent.index(element)
+    children = list(element)
+    for offset, child in enumerate(children):
+        parent.insert(index + offset, child)
+    _append_text(parent, children[-1] if children else previous, after + (element.tail or ''))
+    parent.remove(element)
+
+
+def sanitize(tree, cleaner, source):
+    """Sanitizes the descendants of the tree, parsed from the HTML source, in place, as `cleaner.clean` would sanitize
+    the source: disallowed elements are escaped or stripped, keeping their content, and attributes are filtered by the
+    rules of bleach."""
+    sanitizer = get_sanitizer(cleaner)
+    for element in list(tree.iter(*RAW_TEXT_ELEMENTS)):
+        if len(element):
+            element.text = (element.text or '') + ''.join(html.tostring(child, encoding='unicode') for child in element)
+            element[:] = []
+
+    elements = list(tree.iterdescendants())
+
+    # bleach only escapes the tags in the source, but the parser closes every element. The last elements with each
+    # tag are assumed to be the ones closed in the source, so that e.g. the `<T>` of `List<T>` gets no end tag.
+    end_tags = Counter(tag.lower() for tag in END_TAG.findall(source))
+    closed = set()
+    for element in reversed(elements):
+        if isinstance(element.tag, str) and end_tags[element.tag] > 0:
+            end_tags[element.tag] -= 1
+            closed.add(element)
+
+    for element in elements:
+        if not isinstance(element.tag, str):
+            # Comments and processing instructions.
+            if element.tag is not etree.Comment or cleaner.strip_comments:
+                _remove(element)
+            continue
+
+        void = element.tag in VOID_ELEMENTS
+        token = {
+            'type': 'EmptyTag' if void else 'StartTag',
+            'name': element.tag,
+            'data': {(None, name): value for name, value in element.attrib.items()},
+        }
+        if element.tag in cleaner.tags and not (element.tag in UNESCAPED_TEXT_ELEMENTS and '<' in (element.text or '')):
+            attributes = sanitizer.allow_token(token)['data']
+            element.attrib.clear()
+            element.attrib.update({name: value for (_, name), value in attributes.items()})
+        elif cleaner.strip:
+            _replace_with_children(element)
+        else:
+            _replace_with_children(element, sanitizer.disallowed_token(token)['data'],
+                                   '</%s>' % element.tag if element in closed else '')
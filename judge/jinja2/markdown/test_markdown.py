@@ -1,7 +1,13 @@
-from django.test import SimpleTestCase
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from lxml import html
 
-from . import fragment_tree_to_str, fragments_to_tree, get_cleaner, markdown
+from judge.jinja2.reference import reference
+from judge.lxml_tree import fragment_tree_to_str, fragments_to_tree
+from judge.management.commands.benchmark_markdown import normalize, render_multipass, render_single_pass
+from . import cached_markdown, get_cleaner, markdown, markdown_key, render_markdown
 
 MATHML_N = """\
 <math xmlns="http://www.w3.org/1998/Math/MathML">
@@ -154,3 +160,119 @@ class TestFragmentUtils(SimpleTestCase):
         self.assertEqual(tree.text, 'z')
 
         self.assertHTMLEqual(fragment_tree_to_str(tree), 'z<p>a</p><p>b</p>')
+
+
+DOCUMENTS = [
+    '',
+    'plain text',
+    'z<p>a</p><p>b</p>',
+    '# Header\n\nSome *emphasis*, **strong** and `code`, with a [link](https://example.com "title").\n',
+    '1. one\n2. two\n    - nested\n    - list\n\n> quote\n',
+    '| a | b |\n|---|---|\n| 1 | 2 |\n',
+    '```python\nprint("<b>")\n```\n\n    indented <code>\n',
+    '<script>alert(1)</script><div onclick="alert(1)" class="c">x</div><input type="text">',
+    '<a href="javascript:alert(1)">x</a> <a href="https://example.com">y</a> <img src="a.png" onerror="alert(1)">',
+    '<img style="display: block; margin: 0 auto; position: fixed">\n\n<style>a { color: red; }</style>',
+    '<!-- comment --><p>text<!-- another --></p>&amp;lt; &lt;b&gt; & <b>bold</b>',
+    '<details><summary>Hint</summary>\n\nHidden *text*\n\n</details>',
+    '<center>Input</center><iframe src="https://example.com"></iframe>',
+    'Users [user:admin] and [ruser:nobody], <span>[user:admin]</span> tail [user:missing].',
+    MATHML_N,
+    '![image](https://example.com/image.png) and ![data](data:image/png;base64,AAAA)',
+]
+
+
+class TestSinglePass(TestCase):
+    """Checks that rendering markdown in a single pass over one tree gives the same result as the multi-pass
+    pipeline."""
+
+    def test_equivalence(self):
+        # Paragraphs are only stripped from short strings in the default style.
+        cases = [(style, options) for style in (TestMarkdown.BLEACHED_STYLE, TestMarkdown.UNBLEACHED_STYLE, 'default')
+                 for options in ({}, {'lazy_load': True})] + [('default', {'strip_paragraphs': True})]
+        for style, options in cases:
+            for document in DOCUMENTS:
+                with self.subTest(style=style, options=options, document=document):
+                    self.assertEqual(normalize(render_single_pass(document, style, **options)),
+                                     normalize(render_multipass(document, style, **options)))
+
+    def test_noscript(self):
+        # Browsers read the content of <noscript> as text, which must not be able to close it.
+        result = str(markdown('<noscript><b title="</noscript><img src=x onerror=alert(1)>">x</b></noscript>\n\n'
+                              '<img src="a.png" alt="</noscript><img src=x onerror=alert(1)>">',
+                              TestMarkdown.BLEACHED_STYLE, lazy_load=True))
+        self.assertNotIn('<img src="x"', result)
+        self.assertNotIn('</noscript><img src=x', result)
+        self.assertEqual(result.count('<noscript>'), 2)
+
+    def test_foreign_style(self):
+        # Browsers parse the content of <style> as elements inside <math>.
+        result = str(markdown('<math><style><img src=x onerror=alert(1)></style></math>', TestMarkdown.BLEACHED_STYLE))
+        self.assertNotIn('<img', result)
+        self.assertNotIn('<style', result)
+
+    def test_unclosed_tag(self):
+        # Only the tags in the source are escaped, even though the parser closes the element.
+        self.assertHTMLEqual(str(markdown('A List<Integer> of a<b>c', TestMarkdown.BLEACHED_STYLE)),
+                             '<p>A List&lt;integer&gt; of a<b>c</b></p>')
+
+    def test_reference_reuses_tree(self):
+        rendered = render_markdown('[user:nobody]', TestMarkdown.BLEACHED_STYLE)
+        tree = rendered.tree
+        referenced = reference(rendered)
+        self.assertIs(referenced.tree, tree)
+        self.assertHTMLEqual(str(referenced), '<p><span class="deleted-user">nobody</span></p>')
+        # The tree was modified, so the markup is parsed again if it is used once more.
+        self.assertIsNone(rendered.tree)
+        self.assertHTMLEqual(str(reference(rendered)), '<p><span class="deleted-user">nobody</span></p>')
+
+
+class TestMarkdownCache(TestCase):
+    def setUp(self):
+        cached_markdown.cache_clear()
+        self.addCleanup(cached_markdown.cache_clear)
+
+    @override_settings(DMOJ_MARKDOWN_CACHE_MIN_LENGTH=0)
+    def test_cached(self):
+        source = 'Some *emphasis* and <script>alert(1)</script>'
+        expected = str(render_markdown(source, TestMarkdown.BLEACHED_STYLE, lazy_load=True))
+        key = markdown_key(source, TestMarkdown.BLEACHED_STYLE, None, True, False)
+        cache.delete(key)
+
+        with mock.patch('judge.jinja2.markdown.render_markdown', wraps=render_markdown) as render:
+            self.assertEqual(markdown(source, TestMarkdown.BLEACHED_STYLE, lazy_load=True), expected)
+            self.assertEqual(markdown(source, TestMarkdown.BLEACHED_STYLE, lazy_load=True), expected)
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(cache.get(key), expected)
+
+            # Other processes only share the rendered markdown through the cache.
+            cached_markdown.cache_clear()
+            self.assertEqual(markdown(source, TestMarkdown.BLEACHED_STYLE, lazy_load=True), expected)
+            self.assertEqual(render.call_count, 1)
+
+            # Every option is part of the key.
+            markdown(source, TestMarkdown.BLEACHED_STYLE)
+            markdown(source, TestMarkdown.UNBLEACHED_STYLE, lazy_load=True)
+            markdown(source + ' ', TestMarkdown.BLEACHED_STYLE, lazy_load=True)
+            self.assertEqual(render.call_count, 4)
+
+    def test_short_source(self):
+        key = markdown_key('short', 'default', None, False, False)
+        self.assertEqual(str(markdown('short', 'default')), '<p>short</p>\n')
+        self.assertIsNone(cache.get(key))
+
+    def test_reference(self):
+        rendered = markdown('[user:nobody] and <b>[user:nobody]</b>', TestMarkdown.BLEACHED_STYLE)
+        self.assertIsNone(rendered.tree)
+        self.assertHTMLEqual(str(reference(rendered)),
+                             '<p><span class="deleted-user">nobody</span> and '
+                             '<b><span class="deleted-user">nobody</span></b></p>')
+
+    def test_reference_unparsed(self):
+        rendered = markdown('No *references* here.', TestMarkdown.BLEACHED_STYLE)
+        with mock.patch('judge.lxml_tree.fragments_to_tree') as parse:
+            referenced = reference(rendered)
+            self.assertEqual(str(referenced), str(rendered))
+        parse.assert_not_called()
+        # The markup is still parsed when the tree is used.
+        self.assertEqual(referenced.tree.xpath('.//em')[0].text, 'references')
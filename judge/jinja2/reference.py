@@ -116,6 +116,10 @@ def update_tree(list, results, is_tail=False):
 @registry.filter
 def reference(text):
     tree = lxml_tree.fromstring(text)
+    # Most markup has no references, and is passed through without being parsed.
+    if isinstance(tree, lxml_tree.HTMLFragmentTree) and tree.unparsed is not None and \
+            not rereference.search(tree.unparsed):
+        return tree
     texts = []
     tails = []
     queries = defaultdict(list)
@@ -3,12 +3,17 @@ import logging
 import socket
 import struct
 import zlib
+from datetime import timedelta
 
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from judge import event_poster as event
+from judge.caching import invalidate_submission_status
 from judge.judge_priority import BATCH_REJUDGE_PRIORITY, CONTEST_SUBMISSION_PRIORITY, DEFAULT_PRIORITY, REJUDGE_PRIORITY
+from judge.utils import submission_limits
+from judge.utils.problem_data import get_grading_inputs_hash
 
 logger = logging.getLogger('judge.judgeapi')
 size_pack = struct.Struct('!I')
@@ -50,11 +55,14 @@ def judge_request(packet, reply=True):
         return result
 
 
-def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=None):
-    from .models import ContestSubmission, Submission, SubmissionTestCase
+def _get_judge_updates(submission, rejudge, batch_rejudge):
+    from .models import ContestSubmission
 
     updates = {'time': None, 'memory': None, 'points': None, 'result': None, 'case_points': 0, 'case_total': 0,
-               'error': None, 'rejudged_date': timezone.now() if rejudge or batch_rejudge else None, 'status': 'QU'}
+               'error': None, 'rejudged_date': timezone.now() if rejudge or batch_rejudge else None, 'status': 'QU',
+               # Stamped now, so that data replaced during grading isn't mistaken for the data that was graded.
+               # The judge's runtimes are added to it when grading ends.
+               'grading_fingerprint': get_grading_inputs_hash(submission.problem, submission.language_id)}
     try:
         # This is set proactively; it might get unset in judgecallback's on_grading_begin if the problem doesn't
         # actually have pretests stored on the judge.
@@ -64,6 +72,40 @@ def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=No
         priority = DEFAULT_PRIORITY
     else:
         priority = CONTEST_SUBMISSION_PRIORITY
+    return updates, BATCH_REJUDGE_PRIORITY if batch_rejudge else (REJUDGE_PRIORITY if rejudge else priority)
+
+
+def _mark_internal_error(submission, rejudged):
+    from .models import ContestSubmission, Submission
+
+    # Only while queued, so that a submission the bridge did receive isn't overwritten once it is being graded.
+    if Submission.objects.filter(id=submission.id, status='QU').update(status='IE', result='IE'):
+        participation_id = ContestSubmission.objects.filter(submission_id=submission.id) \
+                                            .values_list('participation_id', flat=True).first()
+        submission_limits.submission_finished(submission.user_id, submission.problem_id, participation_id,
+                                              rejudged=rejudged, internal_error=True)
+
+
+def _send_submission(submission, judge_id, priority, rejudged=False):
+    response = judge_request({
+        'name': 'submission-request',
+        'submission-id': submission.id,
+        'problem-id': submission.problem.code,
+        'language': submission.language.key,
+        'source': submission.source.source,
+        'judge-id': judge_id,
+        'priority': priority,
+    })
+    if response['name'] != 'submission-received' or response['submission-id'] != submission.id:
+        _mark_internal_error(submission, rejudged)
+    _post_update_submission(submission)
+
+
+def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=None, record_rejudge=False,
+                     rejudge_user=None):
+    from .models import Submission, SubmissionRejudge, SubmissionTestCase
+
+    updates, priority = _get_judge_updates(submission, rejudge, batch_rejudge)
 
     # This should prevent double rejudge issues by permitting only the judging of
     # QU (which is the initial state) and D (which is the final state).
@@ -73,33 +115,78 @@ def judge_submission(submission, rejudge=False, batch_rejudge=False, judge_id=No
     # as that would prevent people from knowing a submission is being scheduled for rejudging.
     # It is worth noting that this mechanism does not prevent a new rejudge from being scheduled
     # while already queued, but that does not lead to data corruption.
-    if not Submission.objects.filter(id=submission.id).exclude(status__in=('P', 'G')).update(**updates):
-        return False
+    with transaction.atomic():
+        if not Submission.objects.filter(id=submission.id).exclude(status__in=('P', 'G')).update(**updates):
+            return False
+        # Only once the submission is certain to be judged again, from the results it had before.
+        if record_rejudge:
+            SubmissionRejudge.record([submission], rejudge_user)
 
     SubmissionTestCase.objects.filter(submission_id=submission.id).delete()
+    invalidate_submission_status([submission.id])
 
     try:
-        response = judge_request({
-            'name': 'submission-request',
-            'submission-id': submission.id,
-            'problem-id': submission.problem.code,
-            'language': submission.language.key,
-            'source': submission.source.source,
-            'judge-id': judge_id,
-            'priority': BATCH_REJUDGE_PRIORITY if batch_rejudge else (REJUDGE_PRIORITY if rejudge else priority),
-        })
+        _send_submission(submission, judge_id, priority, rejudged=rejudge or batch_rejudge)
     except BaseException:
         logger.exception('Failed to send request to judge')
-        Submission.objects.filter(id=submission.id).update(status='IE', result='IE')
+        _mark_internal_error(submission, rejudge or batch_rejudge)
         success = False
     else:
-        if response['name'] != 'submission-received' or response['submission-id'] != submission.id:
-            Submission.objects.filter(id=submission.id).update(status='IE', result='IE')
-        _post_update_submission(submission)
         success = True
     return success
 
 
+def queue_submission(submission, judge_id=None):
+    """Adds a new submission to the outbox, to be sent to the bridge by dispatch_queued_submissions.
+
+    This only touches the database, so it should be called in the same transaction that creates the submission.
+    """
+    from .models import Submission, SubmissionOutbox
+
+    updates, priority = _get_judge_updates(submission, False, False)
+    Submission.objects.filter(id=submission.id).update(**updates)
+    SubmissionOutbox.objects.create(submission=submission, judge_id=judge_id, priority=priority)
+
+
+def dispatch_queued_submissions(batch_size=100):
+    """Sends a batch of submissions from the outbox to the bridge, and returns the number of submissions handled.
+
+    Submissions that can't be delivered are retried with exponential backoff, up to
+    DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS times before they are marked as internal errors.
+    """
+    from .models import SubmissionOutbox
+
+    now = timezone.now()
+    # Claim the batch by leasing it, rather than holding row locks while talking to the bridge. Entries of a
+    # dispatcher that dies are sent again once the lease expires. The lease also identifies this dispatcher's claim.
+    lease = now + timedelta(seconds=settings.DMOJ_SUBMISSION_OUTBOX_LEASE)
+    with transaction.atomic():
+        ids = list(SubmissionOutbox.objects.select_for_update(skip_locked=True).filter(next_attempt__lte=now)
+                   .order_by('priority', 'id').values_list('id', flat=True)[:batch_size])
+        SubmissionOutbox.objects.filter(id__in=ids).update(next_attempt=lease)
+
+    entries = SubmissionOutbox.objects.filter(id__in=ids, next_attempt=lease).order_by('priority', 'id') \
+        .select_related('submission__problem', 'submission__language', 'submission__source__blob')
+    for entry in entries:
+        claimed = SubmissionOutbox.objects.filter(id=entry.id, next_attempt=lease)
+        try:
+            _send_submission(entry.submission, entry.judge_id, entry.priority)
+        except Exception as e:
+            attempts = entry.attempts + 1
+            if attempts >= settings.DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS:
+                logger.exception('Giving up on sending submission %d to judge', entry.submission_id)
+                with transaction.atomic():
+                    if claimed.delete()[0]:
+                        _mark_internal_error(entry.submission, False)
+            else:
+                logger.warning('Failed to send submission %d to judge', entry.submission_id, exc_info=True)
+                claimed.update(attempts=attempts, last_error=str(e),
+                               next_attempt=timezone.now() + timedelta(seconds=min(2 ** attempts, 60)))
+        else:
+            claimed.delete()
+    return len(ids)
+
+
 def disconnect_judge(judge, force=False):
     judge_request({'name': 'disconnect-judge', 'judge-id': judge.name, 'force': force}, reply=False)
 
@@ -119,5 +206,6 @@ def abort_submission(submission):
     # and returns a bad-request, the submission is not falsely shown as "Aborted" when it will still be judged.
     if not response.get('judge-aborted', True):
         Submission.objects.filter(id=submission.id).update(status='AB', result='AB', points=0)
+        invalidate_submission_status([submission.id])
         event.post('sub_%s' % Submission.get_id_secret(submission.id), {'type': 'aborted-submission'})
         _post_update_submission(submission, done=True)
@@ -3,6 +3,7 @@ import logging
 from django.utils.safestring import SafeData, mark_safe
 from lxml import html
 from lxml.etree import ParserError, XMLSyntaxError
+from markupsafe import Markup
 
 logger = logging.getLogger('judge.html')
 
@@ -18,14 +19,15 @@ class HTMLTreeString(SafeData):
 
     def __getattr__(self, attr):
         try:
-            return getattr(self._tree, attr)
+            return getattr(self.tree, attr)
         except AttributeError:
             return getattr(str(self), attr)
 
     def __setattr__(self, key, value):
         if key[0] == '_':
             super(HTMLTreeString, self).__setattr__(key, value)
-        setattr(self._tree, key, value)
+            return
+        setattr(self.tree, key, value)
 
     def __repr__(self):
         return '<HTMLTreeString %r>' % str(self)
@@ -53,7 +55,82 @@ class HTMLTreeString(SafeData):
         return self._tree
 
 
+class HTMLFragmentTree(HTMLTreeString):
+    """A tree of HTML fragments, which are the children of a div that is left out when the tree is serialized.
+
+    A tree made from markup is only parsed once it is used, so that markup passed through unchanged is never parsed."""
+
+    def __init__(self, tree=None, source=None):
+        self._tree = tree
+        self._source = source
+
+    def __repr__(self):
+        return '<HTMLFragmentTree %r>' % str(self)
+
+    def __str__(self):
+        if self._tree is None:
+            return mark_safe(self._source)
+        return mark_safe(fragment_tree_to_str(self._tree))
+
+    def __setstate__(self, state):
+        self._tree = None
+        self._source = state
+
+    @property
+    def unparsed(self):
+        """The markup of the tree if it hasn't been parsed yet, or None."""
+        return self._source if self._tree is None else None
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            self._tree = fragments_to_tree(self._source)
+            self._source = None
+        return self._tree
+
+
+class FragmentMarkup(Markup):
+    """Markup of HTML fragments that keeps the tree it was serialized from, so that `fromstring` doesn't parse it
+    again. Markup derived from it, e.g. by concatenation, has no tree."""
+    tree = None
+
+    def __reduce__(self):
+        return Markup, (str(self),)
+
+
+def fragment_markup(tree):
+    markup = FragmentMarkup(fragment_tree_to_str(tree))
+    markup.tree = tree
+    return markup
+
+
+def fragments_to_tree(fragment):
+    tree = html.Element('div')
+    try:
+        parsed = html.fragments_fromstring(fragment, parser=html.HTMLParser(recover=True))
+    except (XMLSyntaxError, ParserError) as e:
+        if fragment and (not isinstance(e, ParserError) or e.args[0] != 'Document is empty'):
+            logger.exception('Failed to parse HTML string')
+        return tree
+
+    if parsed and isinstance(parsed[0], str):
+        tree.text = parsed[0]
+        parsed = parsed[1:]
+    tree.extend(parsed)
+    return tree
+
+
+def fragment_tree_to_str(tree):
+    return html.tostring(tree, encoding='unicode')[len('<div>'):-len('</div>')]
+
+
 def fromstring(str):
     if isinstance(str, HTMLTreeString):
         return str
+    if isinstance(str, FragmentMarkup) and str.tree is not None:
+        # The tree is modified in place, so it can only be used once.
+        tree, str.tree = str.tree, None
+        return HTMLFragmentTree(tree)
+    if isinstance(str, FragmentMarkup):
+        return HTMLFragmentTree(source=str)
     return HTMLTreeString(str)
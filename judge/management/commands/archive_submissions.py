@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from judge.tasks import archive_submission_data
+from judge.utils.cold_storage import get_cold_storage
+
+
+class Command(BaseCommand):
+    help = 'moves sources and test case outputs of old submissions to cold storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', type=int,
+                            help='archive submissions older than this many days (default: DMOJ_COLD_STORAGE_AGE)')
+        parser.add_argument('-b', '--batch-size', type=int, default=1000, help='rows to archive per batch')
+
+    def handle(self, *args, **options):
+        if get_cold_storage() is None:
+            raise CommandError('Cold storage is not configured')
+
+        age = timedelta(days=options['days']) if options['days'] is not None else settings.DMOJ_COLD_STORAGE_AGE
+        archived = 0
+        for count in archive_submission_data(timezone.now() - age, options['batch_size']):
+            archived += count
+            if options['verbosity'] > 1:
+                self.stdout.write('Archived %d rows...' % archived)
+        self.stdout.write('Archived %d rows in total.' % archived)
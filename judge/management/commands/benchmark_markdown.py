@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Length
+
+from judge import lxml_tree
+from judge.jinja2.markdown import get_cleaner, lazy_load_processor, render_html, render_markdown, strip_paragraphs_tags
+from judge.jinja2.reference import reference
+from judge.models import Problem
+from judge.utils.camo import client as camo_client
+
+
+def render_multipass(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    """Renders markdown followed by `reference` as it was done before the markdown filter worked on a single tree:
+    the HTML was parsed and serialized for the post-processors, again by bleach, and once more by `reference`."""
+    styles = settings.MARKDOWN_STYLES.get(style, settings.MARKDOWN_DEFAULT_STYLE)
+    bleach_params = styles.get('bleach', {})
+
+    post_processors = []
+    if styles.get('use_camo', False) and camo_client is not None:
+        post_processors.append(camo_client.update_tree)
+    if lazy_load:
+        post_processors.append(lazy_load_processor)
+
+    result = render_html(value, style, math_engine)
+    if post_processors or strip_paragraphs:
+        tree = lxml_tree.fragments_to_tree(result)
+        for processor in post_processors:
+            processor(tree)
+        if strip_paragraphs:
+            strip_paragraphs_tags(tree)
+        result = lxml_tree.fragment_tree_to_str(tree)
+    if bleach_params:
+        result = get_cleaner(style, bleach_params).clean(result)
+    return str(reference(result))
+
+
+def render_single_pass(value, style, math_engine=None, lazy_load=False, strip_paragraphs=False):
+    return str(reference(render_markdown(value, style, math_engine, lazy_load, strip_paragraphs)))
+
+
+def normalize(rendered):
+    """Serializes rendered HTML the same way whichever pipeline rendered it. `reference` used to parse strings with
+    `lxml.html.fromstring`, which wraps several top-level elements in a div, and html5lib, which bleach parses with,
+    turns the stray </p> that mistune emits after nested blocks into empty paragraphs."""
+    tree = lxml_tree.fragments_to_tree(rendered)
+    for paragraph in tree.xpath('.//p[not(node()) and not(@*)]'):
+        paragraph.drop_tree()
+    if len(tree) == 1 and tree[0].tag in ('div', 'span') and not tree[0].attrib and not (tree.text or '').strip():
+        tree[0].drop_tag()
+    return lxml_tree.fragment_tree_to_str(tree).strip()
+
+
+class Command(BaseCommand):
+    help = 'benchmark rendering the largest problem statements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--count', type=int, default=20, help='number of problem statements to render')
+        parser.add_argument('-r', '--repeat', type=int, default=5, help='number of times to render each statement')
+
+    def handle(self, *args, **options):
+        problems = Problem.objects.annotate(length=Length('description')).order_by('-length') \
+            .only('code', 'description', 'is_full_markup')[:options['count']]
+
+        totals = {render_multipass: 0, render_single_pass: 0}
+        mismatches = 0
+        for problem in problems:
+            times, outputs = {}, {}
+            for render in totals:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    outputs[render] = render(problem.description, problem.markdown_style)
+                times[render] = (time.perf_counter() - start) / options['repeat']
+                totals[render] += times[render]
+            if normalize(outputs[render_multipass]) != normalize(outputs[render_single_pass]):
+                mismatches += 1
+                self.stderr.write('%s: output differs from the multi-pass pipeline' % problem.code)
+            self.stdout.write('%s (%d characters): multi-pass %.2fms, single pass %.2fms' % (
+                problem.code, len(problem.description),
+                times[render_multipass] * 1000, times[render_single_pass] * 1000,
+            ))
+
+        if totals[render_single_pass]:
+            self.stdout.write('total: multi-pass %.2fms, single pass %.2fms (%.2fx), %d differing outputs' % (
+                totals[render_multipass] * 1000, totals[render_single_pass] * 1000,
+                totals[render_multipass] / totals[render_single_pass], mismatches,
+            ))
@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from judge.ratings import MEAN_INIT, SD_INIT, recalculate_ratings_numpy, recalculate_ratings_python, tie_ranker
+
+
+def make_contest(size, seed):
+    rng = random.Random(seed)
+    times_ranked = [rng.randrange(0, 30) for _ in range(size)]
+    old_mean = [rng.gauss(MEAN_INIT, SD_INIT) for _ in range(size)]
+    historical_p = [[rng.gauss(MEAN_INIT, SD_INIT) for _ in range(times)] for times in times_ranked]
+    # Round the scores so that there are ties.
+    scores = sorted((round(rng.gauss(mean, SD_INIT), -1) for mean in old_mean), reverse=True)
+    ranking = list(tie_ranker(scores, key=lambda score: score))
+    return ranking, old_mean, times_ranked, historical_p
+
+
+class Command(BaseCommand):
+    help = 'benchmark the rating engines on synthetic contests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 50000],
+                            help='number of participants of each contest')
+        parser.add_argument('--python-limit', type=int, default=1000,
+                            help='largest contest to also rate with the pure Python engine')
+        parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic contests')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            contest = make_contest(size, options['seed'])
+
+            start = time.perf_counter()
+            numpy_result = recalculate_ratings_numpy(*contest)
+            self.stdout.write('%d participants: numpy took %.3fs' % (size, time.perf_counter() - start))
+
+            if size > options['python_limit']:
+                continue
+
+            start = time.perf_counter()
+            python_result = recalculate_ratings_python(*contest)
+            self.stdout.write('%d participants: python took %.3fs' % (size, time.perf_counter() - start))
+
+            for name, numpy_values, python_values in zip(('rating', 'mean', 'performance'),
+                                                         numpy_result, python_result):
+                difference = max(abs(a - b) for a, b in zip(numpy_values, python_values))
+                self.stdout.write('    max difference in %s: %g' % (name, difference))
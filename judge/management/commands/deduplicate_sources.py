@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from judge.models import SubmissionSource
+
+
+class Command(BaseCommand):
+    help = 'moves submission sources stored in their own rows into shared, reference counted blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=1000, help='sources to process per batch')
+
+    def handle(self, *args, **options):
+        queryset = SubmissionSource.objects.filter(blob__isnull=True, archive_key__isnull=True).exclude(source='') \
+                                           .order_by('id')
+        last_id = 0
+        moved = 0
+        while True:
+            with transaction.atomic():
+                sources = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                if not sources:
+                    break
+                for source in sources:
+                    # Saving a source with its text loaded moves it into the shared blob.
+                    source.save()
+            moved += len(sources)
+            last_id = sources[-1].id
+            if options['verbosity'] > 1:
+                self.stdout.write('Deduplicated %d sources...' % moved)
+        self.stdout.write('Deduplicated %d sources in total.' % moved)
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from judge.judgeapi import dispatch_queued_submissions
+
+
+class Command(BaseCommand):
+    help = 'sends submissions queued in the outbox (DMOJ_SUBMISSION_OUTBOX) to the judges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=100, help='submissions to send per batch')
+        parser.add_argument('-i', '--interval', type=float, default=0.5,
+                            help='seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='empty the outbox once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = dispatch_queued_submissions(options['batch_size'])
+            if sent and options['verbosity'] > 1:
+                self.stdout.write('Dispatched %d submissions' % sent)
+            if sent < options['batch_size']:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
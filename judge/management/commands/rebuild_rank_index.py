@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from judge.models import Contest
+from judge.utils import rank_index
+
+
+class Command(BaseCommand):
+    help = 'rebuilds the sorted rank index of contests from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('contests', nargs='*', metavar='contest', help='keys of the contests to rebuild')
+        parser.add_argument('--all', action='store_true', help='rebuild every contest, rather than those not ended')
+
+    def handle(self, *args, **options):
+        if not rank_index.is_available():
+            raise CommandError('the rank index requires the cache to be Redis')
+
+        contests = Contest.objects.order_by('id')
+        if options['contests']:
+            contests = contests.filter(key__in=options['contests'])
+            missing = set(options['contests']) - set(contests.values_list('key', flat=True))
+            if missing:
+                raise CommandError('contests do not exist: %s' % ', '.join(sorted(missing)))
+        elif not options['all']:
+            contests = contests.filter(end_time__gt=timezone.now())
+
+        for contest_id, key in contests.values_list('id', 'key'):
+            count = rank_index.rebuild(contest_id)
+            if options['verbosity'] > 1:
+                self.stdout.write('%s: %d participations' % (key, count))
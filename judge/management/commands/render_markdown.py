@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from judge.models import Problem, RenderedMarkdown
+from judge.utils import rendered_markdown
+
+
+class Command(BaseCommand):
+    help = 'renders the markdown of problems, posts, organizations and comments that is missing or stale, e.g. after ' \
+           'the markdown renderer is upgraded'
+
+    def add_arguments(self, parser):
+        models = sorted(model._meta.model_name for model in rendered_markdown.RENDERS)
+        parser.add_argument('models', nargs='*', metavar='model', choices=models,
+                            help='models to render, out of %s; all of them by default' % ', '.join(models))
+        parser.add_argument('-b', '--batch-size', type=int, default=100, help='objects to load per batch')
+
+    def handle(self, *args, **options):
+        for model in rendered_markdown.RENDERS:
+            model_name = model._meta.model_name
+            if options['models'] and model_name not in options['models']:
+                continue
+
+            queryset = model.objects.order_by('id')
+            if model is Problem:
+                queryset = queryset.prefetch_related('translations')
+
+            ids = set()
+            last_id = 0
+            renders = 0
+            while True:
+                objects = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                if not objects:
+                    break
+                for obj in objects:
+                    renders += rendered_markdown.store_renders(obj)
+                    ids.add(obj.id)
+                last_id = objects[-1].id
+                if options['verbosity'] > 1:
+                    self.stdout.write('%s: rendered %d objects...' % (model_name, len(ids)))
+
+            # Renders of objects deleted without their signal firing, e.g. by a bulk delete.
+            orphans = [owner for owner in RenderedMarkdown.objects.filter(owner__startswith=model_name + ':')
+                       .values_list('owner', flat=True).distinct() if int(owner.split(':')[1]) not in ids]
+            RenderedMarkdown.objects.filter(owner__in=orphans).delete()
+            self.stdout.write('%s: %d renders of %d objects, %d orphans deleted' % (
+                model_name, renders, len(ids), len(orphans)))
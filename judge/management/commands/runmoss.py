@@ -2,7 +2,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 from moss import *
 
-from judge.models import Contest, ContestParticipation, Submission
+from judge.models import Contest, ContestParticipation, Submission, SubmissionSource
 
 
 class Command(BaseCommand):
@@ -34,7 +34,7 @@ class Command(BaseCommand):
                     contest__participation__contest__key=contest,
                     result='AC', problem__id=problem.id,
                     language__common_name=dmoj_lang,
-                ).values_list('user__user__username', 'source__source')
+                ).values_list('user__user__username', *SubmissionSource.VALUES_FIELDS)
                 if not subs:
                     print('<no submissions>')
                     continue
@@ -44,10 +44,11 @@ class Command(BaseCommand):
 
                 users = set()
 
-                for username, source in subs:
+                for username, *source_values in subs:
                     if username in users:
                         continue
                     users.add(username)
+                    source = SubmissionSource.resolve_source(*source_values)
                     moss_call.add_file_from_memory(username, source.encode('utf-8'))
 
                 print('(%d): %s' % (subs.count(), moss_call.process()))
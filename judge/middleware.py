@@ -11,6 +11,7 @@ from django.core.cache import cache
 from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import Resolver404, resolve, reverse
 from django.utils.encoding import force_bytes
+from django.utils.functional import SimpleLazyObject
 from requests.exceptions import HTTPError
 
 from judge.models import MiscConfig
@@ -88,8 +89,9 @@ class ContestMiddleware(object):
         profile = request.profile
         if profile:
             profile.update_contest()
-            request.participation = profile.current_contest
-            request.in_contest = request.participation is not None
+            request.in_contest = profile.current_contest_id is not None
+            # Loaded on use, since most requests only need to know whether the user is in a contest.
+            request.participation = SimpleLazyObject(lambda: profile.current_contest) if request.in_contest else None
         else:
             request.in_contest = False
             request.participation = None
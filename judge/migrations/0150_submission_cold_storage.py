@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+import judge.models.submission
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0149_auto_20230622_1232'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submissionsource',
+            name='archive_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='cold storage key'),
+        ),
+        migrations.AddField(
+            model_name='submissiontestcase',
+            name='archive_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='cold storage key'),
+        ),
+        migrations.AlterField(
+            model_name='submissionsource',
+            name='source',
+            field=judge.models.submission.ColdTextField(max_length=65536, verbose_name='source code'),
+        ),
+        migrations.AlterField(
+            model_name='submissiontestcase',
+            name='extended_feedback',
+            field=judge.models.submission.ColdTextField(blank=True, verbose_name='extended judging feedback'),
+        ),
+        migrations.AlterField(
+            model_name='submissiontestcase',
+            name='output',
+            field=judge.models.submission.ColdTextField(blank=True, verbose_name='program output'),
+        ),
+    ]
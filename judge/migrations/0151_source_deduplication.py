@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+import judge.models.submission
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0150_submission_cold_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True, verbose_name='source hash')),
+                ('source', judge.models.submission.ColdTextField(max_length=65536, verbose_name='source code')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='reference count')),
+                ('last_used', models.DateTimeField(db_index=True, verbose_name='last used')),
+                ('archive_key', models.CharField(blank=True, max_length=64, null=True, verbose_name='cold storage key')),
+            ],
+            options={
+                'verbose_name': 'shared submission source',
+                'verbose_name_plural': 'shared submission sources',
+            },
+            bases=(judge.models.submission.ColdStorageMixin, models.Model),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='source_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='source hash'),
+        ),
+        migrations.AddField(
+            model_name='submissionsource',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='judge.sourceblob', verbose_name='shared source'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['problem', 'source_hash'], name='judge_submi_problem_e58049_idx'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0151_source_deduplication'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='grading_fingerprint',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='grading fingerprint'),
+        ),
+    ]
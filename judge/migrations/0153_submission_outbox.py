@@ -0,0 +1,31 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0152_submission_grading_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('judge_id', models.CharField(blank=True, max_length=50, null=True, verbose_name='judge')),
+                ('priority', models.IntegerField(verbose_name='priority')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='delivery attempts')),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now,
+                                                      verbose_name='next delivery attempt')),
+                ('last_error', models.TextField(blank=True, verbose_name='last delivery error')),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox',
+                                                    to='judge.submission', verbose_name='submission')),
+            ],
+            options={
+                'verbose_name': 'queued submission',
+                'verbose_name_plural': 'queued submissions',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0153_submission_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionRejudge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(default=django.utils.timezone.now, verbose_name='rejudge date')),
+                ('result', models.CharField(blank=True, choices=[('AC', 'Accepted'), ('WA', 'Wrong Answer'), ('TLE', 'Time Limit Exceeded'), ('MLE', 'Memory Limit Exceeded'), ('OLE', 'Output Limit Exceeded'), ('IR', 'Invalid Return'), ('RTE', 'Runtime Error'), ('CE', 'Compile Error'), ('IE', 'Internal Error'), ('SC', 'Short Circuited'), ('AB', 'Aborted')], max_length=3, null=True, verbose_name='result')),
+                ('points', models.FloatField(null=True, verbose_name='points granted')),
+                ('time', models.FloatField(null=True, verbose_name='execution time')),
+                ('memory', models.FloatField(null=True, verbose_name='memory usage')),
+                ('case_points', models.FloatField(default=0, verbose_name='test case points')),
+                ('case_total', models.FloatField(default=0, verbose_name='test case total points')),
+                ('judged_date', models.DateTimeField(null=True, verbose_name='submission judge time')),
+                ('judged_on', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                                related_name='+', to='judge.judge', verbose_name='judged on')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rejudges',
+                                                 to='judge.submission', verbose_name='submission')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                                           related_name='+', to='judge.profile', verbose_name='rejudged by')),
+            ],
+            options={
+                'verbose_name': 'submission rejudge',
+                'verbose_name_plural': 'submission rejudges',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0154_submission_rejudge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contestparticipation',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented whenever the results change.', verbose_name='results version'),
+        ),
+    ]
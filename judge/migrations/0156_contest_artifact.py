@@ -0,0 +1,30 @@
+import django.db.models.deletion
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0155_contestparticipation_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestArtifact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, verbose_name='name')),
+                ('version', models.CharField(help_text='Version of the contest results that the artifact was built from.', max_length=40, verbose_name='contest version')),
+                ('data', jsonfield.fields.JSONField(verbose_name='data')),
+                ('built', models.DateTimeField(auto_now=True, verbose_name='build time')),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artifacts',
+                                              to='judge.contest', verbose_name='contest')),
+            ],
+            options={
+                'verbose_name': 'contest artifact',
+                'verbose_name_plural': 'contest artifacts',
+                'unique_together': {('contest', 'name')},
+            },
+        ),
+    ]
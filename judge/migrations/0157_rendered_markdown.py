@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0156_contest_artifact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedMarkdown',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(db_index=True, help_text='Model and ID of the object whose markdown was rendered.', max_length=40, verbose_name='owner')),
+                ('key', models.CharField(db_index=True, help_text='Hash of the markdown source and the options it was rendered with.', max_length=40, verbose_name='key')),
+                ('html', models.TextField(verbose_name='rendered HTML')),
+                ('rendered', models.DateTimeField(auto_now=True, verbose_name='render time')),
+            ],
+            options={
+                'verbose_name': 'rendered markdown',
+                'verbose_name_plural': 'rendered markdown',
+                'unique_together': {('owner', 'key')},
+            },
+        ),
+    ]
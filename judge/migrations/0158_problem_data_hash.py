@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('judge', '0157_rendered_markdown'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problemdata',
+            name='data_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='data hash'),
+        ),
+    ]
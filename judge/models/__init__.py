@@ -2,10 +2,10 @@ from reversion import revisions
 
 from judge.models.choices import ACE_THEMES, EFFECTIVE_MATH_ENGINES, MATH_ENGINES_CHOICES, TIMEZONE
 from judge.models.comment import Comment, CommentLock, CommentVote
-from judge.models.contest import Contest, ContestMoss, ContestParticipation, ContestProblem, ContestSubmission, \
-    ContestTag, Rating
+from judge.models.contest import Contest, ContestArtifact, ContestMoss, ContestParticipation, ContestProblem, \
+    ContestSubmission, ContestTag, Rating
 from judge.models.course import Course, CourseProblem, TheoryPost, TestPost, CourseTest, CourseTheory
-from judge.models.interface import BlogPost, MiscConfig, NavigationBar, validate_regex
+from judge.models.interface import BlogPost, MiscConfig, NavigationBar, RenderedMarkdown, validate_regex
 from judge.models.problem import LanguageLimit, License, Problem, ProblemClarification, ProblemGroup, \
     ProblemPointsVote, ProblemTranslation, ProblemType, Solution, SubmissionSourceAccess, \
     TranslatedProblemQuerySet
@@ -13,7 +13,8 @@ from judge.models.problem_data import CHECKERS, ProblemData, ProblemTestCase, pr
     problem_directory_file
 from judge.models.profile import Class, Organization, OrganizationRequest, Profile, WebAuthnCredential
 from judge.models.runtime import Judge, Language, RuntimeVersion
-from judge.models.submission import SUBMISSION_RESULT, Submission, SubmissionSource, SubmissionTestCase
+from judge.models.submission import SUBMISSION_RESULT, SourceBlob, Submission, SubmissionOutbox, \
+    SubmissionRejudge, SubmissionSource, SubmissionTestCase
 from judge.models.ticket import Ticket, TicketMessage
 
 revisions.register(Profile, exclude=['points', 'last_access', 'ip', 'rating'])
@@ -1,22 +1,28 @@
+from functools import partial
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db import models, transaction
-from django.db.models import CASCADE, Q
+from django.db.models import CASCADE, F, Q
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from jsonfield import JSONField
-from lupa import LuaRuntime
 from moss import MOSS_LANG_C, MOSS_LANG_CC, MOSS_LANG_JAVA, MOSS_LANG_PYTHON
 
 from judge import contest_format
+from judge.caching import invalidate_contest_ranking
 from judge.models.problem import Problem
 from judge.models.profile import Class, Organization, Profile
 from judge.models.submission import Submission
-from judge.ratings import rate_contest
+from judge.ratings import replay_ratings
+from judge.utils import rank_index, scoreboard
+from judge.utils.problem_labels import compile_label_script, get_problem_labels
 
-__all__ = ['Contest', 'ContestTag', 'ContestParticipation', 'ContestProblem', 'ContestSubmission', 'Rating']
+__all__ = ['Contest', 'ContestTag', 'ContestParticipation', 'ContestProblem', 'ContestSubmission', 'Rating',
+           'ContestArtifact']
 
 
 class MinValueOrNoneValidator(MinValueValidator):
@@ -188,11 +194,10 @@ class Contest(models.Model):
     def get_label_for_problem(self):
         if not self.problem_label_script:
             return self.format.get_label_for_problem
+        return compile_label_script(self.problem_label_script)
 
-        def DENY_ALL(obj, attr_name, is_setting):
-            raise AttributeError()
-        lua = LuaRuntime(attribute_filter=DENY_ALL, register_eval=False, register_builtins=False)
-        return lua.eval(self.problem_label_script)
+    def get_problem_labels(self, count):
+        return get_problem_labels(self, count)
 
     def clean(self):
         # Django will complain if you didn't fill in start_time or end_time, so we don't have to.
@@ -466,13 +471,38 @@ class Contest(models.Model):
             queryset = queryset.filter(q)
         return queryset.distinct()
 
-    def rate(self):
+    def recompute_results(self, participations=None):
+        """
+        Recomputes the results of the given participations of this contest, or of all of them, with a few queries for
+        the whole batch rather than a few per participation.
+        """
+        if participations is None:
+            participations = self.users.all()
+        with transaction.atomic():
+            participations = participations.select_for_update()
+            self.format.update_participations(participations)
+            participations.filter(is_disqualified=True).update(score=-9999, cumtime=0, tiebreaker=0)
+            ContestParticipation.bump_versions(participations)
+            transaction.on_commit(partial(rank_index.update_participations, self.id,
+                                          list(participations.values_list('id', flat=True))))
+    recompute_results.alters_data = True
+
+    def rate(self, progress=None):
         with transaction.atomic():
             Rating.objects.filter(contest__end_time__range=(self.end_time, self._now)).delete()
-            for contest in Contest.objects.filter(
+            ContestParticipation.bump_versions(
+                ContestParticipation.objects.filter(contest__end_time__range=(self.end_time, self._now)),
+            )
+            replay_ratings(Contest.objects.filter(
                 is_rated=True, end_time__range=(self.end_time, self._now),
-            ).order_by('end_time'):
-                rate_contest(contest)
+            ).order_by('end_time'), progress)
+
+    def schedule_rate(self):
+        """Rerates the contest in Celery a little later, once for all of the changes made until then."""
+        from judge.tasks import rate_contest
+        scoreboard.mark_recalculating(self.id)
+        if scoreboard.add_pending_rate(self.id):
+            transaction.on_commit(partial(rate_contest.apply_async, (self.key,), countdown=settings.DMOJ_RERATE_DELAY))
 
     class Meta:
         permissions = (
@@ -507,22 +537,55 @@ class ContestParticipation(models.Model):
     virtual = models.IntegerField(verbose_name=_('virtual participation id'), default=LIVE,
                                   help_text=_('0 means non-virtual, otherwise the n-th virtual participation.'))
     format_data = JSONField(verbose_name=_('contest format specific data'), null=True, blank=True)
+    version = models.PositiveIntegerField(verbose_name=_('results version'), default=0,
+                                          help_text=_('Incremented whenever the results change.'))
 
     def recompute_results(self):
         with transaction.atomic():
+            # The formats save the whole participation, so the version must not be stale either.
+            self.version = ContestParticipation.objects.select_for_update().filter(id=self.id) \
+                                               .values_list('version', flat=True).get()
             self.contest.format.update_participation(self)
-            if self.is_disqualified:
-                self.score = -9999
-                self.cumtime = 0
-                self.tiebreaker = 0
-                self.save(update_fields=['score', 'cumtime', 'tiebreaker'])
+            self._apply_disqualification()
+            self._bump_version()
     recompute_results.alters_data = True
 
+    def apply_submission(self, submission):
+        """Updates the results after one of the participation's submissions is graded, without a full recompute."""
+        with transaction.atomic():
+            # The results of the other problems are kept, so they must not be stale.
+            self.format_data, self.version = ContestParticipation.objects.select_for_update().filter(id=self.id) \
+                                                                 .values_list('format_data', 'version').get()
+            self.contest.format.apply_submission(self, submission)
+            self._apply_disqualification()
+            self._bump_version()
+    apply_submission.alters_data = True
+
+    def _bump_version(self):
+        ContestParticipation.objects.filter(id=self.id).update(version=F('version') + 1)
+        self.version += 1
+        transaction.on_commit(partial(invalidate_contest_ranking, [self.contest_id]))
+        transaction.on_commit(partial(rank_index.update_participations, self.contest_id, [self.id]))
+
+    @classmethod
+    def bump_versions(cls, queryset):
+        """Marks the cached ranking rows of the participations as stale, e.g. after their ratings change."""
+        contest_ids = set(queryset.values_list('contest_id', flat=True))
+        queryset.update(version=F('version') + 1)
+        transaction.on_commit(partial(invalidate_contest_ranking, contest_ids))
+
+    def _apply_disqualification(self):
+        if self.is_disqualified:
+            self.score = -9999
+            self.cumtime = 0
+            self.tiebreaker = 0
+            self.save(update_fields=['score', 'cumtime', 'tiebreaker'])
+
     def set_disqualified(self, disqualified):
         self.is_disqualified = disqualified
         self.recompute_results()
         if self.contest.is_rated and self.contest.ratings.exists():
-            self.contest.rate()
+            self.contest.schedule_rate()
         if self.is_disqualified:
             if self.user.current_contest == self:
                 self.user.remove_contest()
@@ -645,6 +708,20 @@ class Rating(models.Model):
         verbose_name_plural = _('contest ratings')
 
 
+class ContestArtifact(models.Model):
+    contest = models.ForeignKey(Contest, verbose_name=_('contest'), related_name='artifacts', on_delete=CASCADE)
+    name = models.CharField(max_length=64, verbose_name=_('name'))
+    version = models.CharField(max_length=40, verbose_name=_('contest version'),
+                               help_text=_('Version of the contest results that the artifact was built from.'))
+    data = JSONField(verbose_name=_('data'))
+    built = models.DateTimeField(auto_now=True, verbose_name=_('build time'))
+
+    class Meta:
+        unique_together = ('contest', 'name')
+        verbose_name = _('contest artifact')
+        verbose_name_plural = _('contest artifacts')
+
+
 class ContestMoss(models.Model):
     LANG_MAPPING = [
         ('C', MOSS_LANG_C),
@@ -7,13 +7,13 @@ from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from jsonfield import JSONField
-from lupa import LuaRuntime
 
 from judge import contest_format
 from judge.models.problem import Problem
 from judge.models.profile import Class, Organization, Profile
 from judge.models.submission import Submission
 from judge.ratings import rate_course
+from judge.utils.problem_labels import compile_label_script, get_problem_labels
 
 __all__ = ['Course', 'CourseTag', 'CourseParticipation', 'CourseProblem', 'CourseSubmission', 'TheoryPost', 'TheoryPostGroup', 'CourseRating']
 
@@ -264,11 +264,10 @@ class Course(models.Model):
     def get_label_for_problem(self):
         if not self.problem_label_script:
             return self.format.get_label_for_problem
+        return compile_label_script(self.problem_label_script)
 
-        def DENY_ALL(obj, attr_name, is_setting):
-            raise AttributeError()
-        lua = LuaRuntime(attribute_filter=DENY_ALL, register_eval=False, register_builtins=False)
-        return lua.eval(self.problem_label_script)
+    def get_problem_labels(self, count):
+        return get_problem_labels(self, count)
 
     def clean(self):
         # Django will complain if you didn't fill in start_time or end_time, so we don't have to.
@@ -542,6 +541,19 @@ class Course(models.Model):
             queryset = queryset.filter(q)
         return queryset.distinct()
 
+    def recompute_results(self, participations=None):
+        """
+        Recomputes the results of the given participations of this course, or of all of them, with a few queries for
+        the whole batch rather than a few per participation.
+        """
+        if participations is None:
+            participations = self.users.all()
+        with transaction.atomic():
+            participations = participations.select_for_update()
+            self.format.update_participations(participations)
+            participations.filter(is_disqualified=True).update(score=-9999, cumtime=0, tiebreaker=0)
+    recompute_results.alters_data = True
+
     def rate(self):
         with transaction.atomic():
             CourseRating.objects.filter(course__end_time__range=(self.end_time, self._now)).delete()
@@ -11,7 +11,7 @@ from mptt.models import MPTTModel
 
 from judge.models.profile import Profile
 
-__all__ = ['MiscConfig', 'validate_regex', 'NavigationBar', 'BlogPost']
+__all__ = ['MiscConfig', 'validate_regex', 'NavigationBar', 'BlogPost', 'RenderedMarkdown']
 
 
 class MiscConfig(models.Model):
@@ -100,3 +100,16 @@ class BlogPost(models.Model):
         verbose_name = _('blog post')
         verbose_name_plural = _('blog posts')
 
+
+class RenderedMarkdown(models.Model):
+    owner = models.CharField(max_length=40, verbose_name=_('owner'), db_index=True,
+                             help_text=_('Model and ID of the object whose markdown was rendered.'))
+    key = models.CharField(max_length=40, verbose_name=_('key'), db_index=True,
+                           help_text=_('Hash of the markdown source and the options it was rendered with.'))
+    html = models.TextField(verbose_name=_('rendered HTML'))
+    rendered = models.DateTimeField(auto_now=True, verbose_name=_('render time'))
+
+    class Meta:
+        unique_together = ('owner', 'key')
+        verbose_name = _('rendered markdown')
+        verbose_name_plural = _('rendered markdown')
@@ -46,6 +46,7 @@ class ProblemData(models.Model):
     nobigmath = models.BooleanField(verbose_name=_('disable bigInteger / bigDecimal'), null=True, blank=True)
     checker_args = models.TextField(verbose_name=_('checker arguments'), blank=True,
                                     help_text=_('Checker arguments as a JSON object.'))
+    data_hash = models.CharField(verbose_name=_('data hash'), max_length=64, null=True, blank=True)
 
     __original_zipfile = None
 
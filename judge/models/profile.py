@@ -9,6 +9,7 @@ import pyotp
 import webauthn
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
@@ -23,10 +24,12 @@ from fernet_fields import EncryptedCharField
 from pyotp.utils import strings_equal
 from sortedm2m.fields import SortedManyToManyField
 
+from judge.caching import contest_membership_key
 from judge.models.choices import ACE_THEMES, MATH_ENGINES_CHOICES, SITE_THEMES, TIMEZONE
 from judge.models.runtime import Language
 from judge.ratings import rating_class
 from judge.utils.two_factor import webauthn_decode
+from judge.utils.visibility import get_visibility_version
 
 __all__ = ['Class', 'Organization', 'Profile', 'OrganizationRequest', 'WebAuthnCredential']
 
@@ -299,9 +302,31 @@ class Profile(models.Model):
     remove_course.alters_data = True
 
     def update_contest(self):
+        if self.current_contest_id is None:
+            return
+
+        # The participation stays valid until it ends, or until access to contests might have changed, so the result
+        # of the check is cached, and most requests don't need any query.
+        key = contest_membership_key(self.id)
+        visibility_version = get_visibility_version(self.user_id)
+        cached = cache.get(key)
+        if cached is not None:
+            participation_id, end_time, version = cached
+            if (participation_id == self.current_contest_id and version == visibility_version and
+                    (end_time is None or end_time > now().timestamp())):
+                return
+
         contest = self.current_contest
-        if contest is not None and (contest.ended or not contest.contest.is_accessible_by(self.user)):
+        if contest.ended or not contest.contest.is_accessible_by(self.user):
             self.remove_contest()
+            return
+
+        timeout = settings.DMOJ_CONTEST_MEMBERSHIP_CACHE_TIMEOUT
+        end_time = contest.end_time
+        if end_time is not None:
+            timeout = min(timeout, int((end_time - now()).total_seconds()))
+        if timeout > 0:
+            cache.set(key, (contest.id, end_time and end_time.timestamp(), visibility_version), timeout)
 
     update_contest.alters_data = True
 
@@ -4,6 +4,8 @@ import hmac
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models import F
+from django.db.models.query_utils import DeferredAttribute
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.functional import cached_property
@@ -14,9 +16,11 @@ from judge.judgeapi import abort_submission, judge_submission
 from judge.models.problem import Problem, SubmissionSourceAccess
 from judge.models.profile import Profile
 from judge.models.runtime import Language
+from judge.utils.cold_storage import load_fields
 from judge.utils.unicode import utf8bytes
 
-__all__ = ['SUBMISSION_RESULT', 'Submission', 'SubmissionSource', 'SubmissionTestCase']
+__all__ = ['SUBMISSION_RESULT', 'SourceBlob', 'Submission', 'SubmissionOutbox', 'SubmissionRejudge',
+           'SubmissionSource', 'SubmissionTestCase']
 
 SUBMISSION_RESULT = (
     ('AC', _('Accepted')),
@@ -33,6 +37,40 @@ SUBMISSION_RESULT = (
 )
 
 
+class ColdStorageDescriptor(DeferredAttribute):
+    # An emptied field on a row with archived data reads through to the copy stored elsewhere.
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is None or value or not instance.has_archived_data:
+            return value
+        return instance.archived_data.get(self.field.attname, value)
+
+    # Defining __set__ makes this a data descriptor, so that it takes precedence over the instance dict.
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class ColdTextField(models.TextField):
+    descriptor_class = ColdStorageDescriptor
+
+    def pre_save(self, model_instance, add):
+        # Write back what is stored in the row, not what was read through from cold storage.
+        return model_instance.__dict__.get(self.attname, '')
+
+
+class ColdStorageMixin(object):
+    @property
+    def has_archived_data(self):
+        return self.archive_key is not None
+
+    def load_archived_data(self):
+        return load_fields(self.archive_key)
+
+    @cached_property
+    def archived_data(self):
+        return self.load_archived_data()
+
+
 @revisions.register(follow=['test_cases'])
 class Submission(models.Model):
     STATUS = (
@@ -92,6 +130,11 @@ class Submission(models.Model):
                                        on_delete=models.SET_NULL, related_name='+', db_index=False)
 
     locked_after = models.DateTimeField(verbose_name=_('submission lock'), null=True, blank=True)
+    source_hash = models.CharField(verbose_name=_('source hash'), max_length=64, null=True, blank=True)
+    # The hash of the grading inputs when the submission is sent to be graded, and its fingerprint including the
+    # judge's runtimes once graded.
+    grading_fingerprint = models.CharField(verbose_name=_('grading fingerprint'), max_length=64, null=True,
+                                           blank=True)
 
     @classmethod
     def result_class_from_code(cls, result, case_points, case_total):
@@ -124,15 +167,13 @@ class Submission(models.Model):
     def is_locked(self):
         return self.locked_after is not None and self.locked_after < timezone.now()
 
-    def judge(self, *args, rejudge=False, force_judge=False, rejudge_user=None, **kwargs):
+    def judge(self, *args, rejudge=False, force_judge=False, rejudge_user=None, record_rejudge=True, **kwargs):
+        """Sends the submission to be judged, and returns whether it was. Rejudges are recorded in the history of
+        the submission, unless record_rejudge is False."""
         if force_judge or not self.is_locked:
-            if rejudge:
-                with revisions.create_revision(manage_manually=True):
-                    if rejudge_user:
-                        revisions.set_user(rejudge_user)
-                    revisions.set_comment('Rejudged')
-                    revisions.add_to_revision(self)
-            judge_submission(self, *args, rejudge=rejudge, **kwargs)
+            return judge_submission(self, *args, rejudge=rejudge, record_rejudge=rejudge and record_rejudge,
+                                    rejudge_user=rejudge_user, **kwargs)
+        return False
 
     judge.alters_data = True
 
@@ -185,7 +226,7 @@ class Submission(models.Model):
         if not contest_problem.partial and contest.points != contest_problem.points:
             contest.points = 0
         contest.save()
-        contest.participation.recompute_results()
+        contest.participation.apply_submission(self)
 
     update_contest.alters_data = True
 
@@ -259,24 +300,107 @@ class Submission(models.Model):
 
             # For user_completed_ids
             models.Index(fields=['user', 'result']),
+
+            # For finding identical sources submitted to a problem
+            models.Index(fields=['problem', 'source_hash']),
         ]
 
 
-class SubmissionSource(models.Model):
+class SourceBlob(ColdStorageMixin, models.Model):
+    hash = models.CharField(verbose_name=_('source hash'), max_length=64, unique=True)
+    source = ColdTextField(verbose_name=_('source code'), max_length=65536)
+    refcount = models.PositiveIntegerField(verbose_name=_('reference count'), default=0)
+    last_used = models.DateTimeField(verbose_name=_('last used'), db_index=True)
+    archive_key = models.CharField(verbose_name=_('cold storage key'), max_length=64, null=True, blank=True)
+
+    ARCHIVED_FIELDS = ('source',)
+
+    def __str__(self):
+        return self.hash
+
+    @classmethod
+    def get_hash(cls, source):
+        return hashlib.sha256(utf8bytes(source)).hexdigest()
+
+    @classmethod
+    def acquire(cls, source):
+        hash = cls.get_hash(source)
+        while True:
+            now = timezone.now()
+            blob, created = cls.objects.get_or_create(hash=hash, defaults={
+                'source': source, 'refcount': 1, 'last_used': now,
+            })
+            # If the update misses, the last reference was released and the blob deleted after we fetched it.
+            if created or cls.objects.filter(id=blob.id).update(refcount=F('refcount') + 1, last_used=now):
+                return blob
+
+    @classmethod
+    def release(cls, blob_id):
+        cls.objects.filter(id=blob_id).update(refcount=F('refcount') - 1)
+        cls.objects.filter(id=blob_id, refcount=0).delete()
+
+    class Meta:
+        verbose_name = _('shared submission source')
+        verbose_name_plural = _('shared submission sources')
+
+
+class SubmissionSource(ColdStorageMixin, models.Model):
     submission = models.OneToOneField(Submission, on_delete=models.CASCADE, verbose_name=_('associated submission'),
                                       related_name='source')
-    source = models.TextField(verbose_name=_('source code'), max_length=65536)
+    source = ColdTextField(verbose_name=_('source code'), max_length=65536)
+    blob = models.ForeignKey(SourceBlob, verbose_name=_('shared source'), null=True, blank=True,
+                             on_delete=models.PROTECT, related_name='+')
+    archive_key = models.CharField(verbose_name=_('cold storage key'), max_length=64, null=True, blank=True)
+
+    ARCHIVED_FIELDS = ('source',)
 
     def __str__(self):
         return _('Source of %(submission)s') % {'submission': self.submission}
 
+    @property
+    def has_archived_data(self):
+        return self.blob_id is not None or super().has_archived_data
+
+    def load_archived_data(self):
+        if self.blob_id is not None:
+            return {'source': self.blob.source}
+        return super().load_archived_data()
+
+    def save(self, *args, **kwargs):
+        source = self.__dict__.get('source')
+        # New sources, and sources edited in place, are moved into the blob shared by all identical sources.
+        if source is not None and (source or self._state.adding and self.blob_id is None):
+            old_blob_id = self.blob_id
+            self.blob = SourceBlob.acquire(source)
+            self.source = ''
+            self.archive_key = None
+            self.__dict__.pop('archived_data', None)
+            super().save(*args, **kwargs)
+            if old_blob_id is not None:
+                SourceBlob.release(old_blob_id)
+            Submission.objects.filter(id=self.submission_id).update(source_hash=self.blob.hash)
+        else:
+            super().save(*args, **kwargs)
+
+    # Use these to fetch sources with values_list(), which bypasses the read-through descriptor.
+    VALUES_FIELDS = ('source__source', 'source__archive_key', 'source__blob__source', 'source__blob__archive_key')
+
+    @classmethod
+    def resolve_source(cls, source, archive_key, blob_source=None, blob_archive_key=None):
+        if source:
+            return source
+        if blob_source:
+            return blob_source
+        key = blob_archive_key or archive_key
+        return load_fields(key)['source'] if key else source
+
     class Meta:
         verbose_name = _('submission source')
         verbose_name_plural = _('submission sources')
 
 
 @revisions.register()
-class SubmissionTestCase(models.Model):
+class SubmissionTestCase(ColdStorageMixin, models.Model):
     RESULT = SUBMISSION_RESULT
 
     submission = models.ForeignKey(Submission, verbose_name=_('associated submission'), db_index=False,
@@ -289,8 +413,11 @@ class SubmissionTestCase(models.Model):
     total = models.FloatField(verbose_name=_('points possible'), null=True)
     batch = models.IntegerField(verbose_name=_('batch number'), null=True)
     feedback = models.CharField(max_length=50, verbose_name=_('judging feedback'), blank=True)
-    extended_feedback = models.TextField(verbose_name=_('extended judging feedback'), blank=True)
-    output = models.TextField(verbose_name=_('program output'), blank=True)
+    extended_feedback = ColdTextField(verbose_name=_('extended judging feedback'), blank=True)
+    output = ColdTextField(verbose_name=_('program output'), blank=True)
+    archive_key = models.CharField(verbose_name=_('cold storage key'), max_length=64, null=True, blank=True)
+
+    ARCHIVED_FIELDS = ('extended_feedback', 'output')
 
     @property
     def long_status(self):
@@ -306,3 +433,63 @@ class SubmissionTestCase(models.Model):
         unique_together = ('submission', 'case')
         verbose_name = _('submission test case')
         verbose_name_plural = _('submission test cases')
+
+
+class SubmissionOutbox(models.Model):
+    submission = models.OneToOneField(Submission, verbose_name=_('submission'), related_name='outbox',
+                                      on_delete=models.CASCADE)
+    judge_id = models.CharField(max_length=50, verbose_name=_('judge'), null=True, blank=True)
+    priority = models.IntegerField(verbose_name=_('priority'))
+    attempts = models.PositiveIntegerField(verbose_name=_('delivery attempts'), default=0)
+    next_attempt = models.DateTimeField(verbose_name=_('next delivery attempt'), default=timezone.now, db_index=True)
+    last_error = models.TextField(verbose_name=_('last delivery error'), blank=True)
+
+    class Meta:
+        verbose_name = _('queued submission')
+        verbose_name_plural = _('queued submissions')
+
+
+class SubmissionRejudge(models.Model):
+    submission = models.ForeignKey(Submission, verbose_name=_('submission'), related_name='rejudges',
+                                   on_delete=models.CASCADE)
+    date = models.DateTimeField(verbose_name=_('rejudge date'), default=timezone.now)
+    user = models.ForeignKey(Profile, verbose_name=_('rejudged by'), null=True, blank=True, related_name='+',
+                             on_delete=models.SET_NULL)
+
+    # The result of the submission before it was rejudged.
+    result = models.CharField(verbose_name=_('result'), max_length=3, choices=SUBMISSION_RESULT, null=True,
+                              blank=True)
+    points = models.FloatField(verbose_name=_('points granted'), null=True)
+    time = models.FloatField(verbose_name=_('execution time'), null=True)
+    memory = models.FloatField(verbose_name=_('memory usage'), null=True)
+    case_points = models.FloatField(verbose_name=_('test case points'), default=0)
+    case_total = models.FloatField(verbose_name=_('test case total points'), default=0)
+    judged_on = models.ForeignKey('Judge', verbose_name=_('judged on'), null=True, blank=True, related_name='+',
+                                  on_delete=models.SET_NULL)
+    judged_date = models.DateTimeField(verbose_name=_('submission judge time'), null=True)
+
+    @classmethod
+    def record(cls, submissions, user=None):
+        """Saves the current results of the submissions, which are about to be rejudged by user.
+
+        Full revisions of the submissions and their test cases are only saved if DMOJ_REJUDGE_FULL_REVISIONS is set,
+        as they include every test case output."""
+        if settings.DMOJ_REJUDGE_FULL_REVISIONS:
+            for submission in submissions:
+                with revisions.create_revision(manage_manually=True):
+                    if user:
+                        revisions.set_user(user)
+                    revisions.set_comment('Rejudged')
+                    revisions.add_to_revision(submission)
+
+        profile_id = user.profile.id if user is not None else None
+        cls.objects.bulk_create([cls(
+            submission_id=submission.id, user_id=profile_id, result=submission.result, points=submission.points,
+            time=submission.time, memory=submission.memory, case_points=submission.case_points,
+            case_total=submission.case_total, judged_on_id=submission.judged_on_id,
+            judged_date=submission.judged_date,
+        ) for submission in submissions])
+
+    class Meta:
+        verbose_name = _('submission rejudge')
+        verbose_name_plural = _('submission rejudges')
@@ -1,10 +1,19 @@
+import random
+from unittest import mock
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.test import SimpleTestCase, TestCase
 from django.utils import timezone
 
-from judge.models import Contest, ContestParticipation, ContestTag
+from judge.models import Contest, ContestParticipation, ContestTag, Profile, Rating, Submission
 from judge.models.contest import MinValueOrNoneValidator
-from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, create_user
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem, create_user
+from judge.ratings import rate_contest
+from judge.utils.celery import Progress
+from judge.utils.visibility import get_visible_contest_ids
+from judge.views.contests import contest_ranking_list, make_contest_ranking_profile
 
 
 class ContestTestCase(CommonDataMixin, TestCase):
@@ -914,6 +923,10 @@ class ContestTestCase(CommonDataMixin, TestCase):
                     Contest.get_visible_contests(user).values_list('key', flat=True),
                     contest_keys,
                 )
+                self.assertCountEqual(
+                    get_visible_contest_ids(user).restrict(Contest.objects.all()).values_list('key', flat=True),
+                    contest_keys,
+                )
 
     def test_contest_clean(self):
         _now = timezone.now()
@@ -950,6 +963,29 @@ class ContestTestCase(CommonDataMixin, TestCase):
         del contest.get_label_for_problem
         contest.full_clean()
 
+    def test_problem_labels(self):
+        self.assertEqual(self.basic_contest.get_problem_labels(3), ['1', '2', '3'])
+
+        contest = create_contest(key='lua_labels', problem_label_script="""
+            function(n)
+                return string.char(65 + n)
+            end
+        """)
+        self.assertEqual(contest.get_problem_labels(3), ['A', 'B', 'C'])
+        with mock.patch('judge.models.contest.compile_label_script') as compile_label_script:
+            contest = Contest.objects.get(id=contest.id)
+            self.assertEqual(contest.get_problem_labels(2), ['A', 'B'])
+            self.assertEqual(contest.get_problem_labels(3), ['A', 'B', 'C'])
+        compile_label_script.assert_not_called()
+
+        # Labels generated by an older script are not used.
+        contest.problem_label_script = """
+            function(n)
+                return tostring(n * 2)
+            end
+        """
+        self.assertEqual(contest.get_problem_labels(3), ['0', '2', '4'])
+
     def test_normal_user_current_contest(self):
         current_contest = self.users['normal'].profile.current_contest
         self.assertIsNotNone(current_contest)
@@ -1003,6 +1039,151 @@ class ContestTestCase(CommonDataMixin, TestCase):
         self.assertIsInstance(participation.end_time, timezone.datetime)
 
 
+class ContestRankingCacheTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='ranking_cache')
+        self.contest_problem = create_contest_problem(
+            contest=self.contest, problem=create_problem(code='ranking_cache'), points=100,
+        )
+        self.participations = [
+            create_contest_participation(contest=self.contest, user=username)
+            for username in ('normal', 'superuser')
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ranking(self):
+        contest = Contest.objects.get(id=self.contest.id)
+        return contest_ranking_list(contest, list(contest.contest_problems.select_related('problem')))
+
+    def submit(self, participation, points):
+        submission = Submission.objects.create(
+            user=participation.user, problem=self.contest_problem.problem, language_id=1,
+            status='D', result='AC', case_points=points, case_total=100,
+        )
+        submission.contest = self.contest_problem.submissions.create(
+            submission=submission, participation=participation, points=points,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ContestParticipation.objects.get(id=participation.id).apply_submission(submission)
+
+    def test_rows_match_rendered(self):
+        self.submit(self.participations[0], 50)
+        contest = Contest.objects.get(id=self.contest.id)
+        problems = list(contest.contest_problems.select_related('problem'))
+
+        cached = self.get_ranking()
+        self.assertEqual([profile.username for profile in cached], ['normal', 'superuser'])
+        for profile in cached:
+            participation = ContestParticipation.objects.get(contest=contest, user_id=profile.id)
+            expected = make_contest_ranking_profile(contest, participation, problems)
+            self.assertEqual(profile.problem_cells, expected.problem_cells)
+            self.assertEqual(profile.result_cell, expected.result_cell)
+            self.assertEqual(profile.points, expected.points)
+            self.assertEqual(profile.participation.id, participation.id)
+            self.assertEqual(profile.participation.ended, participation.ended)
+
+    def test_cached(self):
+        self.get_ranking()
+        contest = Contest.objects.get(id=self.contest.id)
+        problems = list(contest.contest_problems.select_related('problem'))
+        with self.assertNumQueries(0):
+            contest_ranking_list(contest, problems)
+
+    def test_version_bumped(self):
+        participation = self.participations[1]
+        version = ContestParticipation.objects.get(id=participation.id).version
+        self.assertEqual(self.get_ranking()[0].username, 'normal')
+
+        self.submit(participation, 100)
+        self.assertEqual(ContestParticipation.objects.get(id=participation.id).version, version + 1)
+        ranking = self.get_ranking()
+        self.assertEqual(ranking[0].username, 'superuser')
+        self.assertEqual(ranking[0].points, 100)
+
+    def test_joined(self):
+        self.assertEqual(len(self.get_ranking()), 2)
+        create_contest_participation(contest=self.contest, user='staff_problem_see_all')
+        self.assertEqual(len(self.get_ranking()), 3)
+
+
+class ContestRateTestCase(TestCase):
+    """Checks that replaying the ratings of several contests gives the same results as rating them one by one."""
+
+    @classmethod
+    def setUpTestData(self):
+        rng = random.Random(0)
+        now = timezone.now()
+        users = [create_user(username='rated_%d' % i).profile for i in range(12)]
+        self.contests = []
+        for i in range(4):
+            contest = create_contest(
+                key='rated_%d' % i, is_rated=True, rate_all=True,
+                start_time=now - timezone.timedelta(days=20 - i, hours=2),
+                end_time=now - timezone.timedelta(days=20 - i),
+                rating_floor=1300 if i == 3 else None,
+                rate_exclude=('rated_0',) if i == 2 else (),
+            )
+            for user in rng.sample(users, 9):
+                create_contest_participation(
+                    contest=contest, user=user, score=rng.randrange(4) * 100, cumtime=rng.randrange(1000),
+                )
+            self.contests.append(contest)
+        self.unrated = create_user(username='unrated').profile
+        create_contest_participation(contest=self.contests[0], user=self.unrated, virtual=1)
+
+    def get_ratings(self):
+        ratings = list(Rating.objects.order_by('contest_id', 'user_id')
+                       .values_list('contest_id', 'user_id', 'participation_id', 'rank', 'rating', 'mean',
+                                    'performance'))
+        profiles = list(Profile.objects.order_by('id').values_list('id', 'rating'))
+        return ratings, profiles
+
+    def assertSameRatings(self, expected):
+        ratings, profiles = self.get_ratings()
+        self.assertEqual(profiles, expected[1])
+        self.assertEqual(len(ratings), len(expected[0]))
+        for rating, expected_rating in zip(ratings, expected[0]):
+            self.assertEqual(rating[:5], expected_rating[:5])
+            self.assertAlmostEqual(rating[5], expected_rating[5])
+            self.assertAlmostEqual(rating[6], expected_rating[6])
+
+    def test_replay(self):
+        for contest in self.contests:
+            rate_contest(contest)
+        expected = self.get_ratings()
+        self.assertIsNone(Profile.objects.get(id=self.unrated.id).rating)
+
+        Rating.objects.all().delete()
+        Profile.objects.update(rating=None)
+        self.contests[0].rate()
+        self.assertSameRatings(expected)
+
+        # Rerating from a later contest leaves the earlier ratings, and rates the later ones as before.
+        self.contests[2].rate()
+        self.assertSameRatings(expected)
+
+    def test_rerate_excluded(self):
+        for contest in self.contests:
+            rate_contest(contest)
+        self.contests[1].rate_exclude.add(*self.contests[1].users.values_list('user_id', flat=True))
+        self.contests[1].rate()
+        self.assertFalse(Rating.objects.filter(contest=self.contests[1]).exists())
+        # Everyone's rating is their last one, or none.
+        for profile in Profile.objects.all():
+            last = Rating.objects.filter(user=profile).order_by('-contest__end_time').first()
+            self.assertEqual(profile.rating, last and last.rating)
+
+    def test_progress(self):
+        progress = mock.Mock(spec=Progress)
+        self.contests[1].rate(progress=progress)
+        self.assertEqual(progress.total, 3)
+        self.assertEqual(progress.did.call_count, 3)
+
+
 class ContestTagTestCase(TestCase):
     @classmethod
     def setUpTestData(self):
@@ -0,0 +1,173 @@
+import random
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.models import ContestParticipation, ContestSubmission, Language, Submission, SubmissionTestCase
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem
+
+FORMATS = [
+    ('default', {}),
+    ('ioi', {'cumtime': True}),
+    ('ioi16', {}),
+    ('ioi16', {'cumtime': True}),
+    ('icpc', {}),
+    ('icpc', {'penalty': 0}),
+    ('atcoder', {}),
+    ('ecoo', {'cumtime': True}),
+]
+# These formats use MySQL specific SQL.
+RAW_SQL_FORMATS = {'ioi16', 'icpc', 'atcoder'}
+
+
+class ApplySubmissionTestCase(CommonDataMixin, TestCase):
+    """Checks that updating a participation after each graded submission gives the same results as recomputing it
+    from scratch, over random sequences of submissions and rejudges."""
+
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problems = [create_problem(code='apply_submission_%d' % i, points=10) for i in range(3)]
+
+    def create_participation(self, format_name, format_config):
+        key = '%s_%d' % (format_name, len(format_config))
+        contest = create_contest(key=key, format_name=format_name, format_config=format_config)
+        contest_problems = [
+            create_contest_problem(contest=contest, problem=problem, points=100, partial=i != 0, order=i)
+            for i, problem in enumerate(self.problems)
+        ]
+        participation = create_contest_participation(contest=contest, user='normal')
+        return participation, contest_problems
+
+    def grade(self, rng, submission, contest_submission):
+        submission.test_cases.all().delete()
+        result = rng.choice(['AC', 'WA', 'TLE', 'CE', 'IE'])
+        points = 0
+        if result not in ('CE', 'IE'):
+            cases = [(case, rng.choice([None, 1, 1, 2]), rng.choice([0, 1]) if result != 'AC' else 1)
+                     for case in range(1, 5)]
+            SubmissionTestCase.objects.bulk_create([
+                SubmissionTestCase(submission=submission, case=case, batch=batch, points=case_points, total=1,
+                                   status='AC' if case_points else 'WA')
+                for case, batch, case_points in cases
+            ])
+            points = sum(case_points for _, _, case_points in cases)
+
+        submission.result = result
+        submission.status = result if result in ('CE', 'IE') else 'D'
+        submission.case_points = points
+        submission.case_total = 4
+        submission.save()
+
+        problem = contest_submission.problem
+        contest_submission.points = points / 4 * problem.points
+        if not problem.partial and points != 4:
+            contest_submission.points = 0
+        contest_submission.save()
+
+    def get_results(self, participation):
+        participation = ContestParticipation.objects.get(id=participation.id)
+        return participation.score, participation.cumtime, participation.tiebreaker, participation.format_data or {}
+
+    def assertSameResults(self, incremental, full):
+        self.assertAlmostEqual(incremental[0], full[0])
+        self.assertAlmostEqual(incremental[1], full[1])
+        self.assertAlmostEqual(incremental[2], full[2])
+        self.assertEqual(incremental[3].keys(), full[3].keys())
+        for problem, data in full[3].items():
+            self.assertEqual(incremental[3][problem].keys(), data.keys())
+            for key, value in data.items():
+                self.assertAlmostEqual(incremental[3][problem][key], value, msg='%s of problem %s' % (key, problem))
+
+    def test_equivalence(self):
+        for format_name, format_config in FORMATS:
+            with self.subTest(format=format_name, config=format_config):
+                if format_name in RAW_SQL_FORMATS and connection.vendor != 'mysql':
+                    self.skipTest('requires MySQL')
+                rng = random.Random(format_name + str(format_config))
+                participation, contest_problems = self.create_participation(format_name, format_config)
+                start = participation.start
+                submissions = []
+
+                for _ in range(30):
+                    if submissions and rng.random() < 0.3:
+                        # Rejudge an earlier submission.
+                        submission, contest_submission = rng.choice(submissions)
+                    else:
+                        contest_problem = rng.choice(contest_problems)
+                        submission = Submission.objects.create(
+                            user=participation.user, problem=contest_problem.problem, language=Language.get_python3(),
+                        )
+                        # The submission time is set on creation.
+                        Submission.objects.filter(id=submission.id).update(
+                            date=start + timezone.timedelta(minutes=rng.randrange(1, 300)),
+                        )
+                        submission.refresh_from_db()
+                        contest_submission = ContestSubmission.objects.create(
+                            submission=submission, problem=contest_problem, participation=participation,
+                        )
+                        submissions.append((submission, contest_submission))
+
+                    self.grade(rng, submission, contest_submission)
+                    ContestParticipation.objects.get(id=participation.id).apply_submission(submission)
+                    incremental = self.get_results(participation)
+
+                    ContestParticipation.objects.get(id=participation.id).recompute_results()
+                    self.assertSameResults(incremental, self.get_results(participation))
+
+                    # Continue from the incremental results, so that errors would accumulate.
+                    ContestParticipation.objects.filter(id=participation.id).update(
+                        score=incremental[0], cumtime=incremental[1], tiebreaker=incremental[2],
+                    )
+                    participation = ContestParticipation.objects.get(id=participation.id)
+                    participation.format_data = incremental[3]
+                    participation.save(update_fields=['format_data'])
+
+
+class UpdateParticipationsTestCase(ApplySubmissionTestCase):
+    """Checks that recomputing the results of several participations at once gives the same results as recomputing
+    each of them."""
+
+    def test_equivalence(self):
+        for format_name, format_config in FORMATS:
+            with self.subTest(format=format_name, config=format_config):
+                if format_name in RAW_SQL_FORMATS and connection.vendor != 'mysql':
+                    self.skipTest('requires MySQL')
+                rng = random.Random(format_name + str(format_config))
+                participation, contest_problems = self.create_participation(format_name, format_config)
+                contest = participation.contest
+                participations = [participation] + [
+                    create_contest_participation(contest=contest, user=username)
+                    for username in ('superuser', 'staff_problem_edit_own')
+                ]
+                participations[2].is_disqualified = True
+                participations[2].save()
+
+                for _ in range(30):
+                    participation = rng.choice(participations)
+                    contest_problem = rng.choice(contest_problems)
+                    submission = Submission.objects.create(
+                        user=participation.user, problem=contest_problem.problem, language=Language.get_python3(),
+                    )
+                    Submission.objects.filter(id=submission.id).update(
+                        date=participation.start + timezone.timedelta(minutes=rng.randrange(1, 300)),
+                    )
+                    submission.refresh_from_db()
+                    contest_submission = ContestSubmission.objects.create(
+                        submission=submission, problem=contest_problem, participation=participation,
+                    )
+                    self.grade(rng, submission, contest_submission)
+
+                for participation in participations:
+                    ContestParticipation.objects.get(id=participation.id).recompute_results()
+                expected = [self.get_results(participation) for participation in participations]
+                versions = [ContestParticipation.objects.get(id=participation.id).version
+                            for participation in participations]
+
+                contest.users.update(score=0, cumtime=0, tiebreaker=0, format_data=None)
+                contest.recompute_results()
+                for participation, results, version in zip(participations, expected, versions):
+                    self.assertSameResults(self.get_results(participation), results)
+                    self.assertEqual(ContestParticipation.objects.get(id=participation.id).version, version + 1)
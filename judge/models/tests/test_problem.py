@@ -6,6 +6,7 @@ from judge.models import Language, LanguageLimit, Problem, Submission
 from judge.models.problem import VotePermission, disallowed_characters_validator
 from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
     create_organization, create_problem, create_problem_type, create_solution, create_user
+from judge.utils.visibility import get_visible_problem_ids
 
 
 class ProblemTestCase(CommonDataMixin, TestCase):
@@ -312,6 +313,10 @@ class ProblemTestCase(CommonDataMixin, TestCase):
                         Problem.get_visible_problems(user).distinct().values_list('code', flat=True),
                         problem_codes,
                     )
+                    self.assertCountEqual(
+                        get_visible_problem_ids(user).restrict(Problem.objects.all()).values_list('code', flat=True),
+                        problem_codes,
+                    )
 
                 with self.subTest(list='editable problems'):
                     # We only care about consistency between Problem.is_editable_by and Problem.get_editable_problems
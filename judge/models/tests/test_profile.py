@@ -106,6 +106,31 @@ class ProfileTestCase(CommonDataMixin, TestCase):
                 self.profile.update_contest()
                 self.assertIsNone(self.profile.current_contest)
 
+    def test_update_contest_cached(self):
+        _now = timezone.now()
+        contest = create_contest(
+            key='cached_membership_contest',
+            start_time=_now - timezone.timedelta(days=1),
+            end_time=_now + timezone.timedelta(days=1),
+            is_visible=True,
+        )
+        participation = create_contest_participation(contest=contest, user=self.profile)
+        self.profile.current_contest = participation
+        self.profile.save()
+        self.profile.update_contest()
+
+        profile = Profile.objects.get(id=self.profile.id)
+        with self.assertNumQueries(0):
+            profile.update_contest()
+        self.assertEqual(profile.current_contest_id, participation.id)
+
+        # Hiding the contest changes the visibility version, so the participation is checked again.
+        contest.is_visible = False
+        contest.save()
+        profile = Profile.objects.get(id=self.profile.id)
+        profile.update_contest()
+        self.assertIsNone(profile.current_contest)
+
     def test_css_class(self):
         self.assertEqual(self.profile.css_class, 'rating rate-none user')
 
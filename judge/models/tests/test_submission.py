@@ -1,9 +1,20 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from reversion.models import Version
 
-from judge.models import ContestSubmission, Language, Submission, SubmissionSource
+from judge.caching import submission_status_key
+from judge.judgeapi import dispatch_queued_submissions, queue_submission
+from judge.models import ContestSubmission, Language, LanguageLimit, Problem, SourceBlob, Submission, \
+    SubmissionOutbox, SubmissionRejudge, SubmissionSource, SubmissionTestCase as SubmissionTestCaseModel
 from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
     create_contest_problem, create_problem, create_user
+from judge.tasks import rejudge_problem_filter, rescore_problem
+from judge.utils.celery import Progress
+from judge.views.submission import get_submission_status
 
 
 class SubmissionTestCase(CommonDataMixin, TestCase):
@@ -188,3 +199,408 @@ class SubmissionTestCase(CommonDataMixin, TestCase):
             },
         }
         self._test_object_methods_with_users(self.ie_submission, data)
+
+
+class SubmissionColdStorageTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+
+        self.old_submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=create_problem(code='cold'),
+            language=Language.get_python3(),
+            result='WA',
+            status='D',
+        )
+        Submission.objects.filter(id=self.old_submission.id).update(date=timezone.now() - timezone.timedelta(days=400))
+        SubmissionSource.objects.create(submission=self.old_submission, source='print(input()[::-1])')
+        SourceBlob.objects.update(last_used=timezone.now() - timezone.timedelta(days=400))
+        SubmissionTestCaseModel.objects.create(submission=self.old_submission, case=1, status='WA', output='1 2',
+                                               extended_feedback='expected 3')
+        SubmissionTestCaseModel.objects.create(submission=self.old_submission, case=2, status='AC')
+
+        self.new_submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=create_problem(code='hot'),
+            language=Language.get_python3(),
+            result='AC',
+            status='D',
+        )
+        SubmissionSource.objects.create(submission=self.new_submission, source='print(input())')
+
+    def setUp(self):
+        self.storage_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(DMOJ_COLD_STORAGE_ROOT=self.storage_dir.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.storage_dir.cleanup()
+
+    def test_archive_read_through(self):
+        from judge.tasks import archive_submission_data
+
+        cutoff = timezone.now() - timezone.timedelta(days=180)
+        self.assertEqual(sum(archive_submission_data(cutoff, batch_size=1)), 2)
+
+        source = SubmissionSource.objects.select_related('blob').get(submission=self.old_submission)
+        self.assertIsNotNone(source.blob.archive_key)
+        self.assertEqual(SourceBlob.objects.filter(id=source.blob_id).values_list('source', flat=True).get(), '')
+        self.assertEqual(source.source, 'print(input()[::-1])')
+        self.assertEqual(SubmissionSource.resolve_source('', None, '', source.blob.archive_key), 'print(input()[::-1])')
+
+        case = SubmissionTestCaseModel.objects.get(submission=self.old_submission, case=1)
+        self.assertEqual(case.output, '1 2')
+        self.assertEqual(case.extended_feedback, 'expected 3')
+        self.assertIsNone(SubmissionTestCaseModel.objects.get(submission=self.old_submission, case=2).archive_key)
+
+        self.assertIsNone(SubmissionSource.objects.get(submission=self.new_submission).blob.archive_key)
+        self.assertEqual(sum(archive_submission_data(cutoff)), 0)
+
+
+class SourceDeduplicationTestCase(CommonDataMixin, TestCase):
+    def create_submission(self, source):
+        submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=self.problem,
+            language=Language.get_python3(),
+            result='AC',
+            status='D',
+        )
+        SubmissionSource.objects.create(submission=submission, source=source)
+        submission.refresh_from_db()
+        return submission
+
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='dedup')
+
+    def test_identical_sources_share_blob(self):
+        first = self.create_submission('print(1)')
+        second = self.create_submission('print(1)')
+        other = self.create_submission('print(2)')
+
+        self.assertEqual(first.source_hash, SourceBlob.get_hash('print(1)'))
+        self.assertEqual(first.source_hash, second.source_hash)
+        self.assertNotEqual(first.source_hash, other.source_hash)
+        self.assertEqual(first.source.blob_id, second.source.blob_id)
+        self.assertEqual(first.source.source, 'print(1)')
+        self.assertEqual(SubmissionSource.objects.filter(id=first.source.id).values_list('source', flat=True).get(), '')
+
+        blob = SourceBlob.objects.get(hash=first.source_hash)
+        self.assertEqual(blob.refcount, 2)
+
+        first.source.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+
+        second.source.delete()
+        self.assertFalse(SourceBlob.objects.filter(id=blob.id).exists())
+
+    def test_edit_source(self):
+        submission = self.create_submission('print(3)')
+        old_hash = submission.source_hash
+
+        submission.source.source = 'print(4)'
+        submission.source.save()
+        submission.refresh_from_db()
+
+        self.assertEqual(submission.source.source, 'print(4)')
+        self.assertNotEqual(submission.source_hash, old_hash)
+        self.assertFalse(SourceBlob.objects.filter(hash=old_hash).exists())
+
+
+@override_settings(DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS=2)
+class SubmissionOutboxTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='outbox')
+
+    def create_queued_submission(self):
+        submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=self.problem,
+            language=Language.get_python3(),
+        )
+        SubmissionSource.objects.create(submission=submission, source='print(1)')
+        queue_submission(submission, judge_id='judge')
+        return submission
+
+    def received(self, packet):
+        return {'name': 'submission-received', 'submission-id': packet['submission-id']}
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_dispatch(self, judge_request):
+        submission = self.create_queued_submission()
+        judge_request.side_effect = self.received
+
+        self.assertEqual(dispatch_queued_submissions(), 1)
+        packet = judge_request.call_args[0][0]
+        self.assertEqual(packet['submission-id'], submission.id)
+        self.assertEqual(packet['judge-id'], 'judge')
+        self.assertEqual(packet['source'], 'print(1)')
+        self.assertFalse(SubmissionOutbox.objects.exists())
+        self.assertEqual(dispatch_queued_submissions(), 0)
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_retry(self, judge_request):
+        submission = self.create_queued_submission()
+        judge_request.side_effect = ConnectionRefusedError
+
+        self.assertEqual(dispatch_queued_submissions(), 1)
+        entry = SubmissionOutbox.objects.get(submission=submission)
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt, timezone.now())
+
+        # Not due for another attempt yet.
+        self.assertEqual(dispatch_queued_submissions(), 0)
+
+        SubmissionOutbox.objects.update(next_attempt=timezone.now())
+        judge_request.side_effect = self.received
+        self.assertEqual(dispatch_queued_submissions(), 1)
+        self.assertFalse(SubmissionOutbox.objects.exists())
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'QU')
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_give_up(self, judge_request):
+        submission = self.create_queued_submission()
+        judge_request.side_effect = ConnectionRefusedError
+
+        dispatch_queued_submissions()
+        SubmissionOutbox.objects.update(next_attempt=timezone.now())
+        dispatch_queued_submissions()
+        self.assertFalse(SubmissionOutbox.objects.exists())
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'IE')
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_lease(self, judge_request):
+        submission = self.create_queued_submission()
+
+        def claimed(packet):
+            # Other dispatchers skip the entry while it is being sent.
+            self.assertGreater(SubmissionOutbox.objects.get(submission=submission).next_attempt, timezone.now())
+            self.assertEqual(dispatch_queued_submissions(), 0)
+            return self.received(packet)
+        judge_request.side_effect = claimed
+
+        self.assertEqual(dispatch_queued_submissions(), 1)
+        self.assertFalse(SubmissionOutbox.objects.exists())
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_expired_lease(self, judge_request):
+        submission = self.create_queued_submission()
+
+        def reclaimed(packet):
+            # The lease expired, and another dispatcher sent the submission meanwhile.
+            SubmissionOutbox.objects.filter(submission=submission).delete()
+            raise ConnectionRefusedError()
+        judge_request.side_effect = reclaimed
+
+        with self.settings(DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS=1):
+            self.assertEqual(dispatch_queued_submissions(), 1)
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'QU')
+
+    @mock.patch('judge.judgeapi.judge_request')
+    def test_give_up_grading(self, judge_request):
+        submission = self.create_queued_submission()
+
+        def grading(packet):
+            # The bridge received the submission, but the reply was lost.
+            Submission.objects.filter(id=submission.id).update(status='G')
+            raise ConnectionResetError()
+        judge_request.side_effect = grading
+
+        with self.settings(DMOJ_SUBMISSION_OUTBOX_MAX_ATTEMPTS=1):
+            dispatch_queued_submissions()
+        self.assertFalse(SubmissionOutbox.objects.exists())
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'G')
+
+
+class SubmissionStatusCacheTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='status_cache', time_limit=2)
+
+    def setUp(self):
+        cache.clear()
+        self.submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=self.problem,
+            language=Language.get_python3(),
+            status='G',
+        )
+        for case, status in enumerate(['AC', 'WA'], 1):
+            SubmissionTestCaseModel.objects.create(submission=self.submission, case=case, status=status,
+                                                   points=1 if status == 'AC' else 0, total=1, time=0.5)
+
+    def test_in_progress_not_cached(self):
+        get_submission_status(self.submission)
+        with self.assertNumQueries(2):
+            batches, statuses, max_time, time_limit = get_submission_status(self.submission)
+        self.assertEqual([case.status for case in statuses], ['AC', 'WA'])
+        self.assertEqual(time_limit, 2)
+
+    def test_graded_cached(self):
+        Submission.objects.filter(id=self.submission.id).update(status='D', result='WA', case_points=1, case_total=2)
+        self.submission.refresh_from_db()
+        get_submission_status(self.submission)
+        # Only the time limit is queried.
+        with self.assertNumQueries(1):
+            batches, statuses, max_time, time_limit = get_submission_status(self.submission)
+        self.assertEqual([case.status for case in batches[0]['cases']], ['AC', 'WA'])
+        self.assertEqual([case.result_class for case in batches[0]['cases']], ['AC', 'WA'])
+        self.assertEqual(max_time, 0.5)
+
+        # A rejudge changes the stamp, even if the cache was not invalidated.
+        SubmissionTestCaseModel.objects.filter(submission=self.submission, case=2).update(status='AC', points=1)
+        Submission.objects.filter(id=self.submission.id).update(result='AC', case_points=2,
+                                                                rejudged_date=timezone.now())
+        self.submission.refresh_from_db()
+        batches, statuses, max_time, time_limit = get_submission_status(self.submission)
+        self.assertEqual([case.status for case in statuses], ['AC', 'AC'])
+
+    def test_output_not_cached(self):
+        SubmissionTestCaseModel.objects.filter(submission=self.submission, case=2).update(output='wrong' * 1000)
+        Submission.objects.filter(id=self.submission.id).update(status='D', result='WA', case_points=1, case_total=2)
+        self.submission.refresh_from_db()
+        get_submission_status(self.submission)
+        self.assertNotIn('wrong', str(cache.get(submission_status_key(self.submission.id))))
+
+        with self.assertNumQueries(2):
+            batches, statuses, max_time, time_limit = get_submission_status(self.submission)
+        self.assertEqual([case.output for case in batches[0]['cases']], ['', 'wrong' * 1000])
+
+    def test_time_limit_not_cached(self):
+        Submission.objects.filter(id=self.submission.id).update(status='D', result='WA', case_points=1, case_total=2)
+        self.submission.refresh_from_db()
+        get_submission_status(self.submission)
+        LanguageLimit.objects.create(problem=self.problem, language=Language.get_python3(), time_limit=5,
+                                     memory_limit=65536)
+        self.assertEqual(get_submission_status(self.submission)[3], 5)
+
+
+@mock.patch('judge.judgeapi._send_submission')
+class SubmissionRejudgeTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.submission = Submission.objects.create(
+            user=self.users['normal'].profile,
+            problem=create_problem(code='rejudge_history'),
+            language=Language.get_python3(),
+            result='WA',
+            status='D',
+            points=1,
+            time=0.5,
+            memory=1024,
+            case_points=1,
+            case_total=2,
+        )
+        SubmissionTestCaseModel.objects.create(submission=self.submission, case=1, status='WA', output='x' * 100)
+
+    def test_history(self, send_submission):
+        self.assertTrue(self.submission.judge(rejudge=True, rejudge_user=self.users['superuser']))
+        send_submission.assert_called_once()
+
+        rejudge = SubmissionRejudge.objects.get(submission=self.submission)
+        self.assertEqual(rejudge.user, self.users['superuser'].profile)
+        self.assertEqual((rejudge.result, rejudge.points, rejudge.time, rejudge.memory), ('WA', 1, 0.5, 1024))
+        self.assertEqual((rejudge.case_points, rejudge.case_total), (1, 2))
+        self.assertFalse(Version.objects.exists())
+
+    @override_settings(DMOJ_REJUDGE_FULL_REVISIONS=True)
+    def test_full_revisions(self, send_submission):
+        self.submission.judge(rejudge=True, rejudge_user=self.users['superuser'])
+        self.assertEqual(SubmissionRejudge.objects.filter(submission=self.submission).count(), 1)
+        self.assertTrue(Version.objects.get_for_object(self.submission).exists())
+
+    def test_not_recorded(self, send_submission):
+        self.submission.judge()
+        self.submission.judge(rejudge=True, record_rejudge=False)
+        self.assertFalse(SubmissionRejudge.objects.exists())
+
+    def test_in_progress_not_recorded(self, send_submission):
+        Submission.objects.filter(id=self.submission.id).update(status='G')
+        self.assertFalse(self.submission.judge(rejudge=True, rejudge_user=self.users['superuser']))
+        send_submission.assert_not_called()
+        self.assertFalse(SubmissionRejudge.objects.exists())
+
+    @mock.patch.object(Progress, '_update_state')
+    def test_batch_rejudge(self, update_state, send_submission):
+        in_progress = Submission.objects.create(user=self.users['normal'].profile, problem=self.submission.problem,
+                                                language=Language.get_python3(), status='G')
+        Submission.objects.create(user=self.users['normal'].profile, problem=self.submission.problem,
+                                  language=Language.get_python3(), status='D', locked_after=timezone.now())
+
+        self.assertEqual(rejudge_problem_filter(self.submission.problem_id, user_id=self.users['superuser'].id), 1)
+        self.assertEqual(list(SubmissionRejudge.objects.values_list('submission_id', flat=True)),
+                         [self.submission.id])
+        self.assertFalse(SubmissionRejudge.objects.filter(submission=in_progress).exists())
+
+
+@override_settings(DMOJ_RESCORE_CHUNK_SIZE=2, DMOJ_RESCORE_CONCURRENCY=0)
+@mock.patch.object(Progress, '_update_state')
+class RescoreProblemTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='rescore', points=10, partial=True, is_public=True)
+        self.contest = create_contest(key='rescore')
+        self.contest_problem = create_contest_problem(problem=self.problem, contest=self.contest, points=100,
+                                                      partial=False)
+        self.participation = create_contest_participation(contest=self.contest, user='normal')
+
+        self.submissions = [
+            Submission.objects.create(user=self.users['normal'].profile, problem=self.problem,
+                                      language=Language.get_python3(), result=result, status='D', points=0,
+                                      case_points=case_points, case_total=case_total)
+            for result, case_points, case_total in [('WA', 1, 4), ('AC', 4, 4), ('CE', 0, 0)]
+        ]
+        for submission in self.submissions[:2]:
+            ContestSubmission.objects.create(submission=submission, problem=self.contest_problem,
+                                             participation=self.participation)
+
+    def test_rescore(self, update_state):
+        self.assertEqual(rescore_problem(self.problem.id), 3)
+
+        points = [Submission.objects.get(id=submission.id).points for submission in self.submissions]
+        self.assertEqual(points, [2.5, 10, 0])
+        contest_points = ContestSubmission.objects.filter(participation=self.participation) \
+                                                  .order_by('submission_id').values_list('points', flat=True)
+        self.assertEqual(list(contest_points), [0, 100])
+
+        self.participation.refresh_from_db()
+        self.assertEqual(self.participation.score, 100)
+        profile = self.users['normal'].profile
+        profile.refresh_from_db()
+        self.assertEqual(profile.points, 10)
+
+    @mock.patch('judge.utils.celery.AsyncResult')
+    def test_chunked(self, async_result, update_state):
+        # Each chunk reports the progress of the rescore, which is replaced by the chains of chunks.
+        with self.settings(DMOJ_RESCORE_CONCURRENCY=2, DMOJ_RESCORE_CHUNK_SIZE=1):
+            result = rescore_problem.apply(args=(self.problem.id,))
+        self.assertTrue(result.successful())
+
+        self.participation.refresh_from_db()
+        self.assertEqual(self.participation.score, 100)
+        profile = self.users['normal'].profile
+        profile.refresh_from_db()
+        self.assertEqual(profile.points, 10)
+
+        stages = [call.args[1]['stage'] for call in async_result.return_value.backend.store_result.call_args_list]
+        self.assertEqual(stages, ['Recalculating contest scores', 'Recalculating user points'])
+
+    def test_not_partial(self, update_state):
+        Problem.objects.filter(id=self.problem.id).update(partial=False)
+        rescore_problem(self.problem.id)
+        points = [Submission.objects.get(id=submission.id).points for submission in self.submissions]
+        self.assertEqual(points, [0, 10, 0])
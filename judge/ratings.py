@@ -1,4 +1,5 @@
 from bisect import bisect
+from collections import defaultdict
 from math import pi, sqrt, tanh
 from operator import attrgetter, itemgetter
 
@@ -8,6 +9,11 @@ from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 BETA2 = 328.33 ** 2
 RATING_INIT = 1200      # Newcomer's rating when applying the rating floor/ceiling
 MEAN_INIT = 1500.
@@ -18,6 +24,8 @@ VAR_PER_CONTEST = 1219.047619 * (BETA2 / 212**2)
 VAR_LIM = (sqrt(VAR_PER_CONTEST**2 + 4 * BETA2 * VAR_PER_CONTEST) - VAR_PER_CONTEST) / 2
 SD_LIM = sqrt(VAR_LIM)
 TANH_C = sqrt(3) / pi
+# Number of rows saved per query when replaying ratings.
+RATING_BATCH_SIZE = 1000
 
 
 def tie_ranker(iterable, key=attrgetter('points')):
@@ -76,7 +84,7 @@ def get_var(times_ranked, cache=[VAR_INIT]):
     return cache[times_ranked]
 
 
-def recalculate_ratings(ranking, old_mean, times_ranked, historical_p):
+def recalculate_ratings_python(ranking, old_mean, times_ranked, historical_p):
     n = len(ranking)
     new_p = [0.] * n
     new_mean = [0.] * n
@@ -139,8 +147,138 @@ def recalculate_ratings(ranking, old_mean, times_ranked, historical_p):
     return new_rating, new_mean, new_p
 
 
+# Number of past performances used for the mean by the NumPy implementation. Their weights decay geometrically,
+# by a factor of about 0.72 per contest, so older performances change the mean by far less than a rating point.
+NUMPY_HISTORY_LIMIT = 64
+# Maximum number of tanh terms evaluated at once by the NumPy implementation, to bound its memory use.
+NUMPY_BLOCK_SIZE = 1 << 22
+
+
+def _np_bisect(evaluate, y_tg):
+    """
+    Does what `solve` does for every target in y_tg at once, where evaluate(x, rows) returns the values of the
+    functions of the given rows at x. Every row starts from the same bounds, so the rows halve their intervals in
+    lockstep and hit exactly the points `solve` would.
+    """
+    n = len(y_tg)
+    L = np.full(n, VALID_RANGE[0])
+    R = np.full(n, VALID_RANGE[1])
+    Ly = np.full(n, np.nan)
+    Ry = np.full(n, np.nan)
+
+    active = R - L > 2
+    while active.any():
+        rows = np.flatnonzero(active)
+        x = (L[rows] + R[rows]) / 2
+        y = evaluate(x, rows)
+        target = y_tg[rows]
+
+        above = y > target
+        R[rows[above]], Ry[rows[above]] = x[above], y[above]
+        below = y < target
+        L[rows[below]], Ly[rows[below]] = x[below], y[below]
+        # An exact hit returns x, which the interpolation below does once both bounds are x.
+        exact = ~above & ~below
+        L[rows[exact]], R[rows[exact]] = x[exact], x[exact]
+        Ly[rows[exact]], Ry[rows[exact]] = y[exact], y[exact]
+
+        active = R - L > 2
+
+    for bound, bound_y in ((L, Ly), (R, Ry)):
+        rows = np.flatnonzero(np.isnan(bound_y))
+        if len(rows):
+            bound_y[rows] = evaluate(bound[rows], rows)
+
+    # Use linear interpolation to be slightly more accurate.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (y_tg - Ly) / (Ry - Ly)
+    return np.where(y_tg <= Ly, L, np.where(y_tg >= Ry, R, L * (1 - ratio) + R * ratio))
+
+
+def _np_eval_tanhs(mu, sd, wt, x):
+    # The same sum as `eval_tanhs` of the terms (mu, sd, wt) at every point of x, in blocks of rows of x.
+    result = np.empty(len(x))
+    step = max(1, NUMPY_BLOCK_SIZE // max(1, len(mu)))
+    for start in range(0, len(x), step):
+        block = x[start:start + step, None]
+        result[start:start + step] = ((wt / sd) * np.tanh((block - mu) / (2 * sd))).sum(axis=1)
+    return result
+
+
+def recalculate_ratings_numpy(ranking, old_mean, times_ranked, historical_p):
+    """
+    A vectorized implementation of `recalculate_ratings_python`, which gives the same results up to rounding and the
+    truncation of the history to NUMPY_HISTORY_LIMIT performances.
+    """
+    n = len(ranking)
+    ranking = np.asarray(ranking, dtype=float)
+    old_mean = np.asarray(old_mean, dtype=float)
+    times_ranked = np.asarray(times_ranked, dtype=int)
+    var = np.array([get_var(t) for t in range(int(times_ranked.max(initial=0)) + 2)])
+
+    if n < 2:
+        new_p = old_mean
+        new_mean = old_mean
+    else:
+        # Note: pre-multiply delta by TANH_C to improve efficiency.
+        delta = TANH_C * np.sqrt(var[times_ranked] + VAR_PER_CONTEST + BETA2)
+
+        # The sum of 1 / delta over the users that rank below, minus the sum over those that rank above, from prefix
+        # sums over the users sorted by rank. Ties count as half a win, as per Elo-MMR, so they are left out.
+        order = np.argsort(ranking, kind='stable')
+        sorted_ranking = ranking[order]
+        prefix = np.concatenate(([0.], np.cumsum(1. / delta[order])))
+        beaten_by = prefix[np.searchsorted(sorted_ranking, ranking, side='left')]
+        beats = prefix[-1] - prefix[np.searchsorted(sorted_ranking, ranking, side='right')]
+        y_tg = beats - beaten_by
+
+        # Every user solves for the same function, so it is only evaluated once at each point.
+        def evaluate_performance(x, rows):
+            points, inverse = np.unique(x, return_inverse=True)
+            return _np_eval_tanhs(old_mean, delta, 1., points)[inverse]
+
+        new_p = _np_bisect(evaluate_performance, y_tg)
+
+        # The terms of the mean: the new performance, followed by the most recent past ones.
+        history = min(max(map(len, historical_p)), NUMPY_HISTORY_LIMIT - 1)
+        h = np.zeros((n, history + 1))
+        h[:, 0] = new_p
+        length = np.zeros(n, dtype=int)
+        for i, past in enumerate(historical_p):
+            past = past[:history]
+            h[i, 1:len(past) + 1] = past
+            length[i] = len(past) + 1
+
+        j = np.arange(history + 1)
+        h_var = var[np.maximum(times_ranked[:, None] + 1 - j, 0)]
+        k = h_var / (h_var + np.where(j > 0, VAR_PER_CONTEST, 0.))
+        w = np.where(j < length[:, None], np.cumprod(k ** 2, axis=1), 0.)
+
+        sd = sqrt(BETA2) * TANH_C
+        w0 = 1. / var[times_ranked + 1] - w.sum(axis=1) / BETA2
+        p0 = ((w[:, 1:] / sd) * np.tanh((old_mean[:, None] - h[:, 1:]) / (2 * sd))).sum(axis=1) / w0 + old_mean
+
+        def evaluate_mean(x, rows):
+            terms = (w[rows] / sd) * np.tanh((x[:, None] - h[rows]) / (2 * sd))
+            return w0[rows] * x + terms.sum(axis=1)
+
+        new_mean = _np_bisect(evaluate_mean, w0 * p0)
+
+    # Display a slightly lower rating to incentivize participation.
+    # As times_ranked increases, new_rating converges to new_mean.
+    new_rating = np.maximum(1, np.round(new_mean - (np.sqrt(var[times_ranked + 1]) - SD_LIM))).astype(int)
+
+    return new_rating.tolist(), new_mean.tolist(), new_p.tolist()
+
+
+def recalculate_ratings(ranking, old_mean, times_ranked, historical_p):
+    if np is None:
+        return recalculate_ratings_python(ranking, old_mean, times_ranked, historical_p)
+    return recalculate_ratings_numpy(ranking, old_mean, times_ranked, historical_p)
+
+
 def rate_contest(contest):
-    from judge.models import Rating, Profile
+    from judge.models import ContestParticipation, Rating, Profile
 
     rating_subquery = Rating.objects.filter(user=OuterRef('user'))
     rating_sorted = rating_subquery.order_by('-contest__end_time')
@@ -187,6 +325,71 @@ def rate_contest(contest):
         Profile.objects.filter(contest_history__contest=contest, contest_history__virtual=0).update(
             rating=Subquery(Rating.objects.filter(user=OuterRef('id'))
                             .order_by('-contest__end_time').values('rating')[:1]))
+        ContestParticipation.bump_versions(contest.users.filter(virtual=0))
+
+
+def replay_ratings(contests, progress=None):
+    """
+    Rates the contests in order, as successive calls to `rate_contest` would, for when all of their ratings and all
+    later ones have been deleted. The rating history of their participants is loaded once and updated in memory, and
+    the new ratings are saved together at the end. If given, progress is told the number of contests rated.
+    """
+    from judge.models import ContestParticipation, Profile, Rating
+
+    contests = list(contests)
+    if progress is not None:
+        progress.total = len(contests)
+
+    participants = ContestParticipation.objects.filter(contest__in=contests, virtual=0).values('user_id')
+    # Every user's history of (rating, mean, performance), newest first as in `rate_contest`.
+    history = defaultdict(list)
+    for user_id, *rating in Rating.objects.filter(user_id__in=participants).order_by('-contest__end_time') \
+            .values_list('user_id', 'rating', 'mean', 'performance'):
+        history[user_id].append(tuple(rating))
+
+    def last_rating(user):
+        past = history[user['user_id']]
+        return past[0][0] if past else RATING_INIT
+
+    now = timezone.now()
+    ratings = []
+    for contest in contests:
+        users = contest.users.order_by('is_disqualified', '-score', 'cumtime', 'tiebreaker') \
+            .annotate(submissions=Count('submission')).exclude(user_id__in=contest.rate_exclude.all()) \
+            .filter(virtual=0).values('id', 'user_id', 'score', 'cumtime', 'tiebreaker', 'submissions')
+        if not contest.rate_all:
+            users = users.filter(submissions__gt=0)
+        users = list(users)
+
+        if contest.rating_floor is not None:
+            users = [user for user in users if last_rating(user) >= contest.rating_floor]
+        if contest.rating_ceiling is not None:
+            users = [user for user in users if last_rating(user) <= contest.rating_ceiling]
+
+        ranking = list(tie_ranker(users, key=itemgetter('score', 'cumtime', 'tiebreaker')))
+        pasts = [history[user['user_id']] for user in users]
+        old_mean = [past[0][1] if past else MEAN_INIT for past in pasts]
+        times_ranked = list(map(len, pasts))
+        historical_p = [[performance for _, _, performance in past] for past in pasts]
+
+        rating, mean, performance = recalculate_ratings(ranking, old_mean, times_ranked, historical_p)
+
+        for user, past, r, m, perf, z in zip(users, pasts, rating, mean, performance, ranking):
+            ratings.append(Rating(user_id=user['user_id'], contest=contest, rating=r, mean=m, performance=perf,
+                                  last_rated=now, participation_id=user['id'], rank=z))
+            past.insert(0, (r, m, perf))
+
+        if progress is not None:
+            progress.did(1)
+
+    with transaction.atomic():
+        Rating.objects.bulk_create(ratings, batch_size=RATING_BATCH_SIZE)
+
+        # The participants whose ratings were deleted and not replaced have their earlier rating, if any.
+        profiles = [Profile(id=user_id, rating=history[user_id][0][0] if history[user_id] else None)
+                    for user_id in set(participants.values_list('user_id', flat=True))]
+        Profile.objects.bulk_update(profiles, ['rating'], batch_size=RATING_BATCH_SIZE)
+        ContestParticipation.bump_versions(ContestParticipation.objects.filter(contest__in=contests, virtual=0))
 
 
 def rate_course(course):
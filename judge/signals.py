@@ -1,16 +1,23 @@
 import errno
 import os
+from functools import partial
 from typing import Optional
 
 from django.conf import settings
+from django.contrib.auth.models import Group, User
 from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
-from django.db.models.signals import post_delete, post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from .caching import finished_submission
-from .models import BlogPost, Comment, Contest, ContestSubmission, EFFECTIVE_MATH_ENGINES, Judge, Language, License, \
-    MiscConfig, Organization, Problem, Profile, Submission, WebAuthnCredential, TheoryPost, Course
+from .caching import finished_submission, invalidate_contest_membership, invalidate_contest_ranking
+from .models import BlogPost, Class, Comment, Contest, ContestParticipation, ContestSubmission, Judge, Language, \
+    MiscConfig, Organization, Problem, ProblemTranslation, Profile, SourceBlob, Submission, SubmissionSource, \
+    WebAuthnCredential, TheoryPost, Course
+from .utils import rank_index, rendered_markdown
+from .utils.problem_labels import labels_key as problem_labels_key
+from .utils.visibility import invalidate_user_visibility, invalidate_visibility
 
 
 def get_pdf_path(basename: str) -> Optional[str]:
@@ -33,13 +40,11 @@ def problem_update(sender, instance, **kwargs):
     if hasattr(instance, '_updating_stats_only'):
         return
 
+    invalidate_visibility()
     cache.delete_many([
         make_template_fragment_key('submission_problem', (instance.id,)),
-        make_template_fragment_key('problem_feed', (instance.id,)),
         'problem_tls:%s' % instance.id, 'problem_mls:%s' % instance.id,
     ])
-    cache.delete_many([make_template_fragment_key('problem_html', (instance.id, engine, lang))
-                       for lang, _ in settings.LANGUAGES for engine in EFFECTIVE_MATH_ENGINES])
     cache.delete_many([make_template_fragment_key('problem_authors', (instance.id, lang))
                        for lang, _ in settings.LANGUAGES])
     cache.delete_many(['generated-meta-problem:%s:%d' % (lang, instance.id) for lang, _ in settings.LANGUAGES])
@@ -55,9 +60,7 @@ def profile_update(sender, instance, **kwargs):
     if hasattr(instance, '_updating_stats_only'):
         return
 
-    cache.delete_many([make_template_fragment_key('user_about', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES] +
-                      [make_template_fragment_key('org_member_count', (org_id,))
+    cache.delete_many([make_template_fragment_key('org_member_count', (org_id,))
                        for org_id in instance.organizations.values_list('id', flat=True)])
 
 
@@ -74,9 +77,8 @@ def contest_update(sender, instance, **kwargs):
     if hasattr(instance, '_updating_stats_only'):
         return
 
-    cache.delete_many(['generated-meta-contest:%d' % instance.id] +
-                      [make_template_fragment_key('contest_html', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES])
+    invalidate_visibility()
+    cache.delete_many(['generated-meta-contest:%d' % instance.id, problem_labels_key(instance)])
 
 
 @receiver(post_save, sender=Course)
@@ -84,20 +86,12 @@ def course_update(sender, instance, **kwargs):
     if hasattr(instance, '_updating_stats_only'):
         return
 
-    cache.delete_many(['generated-meta-course:%d' % instance.id] +
-                      [make_template_fragment_key('course_html', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES])
-
-
-@receiver(post_save, sender=License)
-def license_update(sender, instance, **kwargs):
-    cache.delete(make_template_fragment_key('license_html', (instance.id,)))
+    cache.delete_many(['generated-meta-course:%d' % instance.id, problem_labels_key(instance)])
 
 
 @receiver(post_save, sender=Language)
 def language_update(sender, instance, **kwargs):
-    cache.delete_many([make_template_fragment_key('language_html', (instance.id,)),
-                       'lang:cn_map'])
+    cache.delete('lang:cn_map')
 
 
 @receiver(post_save, sender=Judge)
@@ -105,31 +99,9 @@ def judge_update(sender, instance, **kwargs):
     cache.delete(make_template_fragment_key('judge_html', (instance.id,)))
 
 
-@receiver(post_save, sender=Comment)
-def comment_update(sender, instance, **kwargs):
-    cache.delete('comment_feed:%d' % instance.id)
-
-
 @receiver(post_save, sender=BlogPost)
 def post_update(sender, instance, **kwargs):
-    cache.delete_many([
-        make_template_fragment_key('post_summary', (instance.id,)),
-        'blog_slug:%d' % instance.id,
-        'blog_feed:%d' % instance.id,
-    ])
-    cache.delete_many([make_template_fragment_key('post_content', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES])
-
-
-@receiver(post_save, sender=TheoryPost)
-def post_update(sender, instance, **kwargs):
-    cache.delete_many([
-        make_template_fragment_key('theory_summary', (instance.id,)),
-        'blog_slug:%d' % instance.id,
-        'blog_feed:%d' % instance.id,
-    ])
-    cache.delete_many([make_template_fragment_key('theory_content', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES])
+    cache.delete('blog_slug:%d' % instance.id)
 
 
 @receiver(post_delete, sender=Submission)
@@ -141,6 +113,12 @@ def submission_delete(sender, instance, **kwargs):
     instance.problem.update_stats()
 
 
+@receiver(post_delete, sender=SubmissionSource)
+def submission_source_delete(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        SourceBlob.release(instance.blob_id)
+
+
 @receiver(post_delete, sender=ContestSubmission)
 def contest_submission_delete(sender, instance, **kwargs):
     participation = instance.participation
@@ -148,12 +126,6 @@ def contest_submission_delete(sender, instance, **kwargs):
     Submission.objects.filter(id=instance.submission_id).update(contest_object=None)
 
 
-@receiver(post_save, sender=Organization)
-def organization_update(sender, instance, **kwargs):
-    cache.delete_many([make_template_fragment_key('organization_html', (instance.id, engine))
-                       for engine in EFFECTIVE_MATH_ENGINES])
-
-
 @receiver(post_save, sender=MiscConfig)
 def misc_config_update(sender, instance, **kwargs):
     cache.delete('misc_config')
@@ -167,3 +139,99 @@ def misc_config_delete(sender, instance, **kwargs):
 @receiver(post_save, sender=ContestSubmission)
 def contest_submission_update(sender, instance, **kwargs):
     Submission.objects.filter(id=instance.submission_id).update(contest_object_id=instance.participation.contest_id)
+
+
+@receiver(post_save, sender=ContestParticipation)
+@receiver(post_delete, sender=ContestParticipation)
+def contest_participation_update(sender, instance, **kwargs):
+    # Participations joining or leaving the ranking change its order.
+    invalidate_contest_ranking([instance.contest_id])
+    invalidate_contest_membership([instance.user_id])
+    # Other changes to the results bump the version of the participation, which updates the rank index too.
+    if kwargs.get('created', True):
+        transaction.on_commit(partial(rank_index.update_participations, instance.contest_id, [instance.id]))
+
+
+@receiver(post_delete, sender=Problem)
+@receiver(post_delete, sender=Contest)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Class)
+@receiver(post_save, sender=Group)
+@receiver(m2m_changed, sender=Problem.authors.through)
+@receiver(m2m_changed, sender=Problem.curators.through)
+@receiver(m2m_changed, sender=Problem.testers.through)
+@receiver(m2m_changed, sender=Problem.organizations.through)
+@receiver(m2m_changed, sender=Contest.authors.through)
+@receiver(m2m_changed, sender=Contest.curators.through)
+@receiver(m2m_changed, sender=Contest.testers.through)
+@receiver(m2m_changed, sender=Contest.spectators.through)
+@receiver(m2m_changed, sender=Contest.view_contest_scoreboard.through)
+@receiver(m2m_changed, sender=Contest.view_contest_submissions.through)
+@receiver(m2m_changed, sender=Contest.private_contestants.through)
+@receiver(m2m_changed, sender=Contest.organizations.through)
+@receiver(m2m_changed, sender=Contest.classes.through)
+@receiver(m2m_changed, sender=Organization.admins.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def visibility_update(sender, action=None, **kwargs):
+    if action is None or action.startswith('post_'):
+        invalidate_visibility()
+
+
+@receiver(post_save, sender=User)
+def user_visibility_update(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user_visibility([instance.id])
+
+
+@receiver(m2m_changed, sender=Profile.organizations.through)
+@receiver(m2m_changed, sender=Class.members.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_membership_update(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if isinstance(instance, User):
+        user_ids = [instance.id]
+    elif isinstance(instance, Profile):
+        user_ids = [instance.user_id]
+    elif pk_set is None:
+        # The relation was cleared from the other side, so we don't know whose visibility changed.
+        invalidate_visibility()
+        return
+    elif model is User:
+        user_ids = pk_set
+    else:
+        user_ids = Profile.objects.filter(id__in=pk_set).values_list('user_id', flat=True)
+    invalidate_user_visibility(user_ids)
+
+
+def store_rendered_markdown(model_name, id):
+    from .tasks import store_rendered_markdown
+    transaction.on_commit(partial(store_rendered_markdown.delay, model_name, id))
+
+
+@receiver(post_save, sender=Problem)
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=TheoryPost)
+@receiver(post_save, sender=Organization)
+@receiver(post_save, sender=Comment)
+def markdown_update(sender, instance, **kwargs):
+    if hasattr(instance, '_updating_stats_only'):
+        return
+    store_rendered_markdown(instance._meta.model_name, instance.id)
+
+
+@receiver(post_save, sender=ProblemTranslation)
+@receiver(post_delete, sender=ProblemTranslation)
+def problem_translation_update(sender, instance, **kwargs):
+    store_rendered_markdown(Problem._meta.model_name, instance.problem_id)
+
+
+@receiver(post_delete, sender=Problem)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=TheoryPost)
+@receiver(post_delete, sender=Organization)
+@receiver(post_delete, sender=Comment)
+def markdown_delete(sender, instance, **kwargs):
+    rendered_markdown.delete_renders(instance)
@@ -4,40 +4,70 @@ from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext as _
 from moss import MOSS
 
-from judge.models import Contest, ContestMoss, ContestParticipation, Submission, Course
+from judge.models import Contest, ContestMoss, ContestParticipation, Submission, SubmissionSource, Course
+from judge.utils import contest_artifacts, scoreboard
 from judge.utils.celery import Progress
+from judge.utils.iterator import chunk
 
-__all__ = ('rescore_contest', 'run_moss', 'rescore_course')
+__all__ = ('rescore_contest', 'rate_contest', 'disqualify_participation', 'run_moss', 'rescore_course')
 
 
 @shared_task(bind=True)
 def rescore_contest(self, contest_key):
     contest = Contest.objects.get(key=contest_key)
-    participations = contest.users
+    participation_ids = list(contest.users.order_by('id').values_list('id', flat=True))
 
-    rescored = 0
-    with Progress(self, participations.count(), stage=_('Recalculating contest scores')) as p:
-        for participation in participations.iterator():
-            participation.recompute_results()
-            rescored += 1
-            if rescored % 10 == 0:
-                p.done = rescored
-    return rescored\
+    with Progress(self, len(participation_ids), stage=_('Recalculating contest scores')) as p:
+        for ids in chunk(participation_ids, settings.DMOJ_RESCORE_CHUNK_SIZE):
+            contest.recompute_results(contest.users.filter(id__in=ids))
+            p.did(len(ids))
+
+    if contest.ended:
+        with Progress(self, 1, stage=_('Building contest results')):
+            contest_artifacts.build_artifacts(contest)
+    return len(participation_ids)
+
+
+@shared_task(bind=True)
+def rate_contest(self, contest_key):
+    contest = Contest.objects.get(key=contest_key)
+    scoreboard.take_pending_rate(contest.id)
+
+    try:
+        # The total is set to the number of contests to rate once it is known.
+        with Progress(self, 1, stage=_('Recalculating ratings')) as p:
+            contest.rate(progress=p)
+        with Progress(self, 1, stage=_('Building contest results')):
+            contest_artifacts.build_artifacts(contest)
+    finally:
+        scoreboard.finish_recalculating(contest.id)
+    return p.total
+
+
+@shared_task(bind=True)
+def disqualify_participation(self, participation_id, disqualified):
+    participation = ContestParticipation.objects.select_related('contest').get(id=participation_id)
+
+    try:
+        with Progress(self, 1, stage=_('Recalculating results')) as p:
+            # Rated contests are rerated by another task, which includes other disqualifications made meanwhile.
+            participation.set_disqualified(disqualified)
+            p.did(1)
+    finally:
+        scoreboard.finish_recalculating(participation.contest_id)
+    return participation.contest.key
 
 
 @shared_task(bind=True)
 def rescore_course(self, course_key):
     course = Course.objects.get(key=course_key)
-    participations = course.users
+    participation_ids = list(course.users.order_by('id').values_list('id', flat=True))
 
-    rescored = 0
-    with Progress(self, participations.count(), stage=_('Recalculating contest scores')) as p:
-        for participation in participations.iterator():
-            participation.recompute_results()
-            rescored += 1
-            if rescored % 10 == 0:
-                p.done = rescored
-    return rescored
+    with Progress(self, len(participation_ids), stage=_('Recalculating contest scores')) as p:
+        for ids in chunk(participation_ids, settings.DMOJ_RESCORE_CHUNK_SIZE):
+            course.recompute_results(course.users.filter(id__in=ids))
+            p.did(len(ids))
+    return len(participation_ids)
 
 
 @shared_task(bind=True)
@@ -62,7 +92,7 @@ def run_moss(self, contest_key):
                     contest_object=contest,
                     problem=problem,
                     language__common_name=dmoj_lang,
-                ).order_by('-points').values_list('user__user__username', 'source__source')
+                ).order_by('-points').values_list('user__user__username', *SubmissionSource.VALUES_FIELDS)
 
                 if subs.exists():
                     moss_call = MOSS(moss_api_key, language=moss_lang, matching_file_limit=100,
@@ -70,10 +100,11 @@ def run_moss(self, contest_key):
 
                     users = set()
 
-                    for username, source in subs:
+                    for username, *source_values in subs:
                         if username in users:
                             continue
                         users.add(username)
+                        source = SubmissionSource.resolve_source(*source_values)
                         moss_call.add_file_from_memory(username, source.encode('utf-8'))
 
                     result.url = moss_call.process()
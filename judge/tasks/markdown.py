@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from judge.utils import rendered_markdown
+
+__all__ = ('store_rendered_markdown',)
+
+
+@shared_task
+def store_rendered_markdown(model_name, id):
+    model = rendered_markdown.get_model(model_name)
+    obj = model.objects.filter(id=id).first()
+    # The object may have been deleted before the task ran.
+    if obj is None:
+        return 0
+    return rendered_markdown.store_renders(obj)
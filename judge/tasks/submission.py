@@ -1,13 +1,22 @@
-from celery import shared_task
+from datetime import timedelta
+
+from celery import chain, shared_task
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
+from django.db.models import Case, F, FloatField, Func, OuterRef, Q, Subquery, Value, When
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from judge.models import Problem, Profile, Submission
-from judge.utils.celery import Progress
+from judge.models import Contest, ContestParticipation, ContestProblem, ContestSubmission, Judge, Problem, Profile, \
+    SourceBlob, Submission, SubmissionSource, SubmissionTestCase
+from judge.utils.celery import Progress, run_in_chunks
+from judge.utils.cold_storage import archive_fields
+from judge.utils.iterator import chunk
+from judge.utils.problem_data import get_grading_fingerprints
 
-__all__ = ('apply_submission_filter', 'rejudge_problem_filter', 'rescore_problem')
+__all__ = ('apply_submission_filter', 'archive_submissions', 'archive_submission_data', 'exclude_unchanged_submissions',
+           'recalculate_user_points', 'recompute_participations', 'rejudge_problem_filter', 'rescore_problem')
 
 
 def apply_submission_filter(queryset, id_range, languages, results):
@@ -23,49 +32,166 @@ def apply_submission_filter(queryset, id_range, languages, results):
     return queryset
 
 
+def exclude_unchanged_submissions(queryset, problem):
+    # A submission is unchanged if it was graded with the fingerprint that any judge currently able to grade it
+    # would produce. Submissions without a fingerprint are always considered changed.
+    judge_ids = list(Judge.objects.filter(online=True, is_disabled=False, problems=problem)
+                     .values_list('id', flat=True))
+    if not judge_ids:
+        return queryset
+
+    unchanged = Q()
+    for language_id in queryset.order_by().values_list('language_id', flat=True).distinct():
+        fingerprints = set(get_grading_fingerprints(problem, language_id, judge_ids).values())
+        unchanged |= Q(language_id=language_id, grading_fingerprint__in=fingerprints)
+    return queryset.exclude(unchanged) if unchanged else queryset
+
+
 @shared_task(bind=True)
-def rejudge_problem_filter(self, problem_id, id_range=None, languages=None, results=None, user_id=None):
+def rejudge_problem_filter(self, problem_id, id_range=None, languages=None, results=None, user_id=None,
+                           changed_only=False):
     queryset = Submission.objects.filter(problem_id=problem_id)
     queryset = apply_submission_filter(queryset, id_range, languages, results)
+    if changed_only:
+        queryset = exclude_unchanged_submissions(queryset, Problem.objects.get(id=problem_id))
     user = User.objects.get(id=user_id)
 
-    rejudged = 0
-    with Progress(self, queryset.count()) as p:
-        for submission in queryset.iterator():
-            submission.judge(rejudge=True, batch_rejudge=True, rejudge_user=user)
-            rejudged += 1
-            if rejudged % 10 == 0:
-                p.done = rejudged
+    # The filter already excludes locked submissions, so the total is what will be rejudged.
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    rejudged = done = 0
+    with Progress(self, len(ids)) as p:
+        for ids_chunk in chunk(ids, 1000):
+            for submission in Submission.objects.filter(id__in=ids_chunk).order_by('id'):
+                if submission.judge(rejudge=True, batch_rejudge=True, rejudge_user=user):
+                    rejudged += 1
+                done += 1
+                if done % 10 == 0:
+                    p.done = done
     return rejudged
 
 
+def _rescored_points(case_points, case_total, points, precision):
+    return Case(
+        When(**{case_total + '__gt': 0}, then=Func(F(case_points) / F(case_total) * points, Value(precision),
+                                                   function='ROUND')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+@shared_task
+def recompute_participations(participation_ids):
+    for contest in Contest.objects.filter(users__id__in=participation_ids).distinct():
+        contest.recompute_results(contest.users.filter(id__in=participation_ids))
+
+
+@shared_task
+def recalculate_user_points(profile_ids):
+    for profile in Profile.objects.filter(id__in=profile_ids):
+        profile._updating_stats_only = True
+        profile.calculate_points()
+    cache.delete_many(['user_complete:%d' % id for id in profile_ids] +
+                      ['user_attempted:%d' % id for id in profile_ids])
+
+
 @shared_task(bind=True)
 def rescore_problem(self, problem_id):
     problem = Problem.objects.get(id=problem_id)
     submissions = Submission.objects.filter(problem_id=problem_id)
+    chunk_size = settings.DMOJ_RESCORE_CHUNK_SIZE
+
+    # Points are updated in ranges of IDs, so that no single statement locks every submission of the problem.
+    ids = list(submissions.order_by('id').values_list('id', flat=True))
+    with Progress(self, len(ids), stage=_('Modifying submissions')) as p:
+        for i in range(0, len(ids), chunk_size):
+            rows = submissions.filter(id__gte=ids[i], id__lte=ids[min(i + chunk_size, len(ids)) - 1])
+            rows.update(points=_rescored_points('case_points', 'case_total', problem.points, 1))
+            if not problem.partial:
+                rows.filter(points__lt=problem.points).update(points=0)
+            p.did(min(chunk_size, len(ids) - i))
+
+        for contest_problem in ContestProblem.objects.filter(problem_id=problem_id):
+            contest_submissions = ContestSubmission.objects.filter(problem=contest_problem)
+            contest_submissions.update(points=Subquery(
+                Submission.objects.filter(id=OuterRef('submission_id'))
+                          .values(rescored=_rescored_points('case_points', 'case_total', contest_problem.points, 3)),
+            ))
+            if not contest_problem.partial:
+                contest_submissions.exclude(points=contest_problem.points).update(points=0)
+
+    participation_ids = list(ContestParticipation.objects.filter(submission__problem__problem_id=problem_id)
+                             .order_by('id').values_list('id', flat=True).distinct())
+    profile_ids = list(submissions.order_by('user_id').values_list('user_id', flat=True).distinct())
+    stages = [
+        (_('Recalculating contest scores'), recompute_participations, participation_ids),
+        (_('Recalculating user points'), recalculate_user_points, profile_ids),
+    ]
+
+    concurrency = settings.DMOJ_RESCORE_CONCURRENCY
+    if not concurrency:
+        for stage, task, stage_ids in stages:
+            with Progress(self, len(stage_ids), stage=stage) as p:
+                for ids_chunk in chunk(stage_ids, chunk_size):
+                    task(ids_chunk)
+                    p.did(len(ids_chunk))
+        return len(ids)
+
+    # The stages run as chains of subtasks, which this task is replaced by, rather than waiting for them.
+    workflow = [run_in_chunks(self.request.id, stage, task, stage_ids, chunk_size, concurrency)
+                for stage, task, stage_ids in stages]
+    workflow = [signature for signature in workflow if signature is not None]
+    if not workflow:
+        return len(ids)
+    return self.replace(chain(*workflow))
+
+
+ARCHIVED_MODELS = (SourceBlob, SubmissionSource, SubmissionTestCase)
+
+
+def _archivable_rows(model, cutoff):
+    if model is SourceBlob:
+        return SourceBlob.objects.filter(last_used__lt=cutoff, archive_key__isnull=True)
+
+    queryset = model.objects.filter(submission__date__lt=cutoff, archive_key__isnull=True) \
+                            .exclude(submission__status__in=Submission.IN_PROGRESS_GRADING_STATUS)
+    if model is SubmissionSource:
+        # Shared sources are archived as blobs once none of their submissions are recent.
+        queryset = queryset.filter(blob__isnull=True)
+    elif model is SubmissionTestCase:
+        queryset = queryset.exclude(output='', extended_feedback='')
+    return queryset
+
+
+def archive_submission_data(cutoff, batch_size=1000):
+    """Move sources and test case outputs of submissions made before `cutoff` to cold storage.
+
+    Yields the number of rows archived after each batch."""
+    for model in ARCHIVED_MODELS:
+        fields = model.ARCHIVED_FIELDS
+        queryset = _archivable_rows(model, cutoff).order_by('id').only('id', *fields)
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not rows:
+                break
+            # Blobs are written before the rows are emptied, so a crash here leaves nothing unreadable.
+            keys = [When(id=row.id, then=Value(archive_fields({field: getattr(row, field) for field in fields})))
+                    for row in rows]
+            model.objects.filter(id__in=[row.id for row in rows]) \
+                         .update(archive_key=Case(*keys), **{field: '' for field in fields})
+            last_id = rows[-1].id
+            yield len(rows)
+
+
+@shared_task(bind=True)
+def archive_submissions(self, days=None, batch_size=1000):
+    age = timedelta(days=days) if days is not None else settings.DMOJ_COLD_STORAGE_AGE
+    cutoff = timezone.now() - age
+    total = sum(_archivable_rows(model, cutoff).count() for model in ARCHIVED_MODELS)
 
-    with Progress(self, submissions.count(), stage=_('Modifying submissions')) as p:
-        rescored = 0
-        for submission in submissions.iterator():
-            submission.points = round(submission.case_points / submission.case_total * problem.points
-                                      if submission.case_total else 0, 1)
-            if not problem.partial and submission.points < problem.points:
-                submission.points = 0
-            submission.save(update_fields=['points'])
-            submission.update_contest()
-            rescored += 1
-            if rescored % 10 == 0:
-                p.done = rescored
-
-    with Progress(self, submissions.values('user_id').distinct().count(), stage=_('Recalculating user points')) as p:
-        users = 0
-        profiles = Profile.objects.filter(id__in=submissions.values_list('user_id', flat=True).distinct())
-        for profile in profiles.iterator():
-            profile._updating_stats_only = True
-            profile.calculate_points()
-            cache.delete('user_complete:%d' % profile.id)
-            cache.delete('user_attempted:%d' % profile.id)
-            users += 1
-            if users % 10 == 0:
-                p.done = users
-    return rescored
+    archived = 0
+    with Progress(self, total, stage=_('Moving submission data to cold storage')) as p:
+        for count in archive_submission_data(cutoff, batch_size):
+            archived += count
+            p.done = archived
+    return archived
@@ -1,8 +1,14 @@
+import hashlib
+
+from celery import chain, group, shared_task
 from celery.result import AsyncResult
+from django.core.cache import cache
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.utils.http import urlencode
 
+from judge.utils.unicode import utf8bytes
+
 
 class Progress:
     def __init__(self, task, total, stage=None):
@@ -52,6 +58,33 @@ class Progress:
             self.done = self._total
 
 
+@shared_task
+def chunk_done(parent_id, stage, total, size):
+    """Reports that a chunk of a stage run by `run_in_chunks` is done, as the progress of the parent task."""
+    key = 'chunk_progress:%s:%s' % (parent_id, hashlib.sha1(utf8bytes(stage)).hexdigest())
+    cache.add(key, 0, 86400)
+    done = cache.incr(key, size)
+    AsyncResult(parent_id).backend.store_result(parent_id, {'done': min(done, total), 'total': total, 'stage': stage},
+                                                'PROGRESS')
+
+
+def run_in_chunks(parent_id, stage, task, ids, chunk_size, concurrency):
+    """Returns a signature that runs task on chunks of ids as subtasks, with at most concurrency of them running at
+    once, reporting their progress as that of the task parent_id.
+
+    The chunks are split among concurrency chains, each of which runs its next chunk when the last one finishes, so
+    that no worker is held waiting for the others. Returns None if there are no ids."""
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    lanes = [chunks[i::concurrency] for i in range(min(concurrency, len(chunks)))]
+    if not lanes:
+        return None
+    return group(chain(*[
+        signature
+        for chunk in lane
+        for signature in (task.si(chunk), chunk_done.si(parent_id, stage, len(ids), len(chunk)))
+    ]) for lane in lanes)
+
+
 def task_status_url_by_id(result_id, message=None, redirect=None):
     args = {}
     if message:
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+
+from judge.utils.unicode import utf8bytes, utf8text
+
+
+class ColdStorage(object):
+    """Content-addressed store of zlib-compressed blobs on top of a Django storage backend."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def get_key(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def get_path(key):
+        return '%s/%s/%s.z' % (key[:2], key[2:4], key)
+
+    def has(self, key):
+        return self.storage.exists(self.get_path(key))
+
+    def put(self, data):
+        key = self.get_key(data)
+        path = self.get_path(key)
+        if not self.storage.exists(path):
+            self.storage.save(path, ContentFile(zlib.compress(data, 9)))
+        return key
+
+    def get(self, key):
+        with self.storage.open(self.get_path(key), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def delete(self, key):
+        self.storage.delete(self.get_path(key))
+
+
+def get_cold_storage():
+    if settings.DMOJ_COLD_STORAGE_BACKEND:
+        storage = import_string(settings.DMOJ_COLD_STORAGE_BACKEND)(**settings.DMOJ_COLD_STORAGE_OPTIONS)
+    elif settings.DMOJ_COLD_STORAGE_ROOT:
+        storage = FileSystemStorage(location=settings.DMOJ_COLD_STORAGE_ROOT)
+    else:
+        return None
+    return ColdStorage(storage)
+
+
+def _require_cold_storage():
+    storage = get_cold_storage()
+    if storage is None:
+        raise ImproperlyConfigured('DMOJ_COLD_STORAGE_ROOT or DMOJ_COLD_STORAGE_BACKEND must be set')
+    return storage
+
+
+def archive_fields(values):
+    data = json.dumps(values, sort_keys=True, separators=(',', ':'))
+    return _require_cold_storage().put(utf8bytes(data))
+
+
+def load_fields(key):
+    return json.loads(utf8text(_require_cold_storage().get(key)))
@@ -0,0 +1,226 @@
+"""
+Results of ended contests, stored in the database so that they are not recomputed on every view.
+
+Each artifact is stored with the version of the contest that it was built from, and stale artifacts are rebuilt on
+first use. The rankings use a version that changes whenever the results of any live participation do, such as when
+the contest is rescored or rerated. Virtual participations don't change it. The artifacts built from submissions, which
+include those of virtual participations, use a version that changes with the submissions instead. Artifacts of
+contests that haven't ended are never stored, since they change all the time.
+"""
+import hashlib
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.expressions import CombinedExpression
+
+from judge.caching import contest_submissions_version_key, contest_version_key
+from judge.utils.problems import _get_result_data
+from judge.utils.stats import get_bar_chart, get_pie_chart
+
+
+def _get_problems(contest):
+    return list(contest.contest_problems.order_by('id')
+                .values_list('id', 'problem_id', 'points', 'partial', 'is_pretested', 'order'))
+
+
+def get_contest_version(contest):
+    """Returns a version of the results of the live participations of the contest, which changes whenever those of
+    any of them do. Virtual participations, which keep joining after the contest ends, don't change it."""
+    def compute():
+        participations = contest.users.filter(virtual=0).aggregate(count=Count('id'), versions=Sum('version'))
+        stamp = repr((contest.end_time.isoformat(), contest.format_name, contest.format_config,
+                      participations['count'], participations['versions'] or 0, _get_problems(contest)))
+        return hashlib.sha1(stamp.encode()).hexdigest()
+    return cache.get_or_set(contest_version_key(contest.id), compute, settings.DMOJ_CONTEST_VERSION_CACHE_TIMEOUT)
+
+
+def get_submissions_version(contest):
+    """Returns a version of the submissions to the contest, virtual ones included, which changes whenever any of them
+    is made, judged or rescored."""
+    from judge.models import Submission
+
+    def compute():
+        submissions = Submission.objects.filter(contest_object=contest).aggregate(
+            count=Count('id'), last=Max('id'), judged=Max('judged_date'), points=Sum('contest__points'),
+        )
+        stamp = repr((submissions['count'], submissions['last'], submissions['judged'] and
+                      submissions['judged'].isoformat(), submissions['points'], _get_problems(contest)))
+        return hashlib.sha1(stamp.encode()).hexdigest()
+    return cache.get_or_set(contest_submissions_version_key(contest.id), compute,
+                            settings.DMOJ_CONTEST_VERSION_CACHE_TIMEOUT)
+
+
+def get_artifact(contest, name, build, get_version=get_contest_version):
+    """Returns build(contest), from the database if the contest has ended and it was built for the current version,
+    as given by get_version(contest)."""
+    from judge.models import ContestArtifact
+
+    if not contest.ended:
+        return build(contest)
+
+    version = get_version(contest)
+    artifact = ContestArtifact.objects.filter(contest=contest, name=name).only('version', 'data').first()
+    if artifact is not None and artifact.version == version:
+        return artifact.data
+
+    data = build(contest)
+    ContestArtifact.objects.update_or_create(contest=contest, name=name, defaults={'version': version, 'data': data})
+    return data
+
+
+def build_stats(contest):
+    from judge.models import Submission
+
+    queryset = Submission.objects.filter(contest_object=contest)
+
+    ac_count = Count(Case(When(result='AC', then=Value(1)), output_field=IntegerField()))
+    ac_rate = CombinedExpression(ac_count / Count('problem'), '*', Value(100.0), output_field=FloatField())
+
+    status_count_queryset = list(
+        queryset.values('problem__code', 'result').annotate(count=Count('result'))
+        .values_list('problem__code', 'result', 'count'),
+    )
+    labels, codes = [], []
+    contest_problems = contest.contest_problems.order_by('order').values_list('problem__name', 'problem__code')
+    if contest_problems:
+        labels, codes = zip(*contest_problems)
+    num_problems = len(labels)
+    status_counts = [[] for i in range(num_problems)]
+    for problem_code, result, count in status_count_queryset:
+        if problem_code in codes:
+            status_counts[codes.index(problem_code)].append((result, count))
+
+    result_data = defaultdict(partial(list, [0] * num_problems))
+    for i in range(num_problems):
+        for category in _get_result_data(defaultdict(int, status_counts[i]))['categories']:
+            result_data[category['code']][i] = category['count']
+
+    return {
+        'problem_status_count': {
+            'labels': labels,
+            'datasets': [
+                {
+                    'label': name,
+                    'backgroundColor': settings.DMOJ_STATS_SUBMISSION_RESULT_COLORS[name],
+                    'data': data,
+                }
+                for name, data in result_data.items()
+            ],
+        },
+        'problem_ac_rate': get_bar_chart(
+            queryset.values('contest__problem__order', 'problem__name').annotate(ac_rate=ac_rate)
+            .order_by('contest__problem__order').values_list('problem__name', 'ac_rate'),
+        ),
+        'language_count': get_pie_chart(
+            queryset.values('language__name').annotate(count=Count('language__name'))
+            .filter(count__gt=0).order_by('-count').values_list('language__name', 'count'),
+        ),
+        'language_ac_rate': get_bar_chart(
+            queryset.values('language__name').annotate(ac_rate=ac_rate)
+            .filter(ac_rate__gt=0).values_list('language__name', 'ac_rate'),
+        ),
+    }
+
+
+def get_stats(contest):
+    """Returns the charts of the contest statistics page."""
+    return get_artifact(contest, 'stats', build_stats, get_submissions_version)
+
+
+def build_ranking(contest):
+    return list(contest.users.filter(virtual=0).order_by('is_disqualified', '-score', 'cumtime', 'tiebreaker')
+                .values_list('id', 'version'))
+
+
+def get_ranking(contest):
+    """Returns (id, version) for the live participations of the contest, in the order of the scoreboard."""
+    return [tuple(participation) for participation in get_artifact(contest, 'ranking', build_ranking)]
+
+
+def build_api_rankings(contest, window=None):
+    """Returns the rankings of the contest detail API, or only those of the (rank, participation id) in the window,
+    with their ranks, when it is given."""
+    from judge.models import ContestParticipation, Rating
+
+    problems = list(contest.contest_problems.select_related('problem').defer('problem__description').order_by('order'))
+
+    new_ratings_subquery = Rating.objects.filter(participation=OuterRef('pk'))
+    old_ratings_subquery = (
+        Rating.objects
+        .filter(user=OuterRef('user__pk'), contest__end_time__lt=OuterRef('contest__end_time'))
+        .order_by('-contest__end_time')
+    )
+    participations = (
+        contest.users
+        .filter(virtual=ContestParticipation.LIVE)
+        .annotate(
+            username=F('user__user__username'),
+            old_rating=Subquery(old_ratings_subquery.values('rating')[:1]),
+            new_rating=Subquery(new_ratings_subquery.values('rating')[:1]),
+        )
+        .order_by('-score', 'cumtime', 'tiebreaker')
+    )
+    if window is not None:
+        ranks = dict((id, rank) for rank, id in window)
+        participations = sorted(participations.filter(id__in=ranks), key=lambda participation: ranks[participation.id])
+
+    # Setting contest attribute to reduce db queries in .start and .end_time
+    for participation in participations:
+        participation.contest = contest
+
+    rankings = [
+        {
+            'user': participation.username,
+            'start_time': participation.start.isoformat(),
+            'end_time': participation.end_time.isoformat(),
+            'score': participation.score,
+            'cumulative_time': participation.cumtime,
+            'tiebreaker': participation.tiebreaker,
+            'old_rating': participation.old_rating,
+            'new_rating': participation.new_rating,
+            'is_disqualified': participation.is_disqualified,
+            'solutions': contest.format.get_problem_breakdown(participation, problems),
+        } for participation in participations
+    ]
+    if window is not None:
+        for participation, ranking in zip(participations, rankings):
+            ranking['rank'] = ranks[participation.id]
+    return rankings
+
+
+def get_api_rankings(contest):
+    """Returns the rankings of the contest detail API."""
+    return get_artifact(contest, 'api_rankings', build_api_rankings)
+
+
+def build_ranked_submissions(contest, problem_id):
+    from judge.models import Submission
+
+    # The same submissions as the raw SQL of `RankedSubmissions`: each user's highest scoring submission to the
+    # problem, and the fastest of those.
+    best = {}
+    for id, user_id, points, time in Submission.objects.filter(
+        problem_id=problem_id, contest_object=contest, contest__points__gt=0,
+    ).values_list('id', 'user_id', 'contest__points', 'time'):
+        key = (-points, time is None, time or 0, id)
+        if user_id not in best or key < best[user_id][0]:
+            best[user_id] = (key, id)
+    return [id for _, id in best.values()]
+
+
+def get_ranked_submissions(contest, problem_id):
+    """Returns the ids of the best submissions to the problem in the contest, in no particular order."""
+    return get_artifact(contest, 'ranked_submissions:%d' % problem_id,
+                        partial(build_ranked_submissions, problem_id=problem_id), get_submissions_version)
+
+
+def build_artifacts(contest):
+    """Builds every artifact of the ended contest that is missing or stale, e.g. once it is rescored or rerated."""
+    get_stats(contest)
+    get_ranking(contest)
+    get_api_rankings(contest)
+    for problem_id in contest.contest_problems.values_list('problem_id', flat=True):
+        get_ranked_submissions(contest, problem_id)
@@ -0,0 +1,280 @@
+import base64
+import binascii
+import collections.abc
+import datetime
+import json
+from functools import reduce
+from operator import and_, or_
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.paginator import EmptyPage, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, QueryDict
+from django.utils.functional import cached_property
+
+from judge.utils.infinite_paginator import InfinitePaginationMixin
+from judge.utils.unicode import utf8bytes, utf8text
+
+AFTER = 'a'
+BEFORE = 'b'
+
+
+def get_ordering(queryset):
+    """Returns the ordering of the queryset as a list of (field, descending) pairs, ending with the primary key."""
+    ordering = []
+    for field in queryset.query.order_by or queryset.model._meta.ordering:
+        if not isinstance(field, str) or field == '?':
+            raise ValueError('Only querysets ordered by field names can be paginated by cursor')
+        descending = field.startswith('-')
+        field = field.lstrip('-')
+        ordering.append(('id' if field == 'pk' else field, descending))
+    if not any(field == 'id' for field, _ in ordering):
+        ordering.append(('id', False))
+    return ordering
+
+
+def get_key(obj, ordering):
+    key = []
+    for field, _ in ordering:
+        value = obj
+        try:
+            for attr in field.split('__'):
+                value = getattr(value, attr)
+                if value is None:
+                    break
+        except ObjectDoesNotExist:
+            value = None
+        key.append(value)
+    return key
+
+
+def _after(field, value, descending):
+    # NULLs compare smaller than everything else, as they do in MySQL.
+    if descending:
+        return Q(**{field + '__lt': value}) | Q(**{field + '__isnull': True})
+    return Q(**{field + '__isnull': False}) if value is None else Q(**{field + '__gt': value})
+
+
+def _equal(field, value):
+    return Q(**{field + '__isnull': True}) if value is None else Q(**{field: value})
+
+
+def filter_after(queryset, ordering, key, reverse=False):
+    """Filters the queryset to rows strictly after the key in the ordering, or strictly before it if reverse is set."""
+    conditions = []
+    for i, (field, descending) in enumerate(ordering):
+        if key[i] is None and descending != reverse:
+            # Nothing can be after NULL when NULLs sort last.
+            continue
+        conditions.append(reduce(and_, [_equal(f, key[j]) for j, (f, _) in enumerate(ordering[:i])],
+                                 _after(field, key[i], descending != reverse)))
+    if not conditions:
+        return queryset.none()
+    return queryset.filter(reduce(or_, conditions))
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # Keys must round trip exactly, but DjangoJSONEncoder truncates times to milliseconds.
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, number, key):
+    data = json.dumps([direction, number, key], cls=CursorEncoder, separators=(',', ':'))
+    return utf8text(base64.urlsafe_b64encode(utf8bytes(data))).rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    try:
+        direction, number, key = json.loads(base64.urlsafe_b64decode(utf8bytes(cursor + '=' * (-len(cursor) % 4))))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidPage('Invalid cursor')
+    if direction not in (AFTER, BEFORE) or not isinstance(number, int) or number < 2 or \
+            not isinstance(key, list) or len(key) != len(ordering):
+        raise InvalidPage('Invalid cursor')
+    return direction, number, key
+
+
+class CursorPage(collections.abc.Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, number, cursor, next_cursors, previous_cursors, has_trailing, paginator,
+                 query=None):
+        self.object_list = object_list
+        self.number = number
+        self.cursor = cursor
+        self.next_cursors = next_cursors
+        self.previous_cursors = previous_cursors
+        self.has_trailing = has_trailing
+        self.paginator = paginator
+        self.query = query
+        self.num_pages = 1e3000
+
+    def __repr__(self):
+        return '<Page %s of many>' % self.number
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return bool(self.next_cursors)
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        if not self.has_next():
+            raise EmptyPage()
+        return self.number + 1
+
+    def previous_page_number(self):
+        if not self.has_previous():
+            raise EmptyPage()
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        return self.next_cursors[0] if self.next_cursors else None
+
+    @property
+    def previous_cursor(self):
+        return self.previous_cursors[0] if self.previous_cursors else None
+
+    def get_cursor(self, number):
+        """Returns the cursor for the given page, None for the first page, or raises EmptyPage if it is not known."""
+        if number == 1:
+            return None
+        if number == self.number:
+            return self.cursor
+        if number > self.number and number - self.number <= len(self.next_cursors):
+            return self.next_cursors[number - self.number - 1]
+        if number < self.number and self.number - number <= len(self.previous_cursors):
+            return self.previous_cursors[self.number - number - 1]
+        raise EmptyPage()
+
+    def page_href(self, number):
+        query = self.query.copy() if self.query is not None else QueryDict(mutable=True)
+        cursor = self.get_cursor(number)
+        if cursor is not None:
+            query['cursor'] = cursor
+        return '?' + query.urlencode() if query else '.'
+
+    @cached_property
+    def main_range(self):
+        start = self.number - len(self.previous_cursors)
+        if start == 2:
+            start = 1
+        return range(start, self.number + len(self.next_cursors) + 1)
+
+    @cached_property
+    def page_range(self):
+        main_range = self.main_range
+        result = []
+        # Only the first page can be reached without a cursor, so add it and ... element if it is out of range.
+        if main_range[0] > 1:
+            result += [1, False]
+        result += list(main_range)
+        if self.has_trailing:
+            result.append(False)
+        return result
+
+
+def cursor_paginate(queryset, cursor, page_size, pad_pages, paginator=None, query=None):
+    """Paginates the queryset by seeking to the key in the cursor, rather than by skipping over rows with OFFSET.
+
+    The keys of up to pad_pages pages on each side are fetched from the index to render the links to nearby pages.
+    """
+    ordering = get_ordering(queryset)
+    fields = [field for field, _ in ordering]
+    # Order by the whole key, so that rows with the same sort key are not skipped or repeated.
+    queryset = queryset.order_by(*[('-' if descending else '') + field for field, descending in ordering])
+    reverse_ordering = [('-' if not descending else '') + field for field, descending in ordering]
+
+    number = 1
+    object_list = None
+    if cursor:
+        direction, number, key = decode_cursor(cursor, ordering)
+        if direction == AFTER:
+            object_list = list(filter_after(queryset, ordering, key)[:page_size])
+            if not object_list:
+                raise EmptyPage()
+        else:
+            object_list = list(filter_after(queryset, ordering, key, reverse=True)
+                               .order_by(*reverse_ordering)[:page_size])[::-1]
+            if len(object_list) < page_size:
+                # We have reached the start of the list, so show the first page in full.
+                number, object_list = 1, None
+    if object_list is None:
+        object_list = list(queryset[:page_size])
+
+    next_cursors = []
+    previous_cursors = []
+    has_trailing = False
+    if object_list and number > 1:
+        first_key = get_key(object_list[0], ordering)
+        preceding = list(filter_after(queryset, ordering, first_key, reverse=True).order_by(*reverse_ordering)
+                         .values_list(*fields)[:pad_pages * page_size + 1])
+        if len(preceding) <= pad_pages * page_size:
+            # The start of the list is in sight, so the page can be numbered exactly.
+            number = -(-len(preceding) // page_size) + 1
+        # The first page is reached without a cursor.
+        previous_cursors = [
+            encode_cursor(BEFORE, number - i - 1, list(preceding[i * page_size - 1]) if i else first_key)
+            for i in range(min(pad_pages, number - 2))
+        ]
+
+    if object_list:
+        last_key = get_key(object_list[-1], ordering)
+        following = list(filter_after(queryset, ordering, last_key).values_list(*fields)[:pad_pages * page_size + 1])
+        next_cursors = [
+            encode_cursor(AFTER, number + i + 1, list(following[i * page_size - 1]) if i else last_key)
+            for i in range(pad_pages) if len(following) > i * page_size
+        ]
+        has_trailing = len(following) > pad_pages * page_size
+    return CursorPage(object_list, number, cursor if number > 1 else None, next_cursors, previous_cursors,
+                      has_trailing, paginator, query)
+
+
+class CursorPaginationMixin(InfinitePaginationMixin):
+    cursor_kwarg = 'cursor'
+
+    @property
+    def use_cursor_pagination(self):
+        return True
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        # Links to numbered pages still work, by OFFSET.
+        page = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg)
+        if not self.use_cursor_pagination or (cursor is None and page not in (None, 1, '1')):
+            return super().paginate_queryset(queryset, page_size)
+
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        query.pop(self.page_kwarg, None)
+        try:
+            paginator = CursorPaginator(page_size)
+            page = cursor_paginate(queryset, cursor, page_size, self.pad_pages, paginator, query)
+            return paginator, page, page.object_list, page.has_other_pages()
+        except InvalidPage as e:
+            raise Http404('Invalid cursor (%(cursor)s): %(message)s' % {
+                'cursor': cursor,
+                'message': str(e),
+            })
+
+
+class CursorPaginator:
+    is_infinite = True
+    is_cursor = True
+
+    def __init__(self, per_page):
+        self.per_page = per_page
@@ -1,14 +1,18 @@
+import hashlib
 import json
 import os
 import re
 
 import yaml
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.storage import FileSystemStorage
 from django.urls import reverse
 from django.utils.translation import gettext as _
 
+from judge.utils.unicode import utf8bytes
+
 if os.altsep:
     def split_path_first(path, repath=re.compile('[%s]' % re.escape(os.sep + os.altsep))):
         return repath.split(path, 1)
@@ -216,8 +220,105 @@ class ProblemDataCompiler(object):
                 # judge-server#670 will not update cache on empty init.yml,
                 # but will do so if there is no init.yml, so we delete the init.yml
                 problem_data_storage.delete(yml_file)
+        # Hash the data once when it is saved, rather than whenever a submission is graded.
+        self.data.data_hash = get_problem_data_hash(self.problem.code)
+        type(self.data).objects.filter(id=self.data.id).update(data_hash=self.data.data_hash)
 
     @classmethod
     def generate(cls, *args, **kwargs):
         self = cls(*args, **kwargs)
         self.compile()
+
+
+def _get_file_hash(storage, name):
+    # Archives can be large, so hash each version of the file only once.
+    path = storage.path(name)
+    stat = os.stat(path)
+    version = '%s:%d:%d' % (path, stat.st_size, stat.st_mtime_ns)
+    key = 'problem_file_hash:%s' % hashlib.sha1(utf8bytes(version)).hexdigest()
+    result = cache.get(key)
+    if result is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        result = digest.hexdigest()
+        cache.set(key, result, 86400)
+    return result
+
+
+def get_problem_data_hash(code):
+    """Returns a hash of the test data for the problem: the contents of init.yml and of every other data file, such as
+    the archive, generators, checkers and interactors, any of which can be replaced under the same name.
+    """
+    from judge.models import problem_data_storage
+
+    digest = hashlib.sha256()
+    try:
+        with problem_data_storage.open('%s/init.yml' % code, 'rb') as f:
+            digest.update(f.read())
+    except OSError:
+        return None
+
+    try:
+        root = problem_data_storage.path(code)
+        names = sorted(os.path.relpath(os.path.join(directory, file), root)
+                       for directory, _, files in os.walk(root) for file in files)
+        for name in names:
+            if name != 'init.yml':
+                file_hash = _get_file_hash(problem_data_storage, os.path.join(code, name))
+                digest.update(utf8bytes('%s:%s\n' % (name, file_hash)))
+    except OSError:
+        pass
+    return digest.hexdigest()
+
+
+def get_grading_inputs_hash(problem, language_id):
+    """Returns a hash of what grading a submission in the given language on the problem depends on, apart from the
+    judge: the data hash stored when the problem data was last saved, the limits and short circuiting. Returns None if
+    the data hasn't been hashed.
+    """
+    from judge.models import LanguageLimit, ProblemData
+
+    data_hash = ProblemData.objects.filter(problem_id=problem.id).values_list('data_hash', flat=True).first()
+    if data_hash is None:
+        return None
+
+    time_limit, memory_limit = problem.time_limit, problem.memory_limit
+    try:
+        time_limit, memory_limit = (LanguageLimit.objects.filter(problem_id=problem.id, language_id=language_id)
+                                    .values_list('time_limit', 'memory_limit').get())
+    except LanguageLimit.DoesNotExist:
+        pass
+
+    data = json.dumps([data_hash, time_limit, memory_limit, problem.short_circuit], separators=(',', ':'))
+    return hashlib.sha256(utf8bytes(data)).hexdigest()
+
+
+def get_runtime_versions(language_id, judge_ids):
+    from judge.models import RuntimeVersion
+
+    runtimes = {judge_id: [] for judge_id in judge_ids}
+    for judge_id, name, version in (RuntimeVersion.objects.filter(judge_id__in=judge_ids, language_id=language_id)
+                                    .order_by('name', 'version').values_list('judge_id', 'name', 'version')):
+        runtimes[judge_id].append((name, version))
+    return runtimes
+
+
+def get_grading_fingerprint(inputs_hash, versions):
+    """Returns the fingerprint of grading with the inputs of `get_grading_inputs_hash` on a judge with the given
+    runtime versions, or None if the inputs are unknown."""
+    if inputs_hash is None:
+        return None
+    data = json.dumps([inputs_hash, versions], separators=(',', ':'))
+    return hashlib.sha256(utf8bytes(data)).hexdigest()
+
+
+def get_grading_fingerprints(problem, language_id, judge_ids):
+    """Returns a fingerprint of the grading inputs for submissions in the given language on each of the judges.
+
+    A submission that was graded with the same fingerprint will grade the same way again, barring flakiness.
+    """
+    inputs_hash = get_grading_inputs_hash(problem, language_id)
+    return {judge_id: get_grading_fingerprint(inputs_hash, versions)
+            for judge_id, versions in get_runtime_versions(language_id, judge_ids).items()}
@@ -0,0 +1,47 @@
+"""
+Problem labels of contests and courses that have a Lua problem label script.
+
+Each script is compiled once per process, and the labels it generates for a contest are cached, so that pages listing
+the problems of a contest don't call into Lua for each of them.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from lupa import LuaRuntime
+
+LABELS_KEY = 'problem_labels:%s:%d'
+
+
+def _deny_all(obj, attr_name, is_setting):
+    raise AttributeError()
+
+
+@lru_cache(maxsize=256)
+def compile_label_script(script):
+    """Returns the Lua function defined by a problem label script. Scripts that fail to compile are not cached."""
+    lua = LuaRuntime(attribute_filter=_deny_all, register_eval=False, register_builtins=False)
+    return lua.eval(script)
+
+
+def labels_key(obj):
+    return LABELS_KEY % (obj._meta.model_name, obj.id)
+
+
+def get_problem_labels(obj, count):
+    """Returns the labels of the first count problems of a contest or course."""
+    if not obj.problem_label_script:
+        return [obj.format.get_label_for_problem(index) for index in range(count)]
+
+    # Labels are stored with the hash of the script that generated them, and only the longest list is kept, since a
+    # shorter one is a prefix of it.
+    script_hash = hashlib.sha1(obj.problem_label_script.encode()).hexdigest()
+    cached = cache.get(labels_key(obj))
+    if cached is not None and cached[0] == script_hash and len(cached[1]) >= count:
+        return cached[1][:count]
+
+    label = obj.get_label_for_problem
+    labels = [str(label(index)) for index in range(count)]
+    cache.set(labels_key(obj), (script_hash, labels), settings.DMOJ_PROBLEM_LABELS_CACHE_TIMEOUT)
+    return labels
@@ -0,0 +1,260 @@
+"""
+A sorted index of the live participations of each contest, for finding ranks and ranges of the scoreboard without
+ranking every participation.
+
+The index of a contest is a Redis sorted set whose members all have the same score, and so are ordered by their
+bytes. Each member is the sort key of a participation followed by its id, and the sort key orders participations as
+the scoreboard does: by is_disqualified, then by descending score, then by cumtime and tiebreaker. A hash maps each
+participation to its member, so that it can be replaced when the results change.
+
+The index is built from the database on first use, and is kept up to date whenever the results are recomputed. When
+the cache is not Redis, the same queries are answered from the database.
+"""
+import struct
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+
+try:
+    from django_redis import get_redis_connection
+except ImportError:
+    get_redis_connection = None
+
+INDEX_KEY = 'contest_rank_index:%d'
+MEMBERS_KEY = 'contest_rank_members:%d'
+# Set of the participations updated while the index is being rebuilt, which exists only during a rebuild.
+PENDING_KEY = 'contest_rank_pending:%d'
+# Field of the members hash that marks the index as built, since the hash of a contest without participations would
+# not exist otherwise.
+BUILT_FIELD = 'built'
+RESULT_FIELDS = ('is_disqualified', 'score', 'cumtime', 'tiebreaker')
+# The order of the scoreboard, with ties in the order of their members in the index.
+RANK_ORDER = ('is_disqualified', '-score', 'cumtime', 'tiebreaker', 'id')
+
+# Replaces the members of the given participations, if the index is built. ARGV alternates participation ids and
+# their new members, where an empty member removes the participation. Participations updated during a rebuild are
+# also recorded, so that the rebuild applies them again.
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    for i = 3, #ARGV, 2 do
+        redis.call('SADD', KEYS[3], ARGV[i])
+    end
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then
+    return 0
+end
+for i = 3, #ARGV, 2 do
+    local old = redis.call('HGET', KEYS[2], ARGV[i])
+    if old then
+        redis.call('ZREM', KEYS[1], old)
+    end
+    if ARGV[i + 1] == '' then
+        redis.call('HDEL', KEYS[2], ARGV[i])
+    else
+        redis.call('ZADD', KEYS[1], 0, ARGV[i + 1])
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def _encode_float(value):
+    # Big-endian IEEE 754 doubles compare as unsigned integers once the sign bit is flipped for positive numbers and
+    # every bit is flipped for negative ones. Adding zero turns -0.0 into 0.0.
+    bits, = struct.unpack('>Q', struct.pack('>d', float(value) + 0.))
+    bits = bits ^ 0xFFFFFFFFFFFFFFFF if bits >> 63 else bits | 1 << 63
+    return '%016x' % bits
+
+
+def get_sort_key(is_disqualified, score, cumtime, tiebreaker):
+    """Returns a string that sorts participations in the order of the scoreboard. Tied participations have equal
+    sort keys."""
+    return '%d%s%s%s' % (is_disqualified, _encode_float(-score), _encode_float(cumtime), _encode_float(tiebreaker))
+
+
+def _get_member(participation_id, is_disqualified, score, cumtime, tiebreaker):
+    # Zero-padded so that tied participations are ordered by id, as they are in the database.
+    return '%s:%012d' % (get_sort_key(is_disqualified, score, cumtime, tiebreaker), participation_id)
+
+
+def _get_redis():
+    if get_redis_connection is None:
+        return None
+    try:
+        return get_redis_connection()
+    except NotImplementedError:
+        # The cache is not Redis.
+        return None
+
+
+def is_available():
+    return _get_redis() is not None
+
+
+def _get_keys(contest_id):
+    return cache.make_key(INDEX_KEY % contest_id), cache.make_key(MEMBERS_KEY % contest_id)
+
+
+def _get_pending_key(contest_id):
+    return cache.make_key(PENDING_KEY % contest_id)
+
+
+def _live_participations(contest_id):
+    from judge.models import ContestParticipation
+    return ContestParticipation.objects.filter(contest_id=contest_id, virtual=ContestParticipation.LIVE)
+
+
+def _load_members(queryset):
+    return {
+        str(participation[0]): _get_member(*participation)
+        for participation in queryset.values_list('id', 'is_disqualified', 'score', 'cumtime', 'tiebreaker')
+    }
+
+
+def rebuild(contest_id):
+    """Builds the index of the contest from the database. Returns the number of participations indexed."""
+    redis = _get_redis()
+    if redis is None:
+        return 0
+
+    index_key, members_key = _get_keys(contest_id)
+    pending_key = _get_pending_key(contest_id)
+    # Record the participations updated from now on, since the results read below may miss their updates.
+    redis.sadd(pending_key, '')
+    redis.expire(pending_key, settings.DMOJ_CONTEST_RANK_INDEX_TIMEOUT)
+
+    # Built under temporary keys, which replace the index at once.
+    members = _load_members(_live_participations(contest_id))
+    new_index_key, new_members_key = index_key + ':new', members_key + ':new'
+    pipe = redis.pipeline()
+    pipe.delete(new_index_key, new_members_key)
+    if members:
+        pipe.zadd(new_index_key, dict.fromkeys(members.values(), 0))
+    pipe.hset(new_members_key, mapping={BUILT_FIELD: 1, **members})
+    pipe.expire(new_index_key, settings.DMOJ_CONTEST_RANK_INDEX_TIMEOUT)
+    pipe.expire(new_members_key, settings.DMOJ_CONTEST_RANK_INDEX_TIMEOUT)
+    if members:
+        pipe.rename(new_index_key, index_key)
+    else:
+        pipe.delete(index_key)
+    pipe.rename(new_members_key, members_key)
+    pipe.execute()
+
+    pipe = redis.pipeline()
+    pipe.smembers(pending_key)
+    pipe.delete(pending_key)
+    pending = [int(id) for id in pipe.execute()[0] if id]
+    update_participations(contest_id, pending)
+    return len(members)
+
+
+def update_participations(contest_id, participation_ids):
+    """Updates the index with the results of the given participations of the contest in the database. Participations
+    that are no longer live, or no longer exist, are removed."""
+    redis = _get_redis()
+    if redis is None or not participation_ids:
+        return
+
+    members = _load_members(_live_participations(contest_id).filter(id__in=participation_ids))
+    args = [BUILT_FIELD, settings.DMOJ_CONTEST_RANK_INDEX_TIMEOUT]
+    for participation_id in map(str, participation_ids):
+        args += [participation_id, members.get(participation_id, '')]
+    # An index that isn't built is left alone, and built with these results on first use.
+    redis.register_script(UPDATE_SCRIPT)(keys=_get_keys(contest_id) + (_get_pending_key(contest_id),), args=args)
+
+
+def _ensure_built(redis, contest_id):
+    index_key, members_key = _get_keys(contest_id)
+    if not redis.hexists(members_key, BUILT_FIELD):
+        rebuild(contest_id)
+    return index_key, members_key
+
+
+def _get_database_rank(contest_id, is_disqualified, score, cumtime, tiebreaker):
+    better = Q(score__gt=score) | Q(score=score, cumtime__lt=cumtime) | \
+        Q(score=score, cumtime=cumtime, tiebreaker__lt=tiebreaker)
+    if is_disqualified:
+        better |= Q(is_disqualified=False)
+    else:
+        better &= Q(is_disqualified=False)
+    return _live_participations(contest_id).filter(better).count() + 1
+
+
+def get_rank(contest_id, is_disqualified, score, cumtime, tiebreaker):
+    """Returns the rank that the given results have among the live participations of the contest, with ties sharing
+    a rank as in `ranker`."""
+    redis = _get_redis()
+    if redis is None:
+        return _get_database_rank(contest_id, is_disqualified, score, cumtime, tiebreaker)
+
+    index_key = _ensure_built(redis, contest_id)[0]
+    return redis.zlexcount(index_key, '-', '(' + get_sort_key(is_disqualified, score, cumtime, tiebreaker)) + 1
+
+
+def get_count(contest_id):
+    redis = _get_redis()
+    if redis is None:
+        return _live_participations(contest_id).count()
+    return redis.zcard(_ensure_built(redis, contest_id)[0])
+
+
+def get_range(contest_id, start, stop):
+    """Returns (rank, participation id) for the live participations of the contest from the start-th to before the
+    stop-th in the order of the scoreboard, with ties sharing a rank."""
+    if stop <= start:
+        return []
+
+    redis = _get_redis()
+    if redis is None:
+        participations = _live_participations(contest_id).order_by(*RANK_ORDER) \
+            .values_list('id', *RESULT_FIELDS)[start:stop]
+        results = [(participation_id, tuple(key)) for participation_id, *key in participations]
+
+        def get_first_rank(key):
+            return _get_database_rank(contest_id, *key)
+    else:
+        index_key = _ensure_built(redis, contest_id)[0]
+        results = []
+        for member in redis.zrange(index_key, start, stop - 1):
+            key, participation_id = member.decode().split(':')
+            results.append((int(participation_id), key))
+
+        def get_first_rank(key):
+            return redis.zlexcount(index_key, '-', '(' + key) + 1
+
+    ranks = []
+    last_key = rank = None
+    for position, (participation_id, key) in enumerate(results, start):
+        if key != last_key:
+            # The first participation may be tied with those before the range.
+            rank = get_first_rank(key) if last_key is None else position + 1
+            last_key = key
+        ranks.append((rank, participation_id))
+    return ranks
+
+
+def get_window(contest_id, participation_id, before, after):
+    """Returns the range of `get_range` around a live participation of the contest, with up to before participations
+    above it and after below it. Returns an empty list if the participation is not live."""
+    redis = _get_redis()
+    if redis is None:
+        try:
+            is_disqualified, score, cumtime, tiebreaker = _live_participations(contest_id) \
+                .values_list(*RESULT_FIELDS).get(id=participation_id)
+        except ObjectDoesNotExist:
+            return []
+        position = _get_database_rank(contest_id, is_disqualified, score, cumtime, tiebreaker) - 1 + \
+            _live_participations(contest_id).filter(is_disqualified=is_disqualified, score=score, cumtime=cumtime,
+                                                    tiebreaker=tiebreaker, id__lt=participation_id).count()
+    else:
+        index_key, members_key = _ensure_built(redis, contest_id)
+        member = redis.hget(members_key, participation_id)
+        position = member and redis.zrank(index_key, member)
+        if position is None:
+            return []
+    return get_range(contest_id, max(0, position - before), position + after + 1)
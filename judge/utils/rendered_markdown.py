@@ -0,0 +1,87 @@
+"""
+Markdown of problems, posts, organizations and comments, rendered when it is saved rather than when it is viewed.
+
+Each object lists the ways its markdown is rendered by the pages, feeds and OpenGraph metadata that show it. Those
+renders are stored under the same key as the cache of the `markdown` filter, which reads them whenever the cache
+misses. Renders whose key changes, because the source was edited or the renderer was upgraded, are replaced.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from judge.jinja2.markdown import MARKDOWN_KEY, markdown_digest, render_markdown
+from judge.models import BlogPost, Comment, EFFECTIVE_MATH_ENGINES, Organization, Problem, RenderedMarkdown, \
+    TheoryPost
+
+
+def problem_renders(problem):
+    descriptions = [problem.description] + [translation.description for translation in problem.translations.all()]
+    # The feeds and OpenGraph metadata always render descriptions in the problem style.
+    return [(description, problem.markdown_style, engine, False)
+            for description in descriptions for engine in EFFECTIVE_MATH_ENGINES] + \
+        [(description, 'problem', None, False) for description in descriptions]
+
+
+def post_renders(post):
+    summary = post.summary or post.content
+    return [(post.content, 'blog', engine, False) for engine in EFFECTIVE_MATH_ENGINES] + \
+        [(summary, 'blog', 'svg', True), (summary, 'blog', None, False)]
+
+
+def organization_renders(organization):
+    return [(organization.about, 'organization-about', engine, False) for engine in EFFECTIVE_MATH_ENGINES]
+
+
+def comment_renders(comment):
+    return [(comment.body, 'comment', engine, lazy_load)
+            for engine in EFFECTIVE_MATH_ENGINES for lazy_load in (False, True)] + \
+        [(comment.body, 'comment', None, False)]
+
+
+# The arguments of the `markdown` filter that each model is rendered with: the source, style, math engine and lazy_load.
+RENDERS = {
+    Problem: problem_renders,
+    BlogPost: post_renders,
+    TheoryPost: post_renders,
+    Organization: organization_renders,
+    Comment: comment_renders,
+}
+
+
+def owner_key(obj):
+    return '%s:%d' % (obj._meta.model_name, obj.id)
+
+
+def get_model(model_name):
+    for model in RENDERS:
+        if model._meta.model_name == model_name:
+            return model
+    raise KeyError(model_name)
+
+
+def store_renders(obj):
+    """Renders the markdown of the object that isn't stored yet, and deletes the renders it no longer uses. Returns the
+    number of renders."""
+    renders = {}
+    for value, style, math_engine, lazy_load in RENDERS[type(obj)](obj):
+        # Short sources are never looked up, as the `markdown` filter renders them directly.
+        if value and len(value) >= settings.DMOJ_MARKDOWN_CACHE_MIN_LENGTH:
+            key = markdown_digest(value, style, math_engine, lazy_load, False)
+            renders[key] = (value, style, math_engine, lazy_load)
+
+    owner = owner_key(obj)
+    stored = RenderedMarkdown.objects.filter(owner=owner)
+    stored.exclude(key__in=renders).delete()
+    missing = renders.keys() - set(stored.values_list('key', flat=True))
+
+    created = []
+    for key in missing:
+        value, style, math_engine, lazy_load = renders[key]
+        html = str(render_markdown(value, style, math_engine, lazy_load))
+        created.append(RenderedMarkdown(owner=owner, key=key, html=html))
+        cache.set(MARKDOWN_KEY % key, html, settings.DMOJ_MARKDOWN_CACHE_TIMEOUT)
+    RenderedMarkdown.objects.bulk_create(created, ignore_conflicts=True)
+    return len(renders)
+
+
+def delete_renders(obj):
+    RenderedMarkdown.objects.filter(owner=owner_key(obj)).delete()
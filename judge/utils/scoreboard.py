@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from judge import event_poster as event
+from judge.utils import rank_index
+
+VERSION_KEY = 'contest_scoreboard_version:%d'
+RECALCULATING_KEY = 'contest_scoreboard_recalculating:%d'
+RATE_PENDING_KEY = 'contest_rate_pending:%d'
+
+
+def get_scoreboard_version(contest_id):
+    """Returns the number of the last update posted to the scoreboard of the contest."""
+    return cache.get(VERSION_KEY % contest_id) or 0
+
+
+def _next_scoreboard_version(contest_id):
+    key = VERSION_KEY % contest_id
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between add and incr. Clients see a gap in the versions and resync.
+        cache.set(key, 1, None)
+        return 1
+
+
+def is_recalculating(contest_id):
+    """Returns whether the results or ratings of the contest are being recalculated in Celery."""
+    return bool(cache.get(RECALCULATING_KEY % contest_id))
+
+
+def mark_recalculating(contest_id):
+    cache.set(RECALCULATING_KEY % contest_id, True, settings.DMOJ_SCOREBOARD_RECALCULATING_TIMEOUT)
+
+
+def add_pending_rate(contest_id):
+    """Marks the contest as waiting to be rerated. Returns False if it already was, in which case the rerate that is
+    already scheduled includes any change made so far."""
+    return cache.add(RATE_PENDING_KEY % contest_id, True, settings.DMOJ_SCOREBOARD_RECALCULATING_TIMEOUT)
+
+
+def take_pending_rate(contest_id):
+    """Called as a rerate starts, so that changes made from now on schedule another one."""
+    cache.delete(RATE_PENDING_KEY % contest_id)
+
+
+def finish_recalculating(contest_id):
+    """Tells scoreboards that a recalculation is done. They keep showing that the contest is being recalculated
+    until the pending rerate, if any, is done as well."""
+    if not cache.get(RATE_PENDING_KEY % contest_id):
+        cache.delete(RECALCULATING_KEY % contest_id)
+    post_scoreboard_update(contest_id)
+
+
+def get_live_rank(participation):
+    """Returns the rank of the participation on the live scoreboard, with ties sharing a rank as in `ranker`."""
+    return rank_index.get_rank(participation.contest_id, participation.is_disqualified, participation.score,
+                               participation.cumtime, participation.tiebreaker)
+
+
+def has_public_deltas(contest):
+    # The event channels are not access controlled, so results are only included when anyone can see the scoreboard.
+    return (contest.show_scoreboard and contest.is_visible and not contest.is_private and
+            not contest.is_organization_private)
+
+
+def post_scoreboard_update(contest_id):
+    """Tells scoreboards to resync, e.g. after a participation is disqualified."""
+    if not event.real:
+        return
+    event.post('contest_%d' % contest_id, {'type': 'update', 'version': _next_scoreboard_version(contest_id)})
+
+
+def post_participation_update(participation, contest_problem, old_rank=None):
+    """Posts the new results of a participation after one of its submissions to a problem is graded.
+
+    Scoreboards patch the row in place when they have seen every earlier update, and resync from the snapshot
+    otherwise. When the results can't be posted publicly, only the version is, and scoreboards always resync."""
+    if not event.real:
+        return
+
+    contest = participation.contest
+    if not participation.live or not has_public_deltas(contest):
+        post_scoreboard_update(contest.id)
+        return
+
+    event.post('contest_%d' % contest.id, {
+        'type': 'delta',
+        'version': _next_scoreboard_version(contest.id),
+        'participation': participation.id,
+        'user': participation.user.username,
+        'points': participation.score,
+        'cumtime': participation.cumtime,
+        'tiebreaker': participation.tiebreaker,
+        'is_disqualified': participation.is_disqualified,
+        'rank': get_live_rank(participation),
+        'old_rank': old_rank,
+        'cells': {contest_problem.id: str(contest.format.display_user_problem(participation, contest_problem))},
+        'result_cell': str(contest.format.display_participation_result(participation)),
+    })
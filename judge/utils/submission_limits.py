@@ -0,0 +1,116 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('judge.submission_limits')
+
+INFLIGHT_KEY = 'inflight_submissions:%d'
+CONTEST_KEY = 'contest_submissions:%d:%d'
+
+
+# The counters are only a cache of the counts in the database: they expire every DMOJ_SUBMISSION_COUNTER_TIMEOUT
+# seconds and are recounted, which corrects any drift from missed updates (e.g. rejudges, or a crashed bridge).
+# Every cache error falls back to counting in the database, so that submitting never depends on the cache.
+def _get_counter(key, count):
+    try:
+        value = cache.get(key)
+    except Exception:
+        logger.warning('Failed to read submission counter %s', key, exc_info=True)
+        return count()
+
+    if value is None or value < 0:
+        value = count()
+        try:
+            cache.set(key, value, settings.DMOJ_SUBMISSION_COUNTER_TIMEOUT)
+        except Exception:
+            logger.warning('Failed to store submission counter %s', key, exc_info=True)
+    return value
+
+
+def _adjust_counter(key, delta):
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        else:
+            cache.decr(key, -delta)
+    except ValueError:
+        # Not cached, so it will be counted on next use.
+        pass
+    except Exception:
+        logger.warning('Failed to update submission counter %s', key, exc_info=True)
+        try:
+            cache.delete(key)
+        except Exception:
+            pass
+
+
+def _count_inflight(profile_id):
+    from judge.models import Submission
+    return Submission.objects.filter(user_id=profile_id, rejudged_date__isnull=True) \
+                             .exclude(status__in=['D', 'IE', 'CE', 'AB']).count()
+
+
+def _count_contest(participation_id, problem_id):
+    from judge.models import ContestSubmission
+    return ContestSubmission.objects.filter(participation_id=participation_id, problem__problem_id=problem_id) \
+                                    .exclude(submission__status='IE').count()
+
+
+def get_inflight_submission_count(profile_id):
+    """Returns the number of the user's submissions that are still waiting to be judged, excluding rejudges."""
+    return _get_counter(INFLIGHT_KEY % profile_id, lambda: _count_inflight(profile_id))
+
+
+def get_contest_submission_count(participation_id, problem_id):
+    """Returns the number of submissions counting towards the submission limit of a contest problem."""
+    return _get_counter(CONTEST_KEY % (participation_id, problem_id),
+                        lambda: _count_contest(participation_id, problem_id))
+
+
+def reserve_inflight_submission(profile_id, limit):
+    """Counts a new submission of the user as in flight, unless the user already has `limit` of them. Returns whether
+    the submission may be made.
+
+    The check and the increment are a single atomic increment, so that concurrent submissions can't all pass the
+    check. If the submission is then not created, the reservation must be undone with `release_inflight_submission`.
+    """
+    key = INFLIGHT_KEY % profile_id
+    try:
+        if cache.get(key) is None:
+            # Added rather than set, so that a recount can't overwrite the increments of concurrent submissions.
+            cache.add(key, _count_inflight(profile_id), settings.DMOJ_SUBMISSION_COUNTER_TIMEOUT)
+        value = cache.incr(key)
+    except Exception:
+        logger.warning('Failed to reserve submission counter %s', key, exc_info=True)
+        try:
+            cache.delete(key)
+        except Exception:
+            pass
+        return _count_inflight(profile_id) < limit
+
+    if value > limit:
+        _adjust_counter(key, -1)
+        return False
+    return True
+
+
+def release_inflight_submission(profile_id):
+    _adjust_counter(INFLIGHT_KEY % profile_id, -1)
+
+
+def submission_created(profile_id, problem_id, participation_id=None, reserved=False):
+    # Reserved submissions were counted as in flight by `reserve_inflight_submission`.
+    if not reserved:
+        _adjust_counter(INFLIGHT_KEY % profile_id, 1)
+    if participation_id is not None:
+        _adjust_counter(CONTEST_KEY % (participation_id, problem_id), 1)
+
+
+def submission_finished(profile_id, problem_id, participation_id=None, rejudged=False, internal_error=False):
+    # Rejudges were never counted as in flight.
+    if rejudged:
+        return
+    _adjust_counter(INFLIGHT_KEY % profile_id, -1)
+    if internal_error and participation_id is not None:
+        _adjust_counter(CONTEST_KEY % (participation_id, problem_id), -1)
@@ -0,0 +1,105 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.models import ContestArtifact, ContestParticipation, ContestSubmission, Language, Submission
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem
+from judge.utils import contest_artifacts
+
+
+class ContestArtifactTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        now = timezone.now()
+        self.contest = create_contest(key='artifacts', start_time=now - timezone.timedelta(days=2),
+                                      end_time=now - timezone.timedelta(days=1))
+        self.problem = create_problem(code='artifacts')
+        self.contest_problem = create_contest_problem(contest=self.contest, problem=self.problem, points=100)
+        self.participations = {
+            username: create_contest_participation(contest=self.contest, user=username, score=score)
+            for username, score in [('normal', 50), ('superuser', 100)]
+        }
+
+        self.submissions = []
+        for username, points, time in [('normal', 50, 2), ('normal', 50, 1), ('normal', 0, 0.5),
+                                       ('superuser', 30, 0.1), ('superuser', 100, 3)]:
+            participation = self.participations[username]
+            submission = Submission.objects.create(user=participation.user, problem=self.problem,
+                                                   language=Language.get_python3(), result='AC', status='D',
+                                                   time=time, points=points, contest_object=self.contest)
+            ContestSubmission.objects.create(submission=submission, problem=self.contest_problem,
+                                             participation=participation, points=points)
+            self.submissions.append(submission)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stored(self):
+        stats = contest_artifacts.get_stats(self.contest)
+        self.assertEqual(list(stats['problem_status_count']['labels']), [self.problem.name])
+        artifact = ContestArtifact.objects.get(contest=self.contest, name='stats')
+        self.assertEqual(artifact.version, contest_artifacts.get_submissions_version(self.contest))
+
+        # Served from the database, with the version cached.
+        with self.assertNumQueries(1):
+            self.assertEqual(contest_artifacts.get_stats(self.contest), artifact.data)
+
+    def test_rebuilt(self):
+        self.assertEqual(contest_artifacts.get_ranking(self.contest), [
+            (self.participations['superuser'].id, 0), (self.participations['normal'].id, 0),
+        ])
+        version = contest_artifacts.get_contest_version(self.contest)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ContestParticipation.objects.get(id=self.participations['normal'].id).recompute_results()
+        self.assertNotEqual(contest_artifacts.get_contest_version(self.contest), version)
+        self.assertEqual(contest_artifacts.get_ranking(self.contest), [
+            (self.participations['superuser'].id, 0), (self.participations['normal'].id, 1),
+        ])
+        self.assertEqual(ContestArtifact.objects.get(contest=self.contest, name='ranking').data[1],
+                         [self.participations['normal'].id, 1])
+
+    def test_not_ended(self):
+        self.contest.end_time = timezone.now() + timezone.timedelta(days=1)
+        contest_artifacts.build_artifacts(self.contest)
+        self.assertFalse(ContestArtifact.objects.exists())
+
+    def test_ranked_submissions(self):
+        self.assertCountEqual(contest_artifacts.get_ranked_submissions(self.contest, self.problem.id),
+                              [self.submissions[1].id, self.submissions[4].id])
+
+    def test_api_rankings(self):
+        contest_artifacts.build_artifacts(self.contest)
+        self.assertEqual(set(ContestArtifact.objects.values_list('name', flat=True)),
+                         {'stats', 'ranking', 'api_rankings', 'ranked_submissions:%d' % self.problem.id})
+        rankings = contest_artifacts.get_api_rankings(self.contest)
+        self.assertEqual([ranking['user'] for ranking in rankings], ['superuser', 'normal'])
+        self.assertEqual(rankings, contest_artifacts.build_api_rankings(self.contest))
+
+    def test_virtual(self):
+        contest_artifacts.build_artifacts(self.contest)
+        ranking = ContestArtifact.objects.get(contest=self.contest, name='ranking')
+        stats = ContestArtifact.objects.get(contest=self.contest, name='stats')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participation = ContestParticipation.objects.create(contest=self.contest, user=self.users['normal'].profile,
+                                                                virtual=1)
+            submission = Submission.objects.create(user=participation.user, problem=self.problem,
+                                                   language=Language.get_python3(), result='WA', status='D',
+                                                   time=1, points=0, contest_object=self.contest)
+            ContestSubmission.objects.create(submission=submission, problem=self.contest_problem,
+                                             participation=participation, points=0)
+            participation.recompute_results()
+
+        # The rankings only cover live participations, so they aren't rebuilt.
+        self.assertEqual(contest_artifacts.get_contest_version(self.contest), ranking.version)
+        with self.assertNumQueries(1):
+            contest_artifacts.get_ranking(self.contest)
+
+        # The statistics cover every submission.
+        self.assertNotEqual(contest_artifacts.get_submissions_version(self.contest), stats.version)
+        contest_artifacts.get_stats(self.contest)
+        self.assertEqual(ContestArtifact.objects.get(contest=self.contest, name='stats').version,
+                         contest_artifacts.get_submissions_version(self.contest))
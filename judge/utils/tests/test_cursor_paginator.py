@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.utils.cursor_paginator import cursor_paginate
+
+
+class CursorPaginatorTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        User.objects.bulk_create([
+            User(username='user%03d' % i, first_name='name%d' % (i % 7),
+                 last_login=now - timezone.timedelta(days=i % 5) if i % 3 else None)
+            for i in range(95)
+        ])
+
+    def walk(self, queryset, page_size=10):
+        pages = [cursor_paginate(queryset, None, page_size, 2)]
+        while pages[-1].has_next():
+            pages.append(cursor_paginate(queryset, pages[-1].next_cursor, page_size, 2))
+        return pages
+
+    def assertCovers(self, queryset, pages):
+        self.assertEqual([user.id for page in pages for user in page], list(queryset.values_list('id', flat=True)))
+
+    def test_walk_by_id(self):
+        queryset = User.objects.order_by('-id')
+        pages = self.walk(queryset)
+        self.assertEqual(len(pages), 10)
+        self.assertEqual([page.number for page in pages], list(range(1, 11)))
+        self.assertCovers(queryset, pages)
+        self.assertEqual(len(pages[-1]), 5)
+
+    def test_walk_with_ties_and_nulls(self):
+        for ordering in (('first_name',), ('-first_name',), ('-last_login',), ('last_login', '-first_name')):
+            queryset = User.objects.order_by(*ordering, 'id')
+            self.assertCovers(queryset, self.walk(User.objects.order_by(*ordering)))
+
+    def test_walk_backwards(self):
+        queryset = User.objects.order_by('-last_login', 'first_name')
+        forward = self.walk(queryset)
+
+        page = forward[-1]
+        backward = [page]
+        while page.has_previous():
+            page = cursor_paginate(queryset, page.get_cursor(page.number - 1), 10, 2)
+            backward.append(page)
+        self.assertEqual([page.number for page in backward], list(range(10, 0, -1)))
+        self.assertEqual([[user.id for user in page] for page in backward][1:],
+                         [[user.id for user in page] for page in forward][-2::-1])
+
+    def test_page_range(self):
+        queryset = User.objects.order_by('-id')
+        pages = self.walk(queryset)
+        self.assertEqual(pages[0].page_range, [1, 2, 3, False])
+        self.assertEqual(pages[1].page_range, [1, 2, 3, 4, False])
+        self.assertEqual(pages[2].page_range, [1, 2, 3, 4, 5, False])
+        self.assertEqual(pages[5].page_range, [1, False, 4, 5, 6, 7, 8, False])
+        self.assertEqual(pages[7].page_range, [1, False, 6, 7, 8, 9, 10])
+        self.assertEqual(pages[9].page_range, [1, False, 8, 9, 10])
+
+        page = pages[5]
+        for number in page.main_range:
+            target = cursor_paginate(queryset, page.get_cursor(number), 10, 2)
+            self.assertEqual(target.number, number)
+            self.assertEqual(list(target), list(pages[number - 1]))
+
+    def test_empty(self):
+        page = cursor_paginate(User.objects.none().order_by('-id'), None, 10, 2)
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_other_pages())
+        self.assertEqual(page.page_range, [1])
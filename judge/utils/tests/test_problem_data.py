@@ -0,0 +1,118 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from judge.judgeapi import queue_submission
+from judge.models import Judge, Language, LanguageLimit, ProblemData, RuntimeVersion, Submission, \
+    problem_data_storage
+from judge.models.tests.util import CommonDataMixin, create_problem
+from judge.tasks import exclude_unchanged_submissions
+from judge.utils.problem_data import ProblemDataCompiler, get_grading_fingerprint, get_grading_fingerprints, \
+    get_problem_data_hash, get_runtime_versions
+
+
+class GradingFingerprintTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='fingerprint')
+        self.python3 = Language.get_python3()
+        self.judge = Judge.objects.create(name='fingerprint-judge', auth_key='key', online=True)
+        self.judge.problems.add(self.problem)
+        self.runtime = RuntimeVersion.objects.create(language=self.python3, judge=self.judge, name='python3',
+                                                     version='3.11.2')
+        self.data = ProblemData.objects.create(problem=self.problem, data_hash='0' * 64)
+
+    def setUp(self):
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.location = mock.patch.object(problem_data_storage, 'location', self.data_dir.name)
+        self.location.start()
+        os.mkdir(os.path.join(self.data_dir.name, self.problem.code))
+
+    def tearDown(self):
+        self.location.stop()
+        self.data_dir.cleanup()
+
+    def fingerprint(self):
+        return get_grading_fingerprints(self.problem, self.python3.id, [self.judge.id])[self.judge.id]
+
+    def test_data_hash(self):
+        self.assertIsNone(get_problem_data_hash(self.problem.code))
+
+        problem_data_storage.save('fingerprint/data.zip', ContentFile(b'first'))
+        problem_data_storage.save('fingerprint/init.yml', ContentFile(b'archive: data.zip\n'))
+        first = get_problem_data_hash(self.problem.code)
+        self.assertIsNotNone(first)
+        self.assertEqual(get_problem_data_hash(self.problem.code), first)
+
+        problem_data_storage.save('fingerprint/data.zip', ContentFile(b'second'))
+        self.assertNotEqual(get_problem_data_hash(self.problem.code), first)
+
+    def test_data_hash_checker(self):
+        problem_data_storage.save('fingerprint/data.zip', ContentFile(b'data'))
+        problem_data_storage.save('fingerprint/checker.py', ContentFile(b'first'))
+        problem_data_storage.save('fingerprint/init.yml', ContentFile(b'archive: data.zip\nchecker: checker.py\n'))
+        first = get_problem_data_hash(self.problem.code)
+
+        # Files next to the archive are replaced under the same name.
+        problem_data_storage.save('fingerprint/checker.py', ContentFile(b'second'))
+        self.assertNotEqual(get_problem_data_hash(self.problem.code), first)
+
+    def test_compile_stores_hash(self):
+        problem_data_storage.save('fingerprint/data.zip', ContentFile(b'data'))
+        with mock.patch.object(ProblemDataCompiler, 'make_init', return_value={'archive': 'data.zip'}):
+            ProblemDataCompiler.generate(self.problem, self.data, [], ['data.zip'])
+        self.data.refresh_from_db()
+        self.assertEqual(self.data.data_hash, get_problem_data_hash(self.problem.code))
+        self.assertIsNotNone(self.data.data_hash)
+
+    def test_fingerprint_stamped_on_dispatch(self):
+        submission = Submission.objects.create(user=self.users['normal'].profile, problem=self.problem,
+                                               language=self.python3)
+        queue_submission(submission)
+        submission.refresh_from_db()
+
+        # Data saved while the submission is being graded doesn't change the data it was graded with.
+        ProblemData.objects.filter(id=self.data.id).update(data_hash='1' * 64)
+        versions = get_runtime_versions(self.python3.id, [self.judge.id])[self.judge.id]
+        self.assertNotEqual(get_grading_fingerprint(submission.grading_fingerprint, versions), self.fingerprint())
+
+    def test_unhashed_data(self):
+        ProblemData.objects.filter(id=self.data.id).update(data_hash=None)
+        self.assertIsNone(self.fingerprint())
+
+    def test_fingerprint_inputs(self):
+        original = self.fingerprint()
+        self.assertEqual(self.fingerprint(), original)
+
+        limit = LanguageLimit.objects.create(problem=self.problem, language=self.python3, time_limit=5,
+                                             memory_limit=65536)
+        self.assertNotEqual(self.fingerprint(), original)
+        limit.delete()
+
+        self.runtime.version = '3.12.0'
+        self.runtime.save()
+        self.assertNotEqual(self.fingerprint(), original)
+
+    def test_exclude_unchanged(self):
+        def create_submission(fingerprint):
+            return Submission.objects.create(user=self.users['normal'].profile, problem=self.problem,
+                                             language=self.python3, result='AC', status='D',
+                                             grading_fingerprint=fingerprint)
+
+        unchanged = create_submission(self.fingerprint())
+        stale = create_submission('0' * 64)
+        unknown = create_submission(None)
+
+        queryset = exclude_unchanged_submissions(Submission.objects.filter(problem=self.problem), self.problem)
+        self.assertNotIn(unchanged, queryset)
+        self.assertIn(stale, queryset)
+        self.assertIn(unknown, queryset)
+
+        self.judge.online = False
+        self.judge.save()
+        queryset = exclude_unchanged_submissions(Submission.objects.filter(problem=self.problem), self.problem)
+        self.assertIn(unchanged, queryset)
@@ -0,0 +1,153 @@
+import random
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from judge.models import ContestParticipation
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation
+from judge.utils import rank_index
+from judge.views.contests import get_contest_ranking_list, get_ranking_window
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class SortKeyTestCase(SimpleTestCase):
+    def test_order(self):
+        rng = random.Random(0)
+        values = [0, -0., 1, -1, 0.5, -0.5, 100, 1e-9, -9999, 123.456, 1e12]
+        results = [(rng.choice([False, True]), rng.choice(values), rng.randrange(0, 10 ** 6, 1000), rng.choice(values))
+                   for _ in range(500)]
+        expected = sorted(results, key=lambda result: (result[0], -result[1], result[2], result[3]))
+        self.assertEqual(sorted(results, key=lambda result: rank_index.get_sort_key(*result)), expected)
+
+    def test_ties(self):
+        self.assertEqual(rank_index.get_sort_key(False, 0, 0, 0), rank_index.get_sort_key(False, -0., 0., -0.))
+        self.assertEqual(len(rank_index.get_sort_key(True, -9999, 0, 0.5)), 49)
+
+
+class RankIndexTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='rank_index', is_visible=True)
+        self.participations = [
+            create_contest_participation(contest=self.contest, user=username, score=score, cumtime=cumtime,
+                                         is_disqualified=is_disqualified)
+            for username, score, cumtime, is_disqualified in [
+                ('normal', 100, 50, False), ('superuser', 100, 20, False), ('staff_problem_see_all', 100, 50, False),
+                ('staff_problem_edit_own', 0, 0, False), ('staff_problem_edit_all', -9999, 0, True),
+            ]
+        ]
+        self.virtual = create_contest_participation(contest=self.contest, user='staff_problem_see_organization',
+                                                    score=200, virtual=1)
+
+    def ids(self, *indices):
+        return [self.participations[i].id for i in indices]
+
+    def test_rank(self):
+        self.assertEqual(rank_index.get_rank(self.contest.id, False, 100, 50, 0), 2)
+        self.assertEqual(rank_index.get_rank(self.contest.id, False, 150, 1000, 0), 1)
+        self.assertEqual(rank_index.get_rank(self.contest.id, False, 50, 0, 0), 4)
+        self.assertEqual(rank_index.get_rank(self.contest.id, True, -9999, 0, 0), 5)
+        self.assertEqual(rank_index.get_count(self.contest.id), 5)
+
+    def test_range(self):
+        self.assertEqual(rank_index.get_range(self.contest.id, 0, 10),
+                         list(zip([1, 2, 2, 4, 5], self.ids(1, 0, 2, 3, 4))))
+        # The rank of the first participation accounts for ties before the range.
+        self.assertEqual(rank_index.get_range(self.contest.id, 2, 4), list(zip([2, 4], self.ids(2, 3))))
+        self.assertEqual(rank_index.get_range(self.contest.id, 3, 3), [])
+
+    def test_window(self):
+        self.assertEqual(rank_index.get_window(self.contest.id, self.participations[2].id, 1, 1),
+                         list(zip([2, 2, 4], self.ids(0, 2, 3))))
+        self.assertEqual(rank_index.get_window(self.contest.id, self.participations[1].id, 2, 0),
+                         list(zip([1], self.ids(1))))
+        self.assertEqual(rank_index.get_window(self.contest.id, self.virtual.id, 1, 1), [])
+
+    def get_ranking(self, **params):
+        request = RequestFactory().get(reverse('contest_ranking', args=[self.contest.key]), params)
+        request.user = AnonymousUser()
+        users, problems = get_contest_ranking_list(request, self.contest,
+                                                   window=get_ranking_window(request, self.contest))
+        return [(rank, user.participation.id) for rank, user in users]
+
+    def test_ranking_window(self):
+        with self.settings(DMOJ_CONTEST_RANKING_PAGE_SIZE=2):
+            self.assertEqual(self.get_ranking(), list(zip([1, 2, 2, 4, 5], self.ids(1, 0, 2, 3, 4))))
+            self.assertEqual(self.get_ranking(page=2), list(zip([2, 4], self.ids(2, 3))))
+            self.assertEqual(self.get_ranking(around='staff_problem_edit_all'), list(zip([4, 5], self.ids(3, 4))))
+            self.assertEqual(self.get_ranking(around='superuser'), list(zip([1], self.ids(1))))
+            # The page is ignored around a participation.
+            self.assertEqual(self.get_ranking(around='superuser', page='abc'), list(zip([1], self.ids(1))))
+            with self.assertRaises(Http404):
+                self.get_ranking(page=0)
+            with self.assertRaises(Http404):
+                self.get_ranking(page='abc')
+            with self.assertRaises(Http404):
+                self.get_ranking(around='staff_problem_see_organization')
+
+    def test_api_rankings(self):
+        url = '/api/v2/contest/%s' % self.contest.key
+        rankings = self.client.get(url).json()['data']['object']['rankings']
+        self.assertEqual(len(rankings), 5)
+        self.assertNotIn('rank', rankings[0])
+
+        response = self.client.get(url, {'rankings_offset': 1, 'rankings_limit': 2})
+        rankings = response.json()['data']['object']['rankings']
+        self.assertEqual([(ranking['user'], ranking['rank']) for ranking in rankings],
+                         [('normal', 2), ('staff_problem_see_all', 2)])
+        self.assertEqual(self.client.get(url, {'rankings_offset': -1}).status_code, 400)
+
+
+@skipIf(fakeredis is None, 'fakeredis is not installed')
+class RedisRankIndexTestCase(RankIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch('judge.utils.rank_index._get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_build(self):
+        index_key, members_key = rank_index._get_keys(self.contest.id)
+        self.assertFalse(self.redis.exists(members_key))
+        self.assertEqual(rank_index.get_count(self.contest.id), 5)
+        self.assertTrue(self.redis.hexists(members_key, rank_index.BUILT_FIELD))
+        self.assertEqual(self.redis.zcard(index_key), 5)
+
+    def test_update(self):
+        # An index that isn't built is left alone.
+        rank_index.update_participations(self.contest.id, self.ids(3))
+        self.assertFalse(self.redis.exists(*rank_index._get_keys(self.contest.id)))
+
+        self.assertEqual(rank_index.get_count(self.contest.id), 5)
+        ContestParticipation.objects.filter(id=self.participations[3].id).update(score=150)
+        ContestParticipation.objects.filter(id=self.participations[2].id).update(virtual=2)
+        rank_index.update_participations(self.contest.id, self.ids(3, 2))
+        self.assertEqual(rank_index.get_range(self.contest.id, 0, 10), list(zip([1, 2, 3, 4], self.ids(3, 1, 0, 4))))
+        self.assertEqual(rank_index.get_rank(self.contest.id, False, 100, 20, 0), 2)
+        self.assertEqual(rank_index.get_window(self.contest.id, self.participations[2].id, 1, 1), [])
+
+    def test_update_during_rebuild(self):
+        load_members = rank_index._load_members
+
+        def load_stale_members(queryset):
+            members = load_members(queryset)
+            # Updated after the rebuild read the results, but before it replaced the index.
+            patcher.stop()
+            ContestParticipation.objects.filter(id=self.participations[3].id).update(score=150)
+            rank_index.update_participations(self.contest.id, self.ids(3))
+            return members
+
+        patcher = mock.patch('judge.utils.rank_index._load_members', side_effect=load_stale_members)
+        patcher.start()
+        rank_index.rebuild(self.contest.id)
+        self.assertEqual(rank_index.get_range(self.contest.id, 0, 2), list(zip([1, 2], self.ids(3, 1))))
+        self.assertFalse(self.redis.exists(rank_index._get_pending_key(self.contest.id)))
@@ -0,0 +1,36 @@
+import unittest
+
+from django.test import SimpleTestCase
+
+from judge import ratings
+from judge.management.commands.benchmark_ratings import make_contest
+
+
+@unittest.skipIf(ratings.np is None, 'requires numpy')
+class RecalculateRatingsTestCase(SimpleTestCase):
+    def assertSameRatings(self, contest):
+        numpy_rating, numpy_mean, numpy_p = ratings.recalculate_ratings_numpy(*contest)
+        python_rating, python_mean, python_p = ratings.recalculate_ratings_python(*contest)
+        for a, b in zip(numpy_rating, python_rating):
+            # The means may differ by a tiny amount, which can round to a different rating.
+            self.assertLessEqual(abs(a - b), 1)
+            self.assertIsInstance(a, int)
+        for a, b in zip(numpy_mean, python_mean):
+            self.assertAlmostEqual(a, b, delta=0.01)
+        for a, b in zip(numpy_p, python_p):
+            self.assertAlmostEqual(a, b, delta=0.01)
+
+    def test_equivalence(self):
+        for size in (1, 2, 3, 10, 100, 500):
+            with self.subTest(size=size):
+                self.assertSameRatings(make_contest(size, seed=size))
+
+    def test_all_tied(self):
+        self.assertSameRatings(([1.5, 1.5], [1500., 1800.], [0, 3], [[], [1700., 1900., 2000.]]))
+
+    def test_long_history(self):
+        # Only the most recent performances are used by the numpy engine.
+        contest = make_contest(20, seed=0)
+        contest[2][:] = [200] * 20
+        contest[3][:] = [[1500. + i for i in range(200)] for _ in range(20)]
+        self.assertSameRatings(contest)
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from judge.jinja2.markdown import cached_markdown, markdown, markdown_digest, render_markdown
+from judge.models import ProblemTranslation, RenderedMarkdown
+from judge.models.tests.util import create_problem
+from judge.utils import rendered_markdown
+
+DESCRIPTION = 'A long problem statement with some *emphasis*.\n\n' * 20
+
+
+class RenderedMarkdownTestCase(TestCase):
+    @classmethod
+    def setUpTestData(self):
+        self.problem = create_problem(code='rendered', description=DESCRIPTION)
+        self.translation = ProblemTranslation.objects.create(problem=self.problem, language='de', name='rendered',
+                                                             description=DESCRIPTION + 'Übersetzt.')
+
+    def setUp(self):
+        cache.clear()
+        cached_markdown.cache_clear()
+        self.addCleanup(cached_markdown.cache_clear)
+
+    def test_stored(self):
+        # Four math engines and the feed, for the description and its translation.
+        self.assertEqual(rendered_markdown.store_renders(self.problem), 10)
+        self.assertEqual(RenderedMarkdown.objects.filter(owner='problem:%d' % self.problem.id).count(), 10)
+        stored = RenderedMarkdown.objects.get(key=markdown_digest(DESCRIPTION, 'problem', 'svg', False, False))
+        self.assertEqual(stored.html, str(render_markdown(DESCRIPTION, 'problem', 'svg')))
+
+        # Stored renders are read when the cache misses.
+        cache.clear()
+        with mock.patch('judge.jinja2.markdown.render_markdown') as render:
+            self.assertEqual(str(markdown(DESCRIPTION, 'problem', 'svg')), stored.html)
+        render.assert_not_called()
+
+    def test_edited(self):
+        rendered_markdown.store_renders(self.problem)
+        self.problem.description = DESCRIPTION + 'Edited.'
+        with mock.patch('judge.utils.rendered_markdown.render_markdown', wraps=render_markdown) as render:
+            self.assertEqual(rendered_markdown.store_renders(self.problem), 10)
+        # Only the renders of the edited description are replaced.
+        self.assertEqual(render.call_count, 5)
+        keys = set(RenderedMarkdown.objects.values_list('key', flat=True))
+        self.assertEqual(len(keys), 10)
+        self.assertIn(markdown_digest(self.problem.description, 'problem', 'tex', False, False), keys)
+        self.assertNotIn(markdown_digest(DESCRIPTION, 'problem', 'tex', False, False), keys)
+
+    def test_short(self):
+        problem = create_problem(code='short', description='Short.')
+        self.assertEqual(rendered_markdown.store_renders(problem), 0)
+
+    @mock.patch('judge.tasks.store_rendered_markdown.delay')
+    def test_signals(self, delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.problem.save()
+        delay.assert_called_once_with('problem', self.problem.id)
+
+        rendered_markdown.store_renders(self.problem)
+        self.problem.delete()
+        self.assertFalse(RenderedMarkdown.objects.exists())
+
+    def test_command(self):
+        RenderedMarkdown.objects.create(owner='problem:0', key='0' * 40, html='')
+        call_command('render_markdown', 'problem', stdout=mock.Mock())
+        self.assertEqual(set(RenderedMarkdown.objects.values_list('owner', flat=True)),
+                         {'problem:%d' % self.problem.id})
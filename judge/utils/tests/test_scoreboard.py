@@ -0,0 +1,140 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from judge.models import ContestParticipation
+from judge.models.tests.util import CommonDataMixin, create_contest, create_contest_participation, \
+    create_contest_problem, create_problem
+from judge.tasks import disqualify_participation, rate_contest
+from judge.utils import scoreboard
+from judge.utils.celery import Progress
+from judge.views.contests import contest_ranking_snapshot
+
+
+class ScoreboardTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='scoreboard', is_visible=True)
+        self.contest_problem = create_contest_problem(contest=self.contest, problem=create_problem(code='scoreboard'))
+        self.participations = {
+            username: create_contest_participation(contest=self.contest, user=username, score=score, cumtime=cumtime)
+            for username, score, cumtime in [('normal', 100, 50), ('superuser', 100, 20),
+                                             ('staff_problem_see_all', 100, 50), ('staff_problem_edit_own', 0, 0)]
+        }
+        create_contest_participation(contest=self.contest, user='staff_problem_edit_all', score=200, virtual=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_live_rank(self):
+        ranks = {username: scoreboard.get_live_rank(participation)
+                 for username, participation in self.participations.items()}
+        self.assertEqual(ranks, {'superuser': 1, 'normal': 2, 'staff_problem_see_all': 2, 'staff_problem_edit_own': 4})
+
+    @mock.patch('judge.utils.scoreboard.event')
+    def test_delta(self, event):
+        event.real = True
+        participation = ContestParticipation.objects.get(id=self.participations['staff_problem_edit_own'].id)
+        participation.score = 100
+        participation.cumtime = 10
+        participation.format_data = {str(self.contest_problem.id): {'points': 100, 'time': 10}}
+
+        scoreboard.post_participation_update(participation, self.contest_problem, old_rank=4)
+        scoreboard.post_participation_update(participation, self.contest_problem, old_rank=4)
+        self.assertEqual(scoreboard.get_scoreboard_version(self.contest.id), 2)
+
+        channel, message = event.post.call_args[0]
+        self.assertEqual(channel, 'contest_%d' % self.contest.id)
+        self.assertEqual(message['type'], 'delta')
+        self.assertEqual(message['version'], 2)
+        self.assertEqual(message['participation'], participation.id)
+        self.assertEqual(message['old_rank'], 4)
+        # Ranked against the results in the database, in which the participation itself hasn't improved yet.
+        self.assertEqual(message['rank'], 1)
+        self.assertEqual(list(message['cells']), [self.contest_problem.id])
+        self.assertIn('100', message['cells'][self.contest_problem.id])
+
+    @mock.patch('judge.utils.scoreboard.event')
+    def test_private_contest(self, event):
+        event.real = True
+        participation = ContestParticipation.objects.get(id=self.participations['normal'].id)
+        participation.contest.is_private = True
+        scoreboard.post_participation_update(participation, self.contest_problem)
+        event.post.assert_called_once_with('contest_%d' % self.contest.id, {'type': 'update', 'version': 1})
+
+    def test_snapshot(self):
+        response = self.client.get(reverse('contest_ranking_snapshot', args=[self.contest.key]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['version'], 0)
+        self.assertEqual(data['problems'], [self.contest_problem.id])
+        self.assertEqual([(row[1], row[2]) for row in data['rows']], [
+            ('superuser', 1), ('normal', 2), ('staff_problem_see_all', 2), ('staff_problem_edit_own', 4),
+        ])
+        self.assertEqual(data['rows'][0][0], self.participations['superuser'].id)
+        self.assertEqual(len(data['rows'][0][7]), 1)
+
+    def test_snapshot_hidden(self):
+        self.contest.scoreboard_visibility = self.contest.SCOREBOARD_HIDDEN
+        self.contest.save()
+        request = RequestFactory().get(reverse('contest_ranking_snapshot', args=[self.contest.key]))
+        request.user = AnonymousUser()
+        with self.assertRaises(Http404):
+            contest_ranking_snapshot(request, self.contest.key)
+
+
+@mock.patch.object(Progress, '_update_state')
+class RecalculationTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.contest = create_contest(key='recalculation', is_visible=True)
+        self.participation = create_contest_participation(contest=self.contest, user='normal', score=100)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_snapshot(self):
+        return self.client.get(reverse('contest_ranking_snapshot', args=[self.contest.key])).json()
+
+    @mock.patch('judge.tasks.rate_contest.apply_async')
+    def test_batched_rate(self, apply_async, update_state):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.schedule_rate()
+            self.contest.schedule_rate()
+        apply_async.assert_called_once_with((self.contest.key,), countdown=settings.DMOJ_RERATE_DELAY)
+        self.assertTrue(scoreboard.is_recalculating(self.contest.id))
+
+        rate_contest(self.contest.key)
+        self.assertFalse(scoreboard.is_recalculating(self.contest.id))
+
+        # Later changes are rerated again.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.schedule_rate()
+        self.assertEqual(apply_async.call_count, 2)
+
+    @mock.patch('judge.tasks.rate_contest.apply_async')
+    def test_rate_started(self, apply_async, update_state):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.contest.schedule_rate()
+        # A disqualification finishing while a rerate is pending doesn't end the recalculation.
+        disqualify_participation(self.participation.id, True)
+        self.assertTrue(scoreboard.is_recalculating(self.contest.id))
+        rate_contest(self.contest.key)
+        self.assertFalse(scoreboard.is_recalculating(self.contest.id))
+
+    def test_disqualify(self, update_state):
+        scoreboard.mark_recalculating(self.contest.id)
+        self.assertTrue(self.get_snapshot()['recalculating'])
+
+        self.assertEqual(disqualify_participation(self.participation.id, True), self.contest.key)
+        self.participation.refresh_from_db()
+        self.assertTrue(self.participation.is_disqualified)
+        self.assertEqual(self.participation.score, -9999)
+        self.assertFalse(self.get_snapshot()['recalculating'])
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from judge.models import Language, Submission
+from judge.models.tests.util import CommonDataMixin, create_problem
+from judge.utils import submission_limits
+
+
+class InflightSubmissionCountTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.problem = create_problem(code='inflight')
+
+    def setUp(self):
+        cache.clear()
+        self.profile = self.users['normal'].profile
+
+    def submit(self, **kwargs):
+        submission = Submission.objects.create(user=self.profile, problem=self.problem,
+                                               language=Language.get_python3(), **kwargs)
+        submission_limits.submission_created(self.profile.id, self.problem.id)
+        return submission
+
+    def test_counter(self):
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 0)
+        first = self.submit()
+        self.submit()
+        with self.assertNumQueries(0):
+            self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 2)
+
+        Submission.objects.filter(id=first.id).update(status='D', result='AC')
+        submission_limits.submission_finished(self.profile.id, self.problem.id)
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 1)
+
+        # Rejudges are not counted.
+        submission_limits.submission_finished(self.profile.id, self.problem.id, rejudged=True)
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 1)
+
+    def test_reconciliation(self):
+        self.submit()
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 1)
+        # Finishing submissions that were never counted makes the counter drift below zero.
+        Submission.objects.create(user=self.profile, problem=self.problem, language=Language.get_python3(),
+                                  rejudged_date=timezone.now())
+        submission_limits.submission_finished(self.profile.id, self.problem.id)
+        submission_limits.submission_finished(self.profile.id, self.problem.id)
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 1)
+
+        cache.delete(submission_limits.INFLIGHT_KEY % self.profile.id)
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 1)
+
+    def test_cache_unavailable(self):
+        self.submit()
+        with mock.patch.object(cache, 'get', side_effect=ConnectionError), \
+                mock.patch.object(cache, 'incr', side_effect=ConnectionError):
+            self.submit()
+            self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 2)
+        # The failed increment dropped the counter, so it is recounted.
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 2)
+
+    def test_reserve(self):
+        self.submit()
+        # Each reservation is counted as it is checked, so concurrent submissions can't all pass the limit.
+        self.assertTrue(submission_limits.reserve_inflight_submission(self.profile.id, 3))
+        self.assertTrue(submission_limits.reserve_inflight_submission(self.profile.id, 3))
+        self.assertFalse(submission_limits.reserve_inflight_submission(self.profile.id, 3))
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 3)
+
+        submission_limits.release_inflight_submission(self.profile.id)
+        self.assertEqual(submission_limits.get_inflight_submission_count(self.profile.id), 2)
+        self.assertTrue(submission_limits.reserve_inflight_submission(self.profile.id, 3))
+
+    def test_reserve_cache_unavailable(self):
+        self.submit()
+        with mock.patch.object(cache, 'incr', side_effect=ConnectionError):
+            self.assertTrue(submission_limits.reserve_inflight_submission(self.profile.id, 2))
+            self.assertFalse(submission_limits.reserve_inflight_submission(self.profile.id, 1))
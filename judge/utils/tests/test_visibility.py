@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from judge.admin import ContestAdmin, ProblemAdmin
+from judge.models import Contest, Problem
+from judge.models.tests.util import CommonDataMixin, create_contest, create_organization, create_problem, create_user
+from judge.utils.visibility import VisibleIds, get_visible_contest_ids, get_visible_problem_ids
+
+
+class VisibleIdsTestCase(TestCase):
+    def test_inversion(self):
+        ids = VisibleIds.from_ids([1, 2], range(1, 11))
+        self.assertFalse(ids.inverted)
+        self.assertIn(1, ids)
+        self.assertNotIn(3, ids)
+
+        ids = VisibleIds.from_ids(range(1, 10), range(1, 11))
+        self.assertTrue(ids.inverted)
+        self.assertEqual(ids.ids, {10})
+        self.assertIn(1, ids)
+        self.assertNotIn(10, ids)
+
+        self.assertTrue(VisibleIds.from_ids(range(1, 11), range(1, 11)).is_everything)
+
+    def test_pack(self):
+        for ids in (VisibleIds(frozenset({3, 1, 4159}), False), VisibleIds(frozenset(), True)):
+            unpacked = VisibleIds.unpack(ids.pack())
+            self.assertEqual(unpacked.ids, ids.ids)
+            self.assertEqual(unpacked.inverted, ids.inverted)
+
+
+class VisibilityInvalidationTestCase(CommonDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(self):
+        super().setUpTestData()
+        self.organization = create_organization(name='visibility')
+        self.problem = create_problem(
+            code='visibility_private',
+            is_public=True,
+            is_organization_private=True,
+            organizations=(self.organization,),
+        )
+        for i in range(3):
+            create_problem(code='visibility_public%d' % i, is_public=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_large_sets(self):
+        user = self.users['normal']
+        queryset = Problem.objects.filter(code__startswith='visibility_')
+        expected = set(queryset.filter(is_organization_private=False).values_list('id', flat=True))
+
+        ids = get_visible_problem_ids(user)
+        self.assertNotIn('SELECT', str(ids.restrict(queryset).query).split('WHERE', 1)[1])
+        self.assertEqual(set(ids.restrict(queryset).values_list('id', flat=True)), expected)
+
+        # Sets too large to list in the query filter by the subquery instead.
+        with self.settings(DMOJ_VISIBILITY_MAX_INLINE_IDS=0):
+            self.assertIn('SELECT', str(ids.restrict(queryset).query).split('WHERE', 1)[1])
+            self.assertEqual(set(ids.restrict(queryset).values_list('id', flat=True)), expected)
+
+    def test_organization_membership(self):
+        user = create_user(username='visibility_member')
+        self.assertNotIn(self.problem.id, get_visible_problem_ids(user))
+
+        user.profile.organizations.add(self.organization)
+        self.assertIn(self.problem.id, get_visible_problem_ids(user))
+
+        self.organization.members.remove(user.profile)
+        self.assertNotIn(self.problem.id, get_visible_problem_ids(user))
+
+    def test_problem_changes(self):
+        user = self.users['normal']
+        self.assertNotIn(self.problem.id, get_visible_problem_ids(user))
+
+        self.problem.testers.add(user.profile)
+        self.assertIn(self.problem.id, get_visible_problem_ids(user))
+        self.problem.testers.clear()
+        self.assertNotIn(self.problem.id, get_visible_problem_ids(user))
+
+        Problem.objects.filter(id=self.problem.id).update(is_organization_private=False)
+        # Bulk updates bypass signals, but saving the problem invalidates the cache.
+        self.assertNotIn(self.problem.id, get_visible_problem_ids(user))
+        Problem.objects.get(id=self.problem.id).save()
+        self.assertIn(self.problem.id, get_visible_problem_ids(user))
+
+    @mock.patch('django.contrib.admin.ModelAdmin.message_user')
+    def test_admin_actions(self, message_user):
+        user = self.users['normal']
+        request = RequestFactory().post('/')
+        request.user = self.users['superuser']
+
+        problem = create_problem(code='visibility_action', is_public=True)
+        self.assertIn(problem.id, get_visible_problem_ids(user))
+        problem_admin = ProblemAdmin(Problem, AdminSite())
+        problem_admin.make_private(request, Problem.objects.filter(id=problem.id))
+        self.assertNotIn(problem.id, get_visible_problem_ids(user))
+        problem_admin.make_public(request, Problem.objects.filter(id=problem.id))
+        self.assertIn(problem.id, get_visible_problem_ids(user))
+
+        contest = create_contest(key='visibility_action', is_visible=True, start_time=timezone.now(),
+                                 end_time=timezone.now() + timezone.timedelta(days=1))
+        self.assertIn(contest.id, get_visible_contest_ids(user))
+        contest_admin = ContestAdmin(Contest, AdminSite())
+        contest_admin.make_hidden(request, Contest.objects.filter(id=contest.id))
+        self.assertNotIn(contest.id, get_visible_contest_ids(user))
+        contest_admin.make_visible(request, Contest.objects.filter(id=contest.id))
+        self.assertIn(contest.id, get_visible_contest_ids(user))
@@ -0,0 +1,170 @@
+import zlib
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+GLOBAL_VERSION_KEY = 'visibility_version'
+USER_VERSION_KEY = 'visibility_version:%d'
+
+
+class VisibleIds:
+    """A set of visible object IDs, or, if most objects are visible, the set of hidden ones.
+
+    The queryset of the visible IDs, if given, is used as a subquery to filter by sets too large to list in a query.
+    """
+
+    __slots__ = ('ids', 'inverted', 'queryset')
+
+    def __init__(self, ids, inverted, queryset=None):
+        self.ids = ids
+        self.inverted = inverted
+        self.queryset = queryset
+
+    @classmethod
+    def from_ids(cls, visible, all_ids):
+        visible = set(visible)
+        if len(visible) * 2 > len(all_ids):
+            return cls(frozenset(all_ids) - visible, True)
+        return cls(frozenset(visible), False)
+
+    @property
+    def is_everything(self):
+        return self.inverted and not self.ids
+
+    def __contains__(self, id):
+        return (id in self.ids) != self.inverted
+
+    def q(self, field):
+        if self.queryset is not None and len(self.ids) > settings.DMOJ_VISIBILITY_MAX_INLINE_IDS:
+            return Q(**{field + '__in': self.queryset})
+        if self.inverted:
+            return ~Q(**{field + '__in': sorted(self.ids)})
+        return Q(**{field + '__in': sorted(self.ids)})
+
+    def restrict(self, queryset, field='id'):
+        return queryset if self.is_everything else queryset.filter(self.q(field))
+
+    # Stored as a compressed array of IDs, since there are tens of thousands of these for problems.
+    def pack(self):
+        return self.inverted, zlib.compress(array('I', sorted(self.ids)).tobytes())
+
+    @classmethod
+    def unpack(cls, data):
+        inverted, ids = data
+        return cls(frozenset(array('I', zlib.decompress(ids))), inverted)
+
+
+def _get_cached_ids(kind, user, get_queryset, compute):
+    user_id = user.id if user.is_authenticated else 0
+    versions = cache.get_many([GLOBAL_VERSION_KEY, USER_VERSION_KEY % user_id])
+    key = 'visible_%s:%d:%d:%d' % (kind, user_id, versions.get(GLOBAL_VERSION_KEY, 0),
+                                   versions.get(USER_VERSION_KEY % user_id, 0))
+    queryset = get_queryset(user)
+    data = cache.get(key)
+    if data is not None:
+        result = VisibleIds.unpack(data)
+    else:
+        result, timeout = compute(queryset)
+        cache.set(key, result.pack(), timeout)
+    result.queryset = queryset
+    return result
+
+
+def _problem_queryset(user):
+    from judge.models import Problem
+    return Problem.get_visible_problems(user).order_by().values_list('id', flat=True).distinct()
+
+
+def _compute_problem_ids(queryset):
+    from judge.models import Problem
+    return VisibleIds.from_ids(queryset, Problem.objects.values_list('id', flat=True)), \
+        settings.DMOJ_VISIBILITY_CACHE_TIMEOUT
+
+
+def _contest_queryset(user):
+    from judge.models import Contest
+    return Contest.get_visible_contests(user).order_by().values_list('id', flat=True)
+
+
+def _compute_contest_ids(queryset):
+    from judge.models import Contest
+    return VisibleIds.from_ids(queryset, Contest.objects.values_list('id', flat=True)), \
+        settings.DMOJ_VISIBILITY_CACHE_TIMEOUT
+
+
+def _submission_contest_queryset(user):
+    from judge.models import Contest
+
+    if user.has_perm('judge.see_private_contest'):
+        return None
+
+    after_end = (Contest.SCOREBOARD_AFTER_PARTICIPATION, Contest.SCOREBOARD_AFTER_CONTEST)
+    q = Q(scoreboard_visibility=Contest.SCOREBOARD_VISIBLE) | \
+        Q(end_time__lt=timezone.now(), scoreboard_visibility__in=after_end)
+    if user.is_authenticated:
+        profile = user.profile
+        q |= Q(authors=profile) | Q(curators=profile) | Q(tester_see_submissions=True, testers=profile) | \
+            Q(view_contest_submissions=profile)
+    return Contest.objects.filter(q).order_by().values_list('id', flat=True).distinct()
+
+
+def _compute_submission_contest_ids(queryset):
+    from judge.models import Contest
+
+    timeout = settings.DMOJ_VISIBILITY_CACHE_TIMEOUT
+    if queryset is None:
+        return VisibleIds(frozenset(), True), timeout
+
+    # More submissions become visible when a contest ends, so the result is only valid until the next one does.
+    now = timezone.now()
+    after_end = (Contest.SCOREBOARD_AFTER_PARTICIPATION, Contest.SCOREBOARD_AFTER_CONTEST)
+    next_end = Contest.objects.filter(end_time__gte=now, scoreboard_visibility__in=after_end) \
+                              .order_by('end_time').values_list('end_time', flat=True).first()
+    if next_end is not None:
+        timeout = max(1, min(timeout, int((next_end - now).total_seconds()) + 1))
+
+    return VisibleIds.from_ids(queryset, Contest.objects.values_list('id', flat=True)), timeout
+
+
+def get_visible_problem_ids(user):
+    """Returns the IDs of the problems that the user can see, as in Problem.get_visible_problems."""
+    return _get_cached_ids('problems', user, _problem_queryset, _compute_problem_ids)
+
+
+def get_visible_contest_ids(user):
+    """Returns the IDs of the contests that the user can see, as in Contest.get_visible_contests."""
+    return _get_cached_ids('contests', user, _contest_queryset, _compute_contest_ids)
+
+
+def get_visible_submission_contest_ids(user):
+    """Returns the IDs of the contests whose submissions the user can see in submission lists."""
+    return _get_cached_ids('submission_contests', user, _submission_contest_queryset,
+                           _compute_submission_contest_ids)
+
+
+def get_visibility_version(user_id):
+    """Returns a value that changes whenever the objects visible to the user might, e.g. to tell if a cached access
+    check is still valid."""
+    versions = cache.get_many([GLOBAL_VERSION_KEY, USER_VERSION_KEY % user_id])
+    return versions.get(GLOBAL_VERSION_KEY, 0), versions.get(USER_VERSION_KEY % user_id, 0)
+
+
+def _bump(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted between add and incr.
+        cache.set(key, 1, None)
+
+
+def invalidate_visibility():
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def invalidate_user_visibility(user_ids):
+    for user_id in user_ids:
+        _bump(USER_VERSION_KEY % user_id)
@@ -1,11 +1,15 @@
+import re
 from operator import attrgetter
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, PermissionDenied, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery
-from django.http import Http404, JsonResponse
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.utils.functional import cached_property
+from django.utils.text import compress_sequence
 from django.views.generic.detail import BaseDetailView
 from django.views.generic.list import BaseListView
 
@@ -13,8 +17,10 @@ from judge.models import (
     Contest, ContestParticipation, ContestTag, Judge, Language, Organization, Problem, ProblemType, Profile, Rating,
     Submission,
 )
-from judge.utils.infinite_paginator import InfinitePaginationMixin
-from judge.utils.raw_sql import join_sql_subquery, use_straight_join
+from judge.utils import contest_artifacts, rank_index
+from judge.utils.cursor_paginator import CursorPaginationMixin
+from judge.utils.raw_sql import use_straight_join
+from judge.utils.visibility import get_visible_problem_ids
 from judge.views.submission import group_test_cases
 
 
@@ -127,7 +133,7 @@ class APIMixin:
             return self.get_error(e)
 
 
-class APIListView(APIMixin, InfinitePaginationMixin, BaseListView):
+class APIListView(APIMixin, CursorPaginationMixin, BaseListView):
     paginate_by = settings.DMOJ_API_PAGE_SIZE
     basic_filters = ()
     list_filters = ()
@@ -136,6 +142,11 @@ class APIListView(APIMixin, InfinitePaginationMixin, BaseListView):
     def use_infinite_pagination(self):
         return False
 
+    @property
+    def use_cursor_pagination(self):
+        # Clients opt into cursor pagination by passing an empty cursor for the first page.
+        return self.cursor_kwarg in self.request.GET
+
     def get_unfiltered_queryset(self):
         return super().get_queryset()
 
@@ -180,12 +191,53 @@ class APIListView(APIMixin, InfinitePaginationMixin, BaseListView):
             'has_more': page.has_next(),
             'objects': [self.get_object_data(obj) for obj in objects],
         }
-        if not page.paginator.is_infinite:
+        if getattr(page, 'is_cursor', False):
+            result['next_cursor'] = page.next_cursor
+            result['previous_cursor'] = page.get_cursor(page.number - 1) or '' if page.has_previous() else None
+        elif not page.paginator.is_infinite:
             result['total_objects'] = page.paginator.count
             result['total_pages'] = page.paginator.num_pages
         return result
 
 
+class APIExportMixin:
+    """Streams every object of a list view as newline-delimited JSON, in order of ID.
+
+    Objects are fetched in chunks by seeking past the last ID seen, so an interrupted export can be resumed by passing
+    the ID of the last object received as since_id.
+    """
+    export_chunk_size = settings.DMOJ_API_EXPORT_CHUNK_SIZE
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    def get_export_data(self, obj):
+        data = self.get_object_data(obj)
+        data.setdefault('id', obj.id)
+        return data
+
+    def iter_export(self, queryset, since_id):
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        while True:
+            chunk = list(queryset.filter(id__gt=since_id)[:self.export_chunk_size])
+            if not chunk:
+                break
+            yield ''.join(encoder.encode(self.get_export_data(obj)) + '\n' for obj in chunk).encode('utf-8')
+            since_id = chunk[-1].id
+
+    def get(self, request, *args, **kwargs):
+        # May raise ValueError, but is caught in APIMixin
+        since_id = int(request.GET.get('since_id', 0))
+        queryset = self.get_queryset().order_by('id')
+
+        stream = self.iter_export(queryset, since_id)
+        compress = self.accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = StreamingHttpResponse(compress_sequence(stream) if compress else stream,
+                                         content_type='application/x-ndjson')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
 class APIDetailView(APIMixin, BaseDetailView):
     def get_api_data(self, context):
         return {
@@ -240,6 +292,18 @@ class APIContestDetail(APIDetailView):
             raise Http404()
         return contest
 
+    def get_rankings(self, contest):
+        if 'rankings_offset' not in self.request.GET and 'rankings_limit' not in self.request.GET:
+            return contest_artifacts.get_api_rankings(contest)
+
+        # May raise ValueError, but is caught in APIMixin
+        offset = int(self.request.GET.get('rankings_offset', 0))
+        limit = min(int(self.request.GET.get('rankings_limit', settings.DMOJ_API_PAGE_SIZE)),
+                    settings.DMOJ_API_PAGE_SIZE)
+        if offset < 0 or limit < 1:
+            raise ValueError()
+        return contest_artifacts.build_api_rankings(contest, rank_index.get_range(contest.id, offset, offset + limit))
+
     def get_object_data(self, contest):
         in_contest = contest.is_in_contest(self.request.user)
         can_see_rankings = contest.can_see_full_scoreboard(self.request.user)
@@ -252,27 +316,6 @@ class APIContestDetail(APIDetailView):
             .order_by('order'),
         )
 
-        new_ratings_subquery = Rating.objects.filter(participation=OuterRef('pk'))
-        old_ratings_subquery = (
-            Rating.objects
-            .filter(user=OuterRef('user__pk'), contest__end_time__lt=OuterRef('contest__end_time'))
-            .order_by('-contest__end_time')
-        )
-        participations = (
-            contest.users
-            .filter(virtual=ContestParticipation.LIVE)
-            .annotate(
-                username=F('user__user__username'),
-                old_rating=Subquery(old_ratings_subquery.values('rating')[:1]),
-                new_rating=Subquery(new_ratings_subquery.values('rating')[:1]),
-            )
-            .order_by('-score', 'cumtime', 'tiebreaker')
-        )
-
-        # Setting contest attribute to reduce db queries in .start and .end_time
-        for participation in participations:
-            participation.contest = contest
-
         return {
             'key': contest.key,
             'name': contest.name,
@@ -304,25 +347,12 @@ class APIContestDetail(APIDetailView):
                     'partial': problem.partial,
                     'is_pretested': problem.is_pretested and contest.run_pretests_only,
                     'max_submissions': problem.max_submissions or None,
-                    'label': contest.get_label_for_problem(index),
+                    'label': label,
                     'name': problem.problem.name,
                     'code': problem.problem.code,
-                } for index, problem in enumerate(problems)
+                } for problem, label in zip(problems, contest.get_problem_labels(len(problems)))
             ] if can_see_problems else [],
-            'rankings': [
-                {
-                    'user': participation.username,
-                    'start_time': participation.start.isoformat(),
-                    'end_time': participation.end_time.isoformat(),
-                    'score': participation.score,
-                    'cumulative_time': participation.cumtime,
-                    'tiebreaker': participation.tiebreaker,
-                    'old_rating': participation.old_rating,
-                    'new_rating': participation.new_rating,
-                    'is_disqualified': participation.is_disqualified,
-                    'solutions': contest.format.get_problem_breakdown(participation, problems),
-                } for participation in participations
-            ] if can_see_rankings else [],
+            'rankings': self.get_rankings(contest) if can_see_rankings else [],
         }
 
 
@@ -387,6 +417,10 @@ class APIContestParticipationList(APIListView):
         }
 
 
+class APIContestParticipationExport(APIExportMixin, APIContestParticipationList):
+    pass
+
+
 class APIProblemList(APIListView):
     model = Problem
     basic_filters = (
@@ -506,6 +540,10 @@ class APIUserList(APIListView):
         }
 
 
+class APIUserExport(APIExportMixin, APIUserList):
+    pass
+
+
 class APIUserDetail(APIDetailView):
     model = Profile
     slug_field = 'user__username'
@@ -581,16 +619,8 @@ class APISubmissionList(APIListView):
     def get_unfiltered_queryset(self):
         queryset = Submission.objects.all()
         use_straight_join(queryset)
-        join_sql_subquery(
-            queryset,
-            subquery=Problem.get_visible_problems(self.request.user).distinct().only('id').query,
-            params=[],
-            related_model=Problem,
-            join_fields=[('problem_id', 'id')],
-            alias='visible_problems',
-        )
         return (
-            queryset
+            get_visible_problem_ids(self.request.user).restrict(queryset, 'problem_id')
             .select_related('problem', 'user__user', 'language')
             .order_by('id')
             .only(
@@ -620,6 +650,10 @@ class APISubmissionList(APIListView):
         }
 
 
+class APISubmissionExport(APIExportMixin, APISubmissionList):
+    pass
+
+
 class APISubmissionDetail(APILoginRequiredMixin, APIDetailView):
     model = Submission
     slug_field = 'id'
@@ -672,6 +706,7 @@ class APISubmissionDetail(APILoginRequiredMixin, APIDetailView):
             'result': submission.result,
             'case_points': submission.case_points,
             'case_total': submission.case_total,
+            'source_hash': submission.source_hash,
             'cases': cases,
         }
 
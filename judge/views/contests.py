@@ -1,3 +1,4 @@
+import hashlib
 import json
 from calendar import Calendar, SUNDAY
 from collections import defaultdict, namedtuple
@@ -9,15 +10,16 @@ from operator import attrgetter, itemgetter
 from django import forms
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.db import IntegrityError
-from django.db.models import BooleanField, Case, Count, F, FloatField, IntegerField, Max, Min, Q, Sum, Value, When
-from django.db.models.expressions import CombinedExpression, Exists, OuterRef
-from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
+from django.db.models import BooleanField, Case, Count, F, Max, Min, Q, Sum, When
+from django.db.models.expressions import Exists, OuterRef
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, render
 from django.template.defaultfilters import date as date_filter
 from django.urls import reverse
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.utils.functional import cached_property
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
@@ -30,23 +32,23 @@ from icalendar import Calendar as ICalendar, Event
 from reversion import revisions
 
 from judge import event_poster as event
+from judge.caching import contest_ranking_index_key
 from judge.comments import CommentedDetailView
 from judge.forms import ContestCloneForm
 from judge.models import Contest, ContestMoss, ContestParticipation, ContestProblem, ContestTag, \
-    Problem, Profile, Submission
-from judge.tasks import run_moss
+    Problem, Profile
+from judge.tasks import disqualify_participation, run_moss
+from judge.utils import contest_artifacts, rank_index, scoreboard
 from judge.utils.celery import redirect_to_task_status
 from judge.utils.opengraph import generate_opengraph
-from judge.utils.problems import _get_result_data
 from judge.utils.ranker import ranker
-from judge.utils.stats import get_bar_chart, get_pie_chart
 from judge.utils.views import DiggPaginatorMixin, QueryStringSortMixin, SingleObjectFormView, TitleMixin, \
     generic_message
 
 __all__ = ['ContestList', 'ContestDetail', 'ContestRanking', 'ContestJoin', 'ContestLeave', 'ContestCalendar',
            'ContestClone', 'ContestStats', 'ContestMossView', 'ContestMossDelete', 'contest_ranking_ajax',
-           'ContestParticipationList', 'ContestParticipationDisqualify', 'get_contest_ranking_list',
-           'base_contest_ranking_list']
+           'contest_ranking_snapshot', 'ContestParticipationList', 'ContestParticipationDisqualify',
+           'get_contest_ranking_list', 'base_contest_ranking_list']
 
 
 def _find_contest(request, key, private_check=True):
@@ -578,56 +580,7 @@ class ContestStats(TitleMixin, ContestMixin, DetailView):
         if not (self.object.ended or self.can_edit):
             raise Http404()
 
-        queryset = Submission.objects.filter(contest_object=self.object)
-
-        ac_count = Count(Case(When(result='AC', then=Value(1)), output_field=IntegerField()))
-        ac_rate = CombinedExpression(ac_count / Count('problem'), '*', Value(100.0), output_field=FloatField())
-
-        status_count_queryset = list(
-            queryset.values('problem__code', 'result').annotate(count=Count('result'))
-            .values_list('problem__code', 'result', 'count'),
-        )
-        labels, codes = [], []
-        contest_problems = self.object.contest_problems.order_by('order').values_list('problem__name', 'problem__code')
-        if contest_problems:
-            labels, codes = zip(*contest_problems)
-        num_problems = len(labels)
-        status_counts = [[] for i in range(num_problems)]
-        for problem_code, result, count in status_count_queryset:
-            if problem_code in codes:
-                status_counts[codes.index(problem_code)].append((result, count))
-
-        result_data = defaultdict(partial(list, [0] * num_problems))
-        for i in range(num_problems):
-            for category in _get_result_data(defaultdict(int, status_counts[i]))['categories']:
-                result_data[category['code']][i] = category['count']
-
-        stats = {
-            'problem_status_count': {
-                'labels': labels,
-                'datasets': [
-                    {
-                        'label': name,
-                        'backgroundColor': settings.DMOJ_STATS_SUBMISSION_RESULT_COLORS[name],
-                        'data': data,
-                    }
-                    for name, data in result_data.items()
-                ],
-            },
-            'problem_ac_rate': get_bar_chart(
-                queryset.values('contest__problem__order', 'problem__name').annotate(ac_rate=ac_rate)
-                .order_by('contest__problem__order').values_list('problem__name', 'ac_rate'),
-            ),
-            'language_count': get_pie_chart(
-                queryset.values('language__name').annotate(count=Count('language__name'))
-                .filter(count__gt=0).order_by('-count').values_list('language__name', 'count'),
-            ),
-            'language_ac_rate': get_bar_chart(
-                queryset.values('language__name').annotate(ac_rate=ac_rate)
-                .filter(ac_rate__gt=0).values_list('language__name', 'ac_rate'),
-            ),
-        }
-
+        stats = contest_artifacts.get_stats(self.object)
         context['stats'] = mark_safe(json.dumps(stats))
 
         return context
@@ -669,22 +622,163 @@ def make_contest_ranking_profile(contest, participation, contest_problems):
     )
 
 
+class CachedRankingUser(namedtuple('CachedRankingUser', 'username')):
+    __slots__ = ()
+
+
+class CachedRankingOrganization(namedtuple('CachedRankingOrganization', 'short_name url')):
+    __slots__ = ()
+
+    def get_absolute_url(self):
+        return self.url
+
+
+class CachedRankingParticipation(namedtuple('CachedRankingParticipation',
+                                            'id start end_time is_disqualified virtual')):
+    __slots__ = ()
+
+    @property
+    def ended(self):
+        return self.end_time is not None and self.end_time < timezone.now()
+
+
+def get_ranking_stamp(contest, problems):
+    # Everything other than the participation itself that the rendered rows depend on.
+    data = [
+        contest.key, contest.format_name, contest.format_config, contest.run_pretests_only, contest.points_precision,
+        contest.start_time, contest.end_time, contest.time_limit, translation.get_language(),
+        [(problem.id, problem.problem.code, problem.points, problem.partial, problem.is_pretested)
+         for problem in problems],
+    ]
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def contest_ranking_row_key(participation_id, version, stamp):
+    return 'contest_ranking_row:%d:%d:%s' % (participation_id, version, stamp)
+
+
+def make_cached_ranking_row(contest, participation, problems):
+    profile = make_contest_ranking_profile(contest, participation, problems)
+    organization = profile.organization
+    return (
+        profile.id, profile.user.username, profile.css_class, profile.points, profile.cumtime, profile.tiebreaker,
+        organization and (organization.short_name, organization.get_absolute_url()),
+        (participation.id, participation.start, participation.end_time, participation.is_disqualified,
+         participation.virtual),
+        profile.participation_rating, [str(cell) for cell in profile.problem_cells], str(profile.result_cell),
+        profile.display_name,
+    )
+
+
+def load_cached_ranking_row(row):
+    (id, username, css_class, points, cumtime, tiebreaker, organization, participation, rating, problem_cells,
+     result_cell, display_name) = row
+    return ContestRankingProfile(
+        id=id,
+        user=CachedRankingUser(username),
+        css_class=css_class,
+        username=username,
+        points=points,
+        cumtime=cumtime,
+        tiebreaker=tiebreaker,
+        organization=organization and CachedRankingOrganization(*organization),
+        participation=CachedRankingParticipation(*participation),
+        participation_rating=rating,
+        problem_cells=[mark_safe(cell) for cell in problem_cells],
+        result_cell=mark_safe(result_cell),
+        display_name=display_name,
+    )
+
+
+def cached_contest_ranking_profiles(contest, problems, versions):
+    """Returns the ranking rows of the participations, given as (id, version) pairs.
+
+    Rows are cached by participation version, which is incremented whenever the results change, so only the rows of
+    participations that changed since they were last displayed are rendered."""
+    stamp = get_ranking_stamp(contest, problems)
+    keys = [contest_ranking_row_key(id, version, stamp) for id, version in versions]
+    rows = cache.get_many(keys)
+
+    missing = [id for (id, version), key in zip(versions, keys) if key not in rows]
+    rendered = {}
+    if missing:
+        for participation in contest.users.filter(id__in=missing).select_related('user__user', 'rating') \
+                                    .prefetch_related('user__organizations') \
+                                    .defer('user__about', 'user__organizations__about'):
+            rendered[participation.id] = (participation.version,
+                                          make_cached_ranking_row(contest, participation, problems))
+        cache.set_many({contest_ranking_row_key(id, version, stamp): row for id, (version, row) in rendered.items()},
+                       settings.DMOJ_CONTEST_RANKING_CACHE_TIMEOUT)
+
+    profiles = []
+    for (id, version), key in zip(versions, keys):
+        # A participation may have changed since its version was read, in which case the newer row is used.
+        if key in rows:
+            profiles.append(load_cached_ranking_row(rows[key]))
+        elif id in rendered:
+            profiles.append(load_cached_ranking_row(rendered[id][1]))
+    return profiles
+
+
 def base_contest_ranking_list(contest, problems, queryset):
-    return [make_contest_ranking_profile(contest, participation, problems) for participation in
-            queryset.select_related('user__user', 'rating').defer('user__about', 'user__organizations__about')]
+    return cached_contest_ranking_profiles(contest, problems, list(queryset.values_list('id', 'version')))
 
 
 def contest_ranking_list(contest, problems):
-    return base_contest_ranking_list(contest, problems, contest.users.filter(virtual=0)
-                                     .prefetch_related('user__organizations')
-                                     .order_by('is_disqualified', '-score', 'cumtime', 'tiebreaker'))
+    key = contest_ranking_index_key(contest.id)
+    versions = cache.get(key)
+    if versions is None:
+        versions = contest_artifacts.get_ranking(contest)
+        cache.set(key, versions, settings.DMOJ_CONTEST_RANKING_INDEX_TIMEOUT)
+    return cached_contest_ranking_profiles(contest, problems, versions)
+
+
+def get_ranking_page(request):
+    """Returns the page of the scoreboard asked for by the page parameter, or None if the whole scoreboard or the
+    part around a participation is."""
+    if 'around' in request.GET or 'page' not in request.GET:
+        return None
+    try:
+        page = int(request.GET['page'])
+    except ValueError:
+        raise Http404()
+    if page < 1:
+        raise Http404()
+    return page
+
+
+def get_ranking_window(request, contest):
+    """Returns (rank, participation id) for the part of the scoreboard asked for by the page or around parameters, as
+    found by the rank index without ranking every participation, or None for the whole scoreboard."""
+    size = settings.DMOJ_CONTEST_RANKING_PAGE_SIZE
+    if 'around' in request.GET:
+        participation_id = contest.users.filter(user__user__username=request.GET['around'],
+                                                virtual=ContestParticipation.LIVE).values_list('id', flat=True).first()
+        if participation_id is None:
+            raise Http404()
+        return rank_index.get_window(contest.id, participation_id, size // 2, size - size // 2 - 1)
+    page = get_ranking_page(request)
+    if page is not None:
+        return rank_index.get_range(contest.id, (page - 1) * size, page * size)
+    return None
+
+
+def ranking_window_profiles(contest, problems, window):
+    ranks = dict((id, rank) for rank, id in window)
+    versions = dict(contest.users.filter(id__in=ranks).values_list('id', 'version'))
+    profiles = cached_contest_ranking_profiles(contest, problems,
+                                               [(id, versions[id]) for _, id in window if id in versions])
+    return [(ranks[profile.participation.id], profile) for profile in profiles]
 
 
 def get_contest_ranking_list(request, contest, participation=None, ranking_list=contest_ranking_list,
-                             show_current_virtual=True, ranker=ranker):
+                             show_current_virtual=True, ranker=ranker, window=None):
     problems = list(contest.contest_problems.select_related('problem').defer('problem__description').order_by('order'))
 
-    users = ranker(ranking_list(contest, problems), key=attrgetter('points', 'cumtime', 'tiebreaker'))
+    if window is None:
+        users = ranker(ranking_list(contest, problems), key=attrgetter('points', 'cumtime', 'tiebreaker'))
+    else:
+        users = ranking_window_profiles(contest, problems, window)
 
     if show_current_virtual:
         if participation is None and request.user.is_authenticated:
@@ -692,7 +786,9 @@ def get_contest_ranking_list(request, contest, participation=None, ranking_list=
             if participation is None or participation.contest_id != contest.id:
                 participation = None
         if participation is not None and participation.virtual:
-            users = chain([('-', make_contest_ranking_profile(contest, participation, problems))], users)
+            users = chain([('-', profile) for profile in cached_contest_ranking_profiles(
+                contest, problems, [(participation.id, participation.version)],
+            )], users)
     return users, problems
 
 
@@ -704,7 +800,8 @@ def contest_ranking_ajax(request, contest, participation=None):
     if not contest.can_see_full_scoreboard(request.user):
         raise Http404()
 
-    users, problems = get_contest_ranking_list(request, contest, participation)
+    users, problems = get_contest_ranking_list(request, contest, participation,
+                                               window=get_ranking_window(request, contest))
     return render(request, 'contest/ranking-table.html', {
         'users': users,
         'problems': problems,
@@ -713,6 +810,31 @@ def contest_ranking_ajax(request, contest, participation=None):
     })
 
 
+def contest_ranking_snapshot(request, contest):
+    """Returns the results of the live scoreboard, for scoreboards to resync after missing updates."""
+    contest, exists = _find_contest(request, contest)
+    if not exists:
+        return HttpResponseBadRequest('Invalid contest', content_type='text/plain')
+
+    if not contest.can_see_full_scoreboard(request.user):
+        raise Http404()
+
+    # Read first, so that updates made while the snapshot is built are applied again, rather than missed.
+    version = scoreboard.get_scoreboard_version(contest.id)
+    problems = list(contest.contest_problems.select_related('problem').defer('problem__description').order_by('order'))
+    users = ranker(contest_ranking_list(contest, problems), key=attrgetter('points', 'cumtime', 'tiebreaker'))
+    return JsonResponse({
+        'version': version,
+        'recalculating': scoreboard.is_recalculating(contest.id),
+        'problems': [problem.id for problem in problems],
+        'rows': [
+            [user.participation.id, user.username, rank, user.points, user.cumtime, user.tiebreaker,
+             user.participation.is_disqualified, user.problem_cells, user.result_cell]
+            for rank, user in users
+        ],
+    })
+
+
 class ContestRankingBase(ContestMixin, TitleMixin, DetailView):
     template_name = 'contest/ranking.html'
     tab = None
@@ -755,11 +877,23 @@ class ContestRanking(ContestRankingBase):
                 ranker=lambda users, key: ((_('???'), user) for user in users),
             )
 
-        return get_contest_ranking_list(self.request, self.object)
+        self.window = get_ranking_window(self.request, self.object)
+        return get_contest_ranking_list(self.request, self.object, window=self.window)
 
     def get_context_data(self, **kwargs):
+        # Read before the ranking is built, so that updates made meanwhile are applied again, rather than missed.
+        version = scoreboard.get_scoreboard_version(self.object.id)
+        self.window = None
         context = super().get_context_data(**kwargs)
         context['has_rating'] = self.object.ratings.exists()
+        context['recalculating'] = scoreboard.is_recalculating(self.object.id)
+        if self.object.can_see_full_scoreboard(self.request.user):
+            context['scoreboard_version'] = version
+            context['windowed'] = self.window is not None
+            context['page_count'] = -(-rank_index.get_count(self.object.id) // settings.DMOJ_CONTEST_RANKING_PAGE_SIZE)
+            context['page'] = get_ranking_page(self.request)
+            context['has_live_participation'] = self.request.user.is_authenticated and \
+                self.object.users.filter(user=self.request.profile, virtual=ContestParticipation.LIVE).exists()
         return context
 
 
@@ -778,7 +912,7 @@ class ContestParticipationList(LoginRequiredMixin, ContestRankingBase):
             raise Http404()
 
         queryset = self.object.users.filter(user=self.profile, virtual__gte=0).order_by('-virtual')
-        live_link = format_html('<a href="{2}#!{1}">{0}</a>', _('Live'), self.profile.username,
+        live_link = format_html('<a href="{2}?around={1}#!{1}">{0}</a>', _('Live'), self.profile.username,
                                 reverse('contest_ranking', args=[self.object.key]))
 
         return get_contest_ranking_list(
@@ -814,10 +948,14 @@ class ContestParticipationDisqualify(ContestMixin, SingleObjectMixin, View):
         try:
             participation = self.object.users.get(pk=request.POST.get('participation'))
         except ObjectDoesNotExist:
-            pass
-        else:
-            participation.set_disqualified(not participation.is_disqualified)
-        return HttpResponseRedirect(reverse('contest_ranking', args=(self.object.key,)))
+            return HttpResponseRedirect(reverse('contest_ranking', args=(self.object.key,)))
+
+        scoreboard.mark_recalculating(self.object.id)
+        status = disqualify_participation.delay(participation.id, not participation.is_disqualified)
+        return redirect_to_task_status(
+            status, message=_('Recalculating results of %s...') % (participation.user.username,),
+            redirect=reverse('contest_ranking', args=(self.object.key,)),
+        )
 
 
 class ContestMossMixin(ContestMixin, PermissionRequiredMixin):
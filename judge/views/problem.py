@@ -28,8 +28,10 @@ from reversion import revisions
 
 from judge.comments import CommentedDetailView
 from judge.forms import ProblemCloneForm, ProblemPointsVoteForm, ProblemSubmitForm
+from judge.judgeapi import queue_submission
 from judge.models import ContestSubmission, Judge, Language, Problem, ProblemGroup, ProblemPointsVote, \
     ProblemTranslation, ProblemType, RuntimeVersion, Solution, Submission, SubmissionSource
+from judge.utils import submission_limits
 from judge.utils.diggpaginator import DiggPaginator
 from judge.utils.opengraph import generate_opengraph
 from judge.utils.pdfoid import PDF_RENDERING_ENABLED, render_pdf
@@ -51,8 +53,7 @@ def get_contest_problem(problem, profile):
 
 
 def get_contest_submission_count(problem, profile, virtual):
-    return profile.current_contest.submissions.exclude(submission__status__in=['IE']) \
-                  .filter(problem__problem=problem, participation__virtual=virtual).count()
+    return submission_limits.get_contest_submission_count(profile.current_contest.id, problem.id)
 
 
 class ProblemMixin(object):
@@ -692,12 +693,6 @@ class ProblemSubmit(LoginRequiredMixin, ProblemMixin, TitleMixin, SingleObjectFo
         return reverse('submission_status', args=(self.new_submission.id,))
 
     def form_valid(self, form):
-        if (
-            not self.request.user.has_perm('judge.spam_submission') and
-            Submission.objects.filter(user=self.request.profile, rejudged_date__isnull=True)
-                              .exclude(status__in=['D', 'IE', 'CE', 'AB']).count() >= settings.DMOJ_SUBMISSION_LIMIT
-        ):
-            return HttpResponse(format_html('<h1>{0}</h1>', _('You submitted too many submissions.')), status=429)
         if not self.object.allowed_languages.filter(id=form.cleaned_data['language'].id).exists():
             raise PermissionDenied()
         if not self.request.user.is_superuser and self.object.banned_users.filter(id=self.request.profile.id).exists():
@@ -709,6 +704,30 @@ class ProblemSubmit(LoginRequiredMixin, ProblemMixin, TitleMixin, SingleObjectFo
             return generic_message(self.request, _('Too many submissions'),
                                    _('You have exceeded the submission limit for this problem.'))
 
+        reserved = not self.request.user.has_perm('judge.spam_submission')
+        if reserved and not submission_limits.reserve_inflight_submission(self.request.profile.id,
+                                                                          settings.DMOJ_SUBMISSION_LIMIT):
+            return HttpResponse(format_html('<h1>{0}</h1>', _('You submitted too many submissions.')), status=429)
+
+        try:
+            self.create_submission(form)
+        except BaseException:
+            if reserved:
+                submission_limits.release_inflight_submission(self.request.profile.id)
+            raise
+
+        submission_limits.submission_created(self.request.profile.id, self.object.id,
+                                             self.contest_problem and self.request.profile.current_contest.id,
+                                             reserved=reserved)
+
+        if not settings.DMOJ_SUBMISSION_OUTBOX:
+            # Save a query.
+            self.new_submission.source = self.new_source
+            self.new_submission.judge(force_judge=True, judge_id=form.cleaned_data['judge'])
+
+        return super().form_valid(form)
+
+    def create_submission(self, form):
         with transaction.atomic():
             self.new_submission = form.save(commit=False)
 
@@ -728,14 +747,12 @@ class ProblemSubmit(LoginRequiredMixin, ProblemMixin, TitleMixin, SingleObjectFo
             else:
                 self.new_submission.save()
 
-            source = SubmissionSource(submission=self.new_submission, source=form.cleaned_data['source'])
-            source.save()
+            self.new_source = SubmissionSource(submission=self.new_submission, source=form.cleaned_data['source'])
+            self.new_source.save()
 
-        # Save a query.
-        self.new_submission.source = source
-        self.new_submission.judge(force_judge=True, judge_id=form.cleaned_data['judge'])
-
-        return super().form_valid(form)
+            if settings.DMOJ_SUBMISSION_OUTBOX:
+                # The submission is sent to the judge by the dispatch_submissions command once this commits.
+                queue_submission(self.new_submission, judge_id=form.cleaned_data['judge'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -763,7 +780,7 @@ class ProblemSubmit(LoginRequiredMixin, ProblemMixin, TitleMixin, SingleObjectFo
         submission_id = kwargs.get('submission')
         if submission_id is not None:
             self.old_submission = get_object_or_404(
-                Submission.objects.select_related('source', 'language'),
+                Submission.objects.select_related('source__blob', 'language'),
                 id=submission_id,
             )
             if not request.user.has_perm('judge.resubmit_other') and self.old_submission.user != request.profile:
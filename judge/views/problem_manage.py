@@ -12,7 +12,8 @@ from django.views.generic import DetailView
 from django.views.generic.detail import BaseDetailView
 
 from judge.models import Language, Submission
-from judge.tasks import apply_submission_filter, rejudge_problem_filter, rescore_problem
+from judge.tasks import apply_submission_filter, exclude_unchanged_submissions, rejudge_problem_filter, \
+    rescore_problem
 from judge.utils.celery import redirect_to_task_status
 from judge.utils.views import TitleMixin
 from judge.views.problem import ProblemMixin
@@ -82,16 +83,17 @@ class BaseRejudgeSubmissionsView(PermissionRequiredMixin, ManageProblemSubmissio
         except ValueError:
             return HttpResponseBadRequest()
 
-        return self.generate_response(id_range, languages, self.request.POST.getlist('result'))
+        changed_only = self.request.POST.get('changed_only', 'off') == 'on'
+        return self.generate_response(id_range, languages, self.request.POST.getlist('result'), changed_only)
 
-    def generate_response(self, id_range, languages, results):
+    def generate_response(self, id_range, languages, results, changed_only):
         raise NotImplementedError()
 
 
 class RejudgeSubmissionsView(BaseRejudgeSubmissionsView):
-    def generate_response(self, id_range, languages, results):
+    def generate_response(self, id_range, languages, results, changed_only):
         status = rejudge_problem_filter.delay(self.object.id, id_range, languages, results,
-                                              user_id=self.request.user.id)
+                                              user_id=self.request.user.id, changed_only=changed_only)
         return redirect_to_task_status(
             status, message=_('Rejudging selected submissions for %s...') % (self.object.name,),
             redirect=reverse('problem_submissions_rejudge_success', args=[self.object.code, status.id]),
@@ -99,8 +101,10 @@ class RejudgeSubmissionsView(BaseRejudgeSubmissionsView):
 
 
 class PreviewRejudgeSubmissionsView(BaseRejudgeSubmissionsView):
-    def generate_response(self, id_range, languages, results):
+    def generate_response(self, id_range, languages, results, changed_only):
         queryset = apply_submission_filter(self.object.submission_set.all(), id_range, languages, results)
+        if changed_only:
+            queryset = exclude_unchanged_submissions(queryset, self.object)
         return HttpResponse(str(queryset.count()))
 
 
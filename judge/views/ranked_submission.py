@@ -4,6 +4,7 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
 
 from judge.models import Language, Submission
+from judge.utils import contest_artifacts
 from judge.utils.problems import get_result_data
 from judge.utils.raw_sql import join_sql_subquery
 from judge.views.submission import ForceContestMixin, ProblemSubmissions
@@ -16,6 +17,12 @@ class RankedSubmissions(ProblemSubmissions):
     dynamic_update = False
 
     def get_queryset(self):
+        if self.in_contest and self.contest.ended and not self.selected_languages:
+            # The best submissions of ended contests are stored, rather than found on every view.
+            ids = contest_artifacts.get_ranked_submissions(self.contest, self.problem.id)
+            return super(RankedSubmissions, self).get_queryset().filter(user__is_unlisted=False, id__in=ids) \
+                .order_by('-contest__points', 'time')
+
         params = [self.problem.id]
         if self.in_contest:
             contest_join = 'INNER JOIN judge_contestsubmission AS cs ON (sub.id = cs.submission_id)'
@@ -6,6 +6,7 @@ from django.views.generic.list import BaseListView
 
 from judge.jinja2.gravatar import gravatar
 from judge.models import Class, Comment, Contest, Organization, Problem, Profile, TheoryPost, Course, TestPost
+from judge.utils.visibility import get_visible_contest_ids, get_visible_problem_ids
 
 
 def _get_user_queryset(term):
@@ -59,8 +60,8 @@ class ClassSelect2View(Select2View):
 
 class ProblemSelect2View(Select2View):
     def get_queryset(self):
-        return Problem.get_visible_problems(self.request.user) \
-                      .filter(Q(code__icontains=self.term) | Q(name__icontains=self.term))
+        queryset = get_visible_problem_ids(self.request.user).restrict(Problem.objects.defer('description'))
+        return queryset.filter(Q(code__icontains=self.term) | Q(name__icontains=self.term))
 
 
 class TheorySelect2View(Select2View):
@@ -76,8 +77,8 @@ class TestSelect2View(Select2View):
 
 class ContestSelect2View(Select2View):
     def get_queryset(self):
-        return Contest.get_visible_contests(self.request.user) \
-                      .filter(Q(key__icontains=self.term) | Q(name__icontains=self.term))
+        queryset = get_visible_contest_ids(self.request.user).restrict(Contest.objects.defer('description'))
+        return queryset.filter(Q(key__icontains=self.term) | Q(name__icontains=self.term))
 
 
 class CourseSelect2View(Select2View):
@@ -20,14 +20,17 @@ from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, ListView
 
 from judge import event_poster as event
+from judge.caching import submission_status_key
 from judge.highlight_code import highlight_code
-from judge.models import Contest, Language, Problem, ProblemTranslation, Profile, Submission, Course
+from judge.models import Contest, Course, Language, Problem, ProblemTranslation, Profile, Submission, \
+    SubmissionTestCase
 from judge.models.problem import SubmissionSourceAccess
-from judge.utils.infinite_paginator import InfinitePaginationMixin
+from judge.utils.cursor_paginator import CursorPaginationMixin
 from judge.utils.lazy import memo_lazy
 from judge.utils.problems import get_result_data, user_completed_ids, user_editable_ids, user_tester_ids
-from judge.utils.raw_sql import join_sql_subquery, use_straight_join
+from judge.utils.raw_sql import use_straight_join
 from judge.utils.views import DiggPaginatorMixin, TitleMixin, generic_message
+from judge.utils.visibility import get_visible_problem_ids, get_visible_submission_contest_ids
 
 
 def submission_related(queryset):
@@ -100,7 +103,7 @@ class SubmissionSource(SubmissionDetailBase):
     template_name = 'submission/source.html'
 
     def get_queryset(self):
-        return super().get_queryset().select_related('source')
+        return super().get_queryset().select_related('source__blob')
 
     def get_context_data(self, **kwargs):
         context = super(SubmissionSource, self).get_context_data(**kwargs)
@@ -168,6 +171,75 @@ def group_test_cases(cases):
     return result, status, max_execution_time
 
 
+def get_status_stamp(submission):
+    # Anything that changes when a submission is rejudged, rescored or aborted.
+    return (submission.status, submission.result, submission.points, submission.case_points, submission.case_total,
+            submission.judged_date, submission.rejudged_date)
+
+
+class CachedTestCase:
+    """The fields of a test case shown on the status page, apart from its output and extended feedback, which can be
+    too large to cache. Those are loaded separately for the cases that show them."""
+
+    FIELDS = ('id', 'case', 'status', 'time', 'memory', 'points', 'total', 'batch', 'feedback')
+    __slots__ = FIELDS + ('has_output', 'output', 'extended_feedback')
+
+    long_status = SubmissionTestCase.long_status
+    result_class = SubmissionTestCase.result_class
+
+    def __init__(self, row):
+        for field, value in zip(self.FIELDS + ('has_output',), row):
+            setattr(self, field, value)
+        self.output = self.extended_feedback = ''
+
+    @classmethod
+    def make_row(cls, case):
+        # Outputs are only shown for cases that failed.
+        has_output = bool(case.status != 'AC' and case.output or case.extended_feedback)
+        return tuple(getattr(case, field) for field in cls.FIELDS) + (has_output,)
+
+
+def get_cached_test_cases(submission):
+    key = submission_status_key(submission.id)
+    stamp = get_status_stamp(submission)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        cases = [CachedTestCase(row) for row in cached[1]]
+        with_output = {case.id: case for case in cases if case.has_output}
+        if with_output:
+            # Model instances rather than values, since these fields may be read from cold storage.
+            for case in SubmissionTestCase.objects.filter(id__in=with_output) \
+                    .only('id', 'output', 'extended_feedback', 'archive_key'):
+                with_output[case.id].output = case.output
+                with_output[case.id].extended_feedback = case.extended_feedback
+        return cases
+
+    cases = list(SubmissionTestCase.objects.filter(submission_id=submission.id))
+    cache.set(key, (stamp, [CachedTestCase.make_row(case) for case in cases]), 86400)
+    return cases
+
+
+def get_submission_status(submission):
+    """Returns the batches, combined statuses, maximum execution time and time limit shown on the status page.
+
+    The test cases are cached once the submission is graded, since they only change when it is judged again."""
+    if submission.is_graded:
+        cases = get_cached_test_cases(submission)
+    else:
+        cases = SubmissionTestCase.objects.filter(submission_id=submission.id)
+    batches, statuses, max_execution_time = group_test_cases(cases)
+    statuses = combine_statuses(statuses, submission)
+
+    time_limit = submission.problem.time_limit
+    try:
+        lang_limit = submission.problem.language_limits.get(language=submission.language)
+    except ObjectDoesNotExist:
+        pass
+    else:
+        time_limit = lang_limit.time_limit
+    return batches, statuses, max_execution_time, time_limit
+
+
 class SubmissionStatus(SubmissionDetailBase):
     template_name = 'submission/status.html'
 
@@ -175,17 +247,8 @@ class SubmissionStatus(SubmissionDetailBase):
         context = super(SubmissionStatus, self).get_context_data(**kwargs)
         submission = self.object
         context['last_msg'] = event.last()
-
-        context['batches'], statuses, context['max_execution_time'] = group_test_cases(submission.test_cases.all())
-        context['statuses'] = combine_statuses(statuses, submission)
-
-        context['time_limit'] = submission.problem.time_limit
-        try:
-            lang_limit = submission.problem.language_limits.get(language=submission.language)
-        except ObjectDoesNotExist:
-            pass
-        else:
-            context['time_limit'] = lang_limit.time_limit
+        context['batches'], context['statuses'], context['max_execution_time'], context['time_limit'] = \
+            get_submission_status(submission)
         return context
 
 
@@ -216,17 +279,10 @@ def abort_submission(request, submission):
 
 
 def filter_submissions_by_visible_problems(queryset, user):
-    join_sql_subquery(
-        queryset,
-        subquery=str(Problem.get_visible_problems(user).only('id').query),
-        params=[],
-        join_fields=[('problem_id', 'id')],
-        alias='visible_problems',
-        related_model=Problem,
-    )
+    return get_visible_problem_ids(user).restrict(queryset, 'problem_id')
 
 
-class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
+class SubmissionsListBase(CursorPaginationMixin, DiggPaginatorMixin, TitleMixin, ListView):
     model = Submission
     paginate_by = 50
     show_problem = True
@@ -237,6 +293,10 @@ class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
     context_object_name = 'submissions'
     first_page_href = None
 
+    @property
+    def use_infinite_pagination(self):
+        return False
+
     def get_result_data(self):
         result = self._get_result_data()
         for category in result['categories']:
@@ -274,23 +334,12 @@ class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
         else:
             queryset = queryset.select_related('contest_object').defer('contest_object__description')
 
-            if not self.request.user.has_perm('judge.see_private_contest'):
-                # Show submissions for any contest you can edit or where you can see submissions
-                contest_queryset = Contest.objects.filter(
-                    Q(authors=self.request.profile) |
-                    Q(curators=self.request.profile) |
-                    Q(tester_see_submissions=True, testers=self.request.profile) |
-                    Q(view_contest_submissions=self.request.profile) |
-                    Q(scoreboard_visibility=Contest.SCOREBOARD_VISIBLE) |
-                    Q(end_time__lt=timezone.now(), scoreboard_visibility__in=(
-                        Contest.SCOREBOARD_AFTER_PARTICIPATION,
-                        Contest.SCOREBOARD_AFTER_CONTEST,
-                    )),
-                ).distinct()
-
+            # Show submissions for any contest you can edit or where you can see submissions
+            contest_ids = get_visible_submission_contest_ids(self.request.user)
+            if not contest_ids.is_everything:
                 queryset = queryset.filter(
                     Q(user=self.request.profile) |
-                    Q(contest_object__in=contest_queryset) |
+                    contest_ids.q('contest_object_id') |
                     Q(contest_object__isnull=True),
                 )
 
@@ -309,7 +358,7 @@ class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
     def get_queryset(self):
         queryset = self._get_queryset()
         if not self.in_contest:
-            filter_submissions_by_visible_problems(queryset, self.request.user)
+            queryset = filter_submissions_by_visible_problems(queryset, self.request.user)
 
         return queryset
 
@@ -346,7 +395,9 @@ class SubmissionsListBase(DiggPaginatorMixin, TitleMixin, ListView):
         context['results_json'] = mark_safe(json.dumps(self.get_result_data()))
         context['results_colors_json'] = mark_safe(json.dumps(settings.DMOJ_STATS_SUBMISSION_RESULT_COLORS))
 
-        context['page_suffix'] = suffix = ('?' + self.request.GET.urlencode()) if self.request.GET else ''
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        context['page_suffix'] = suffix = ('?' + query.urlencode()) if query else ''
         context['first_page_href'] = (self.first_page_href or '.') + suffix
         context['my_submissions_link'] = self.get_my_submissions_page()
         context['all_submissions_link'] = self.get_all_submissions_page()
@@ -544,7 +595,7 @@ def single_submission(request):
     })
 
 
-class AllSubmissions(InfinitePaginationMixin, SubmissionsListBase):
+class AllSubmissions(SubmissionsListBase):
     stats_update_interval = 3600
 
     @property
@@ -664,7 +715,7 @@ class UserAllContestSubmissions(ForceContestMixin, AllUserSubmissions):
         queryset = super().get_queryset()
         # FIXME: fix this line of code when #1509 is implemented
         if not self.request.user.is_authenticated or self.request.profile.id not in self.contest.editor_ids:
-            filter_submissions_by_visible_problems(queryset, self.request.user)
+            queryset = filter_submissions_by_visible_problems(queryset, self.request.user)
         return queryset
 
 